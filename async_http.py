@@ -0,0 +1,293 @@
+import asyncio
+import json
+from urllib.parse import urlsplit, parse_qs
+
+# Minimal HTTP/1.1 plumbing on top of asyncio streams (stdlib only), server and client side.
+# Good enough for local OpenAI-style endpoints; not a general-purpose web server.
+
+MAX_HEADER_BYTES = 64 * 1024
+MAX_BODY_BYTES = 32 * 1024 * 1024
+
+STATUS_TEXT = {
+    200: "OK", 400: "Bad Request", 401: "Unauthorized", 404: "Not Found",
+    405: "Method Not Allowed", 413: "Payload Too Large", 429: "Too Many Requests",
+    500: "Internal Server Error", 503: "Service Unavailable",
+}
+
+
+class HTTPError(Exception):
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+        self.message = message
+
+
+class Request:
+    def __init__(self, method, target, headers, body):
+        self.method = method
+        parts = urlsplit(target)
+        self.path = parts.path.rstrip("/") or "/"
+        self.query = parse_qs(parts.query)
+        self.headers = headers # Lower-cased names
+        self.body = body
+
+    def json(self):
+        """The body as a JSON object (every endpoint here takes one); 400 otherwise."""
+        try:
+            body = json.loads(self.body.decode("utf-8") or "{}")
+        except (UnicodeDecodeError, ValueError):
+            raise HTTPError(400, "Request body is not valid JSON")
+        if not isinstance(body, dict):
+            raise HTTPError(400, "Request body must be a JSON object")
+        return body
+
+
+async def read_request(reader):
+    """Parses one request from the stream. Returns None on a clean EOF."""
+    try:
+        head = await reader.readuntil(b"\r\n\r\n")
+    except asyncio.IncompleteReadError:
+        return None
+    except asyncio.LimitOverrunError:
+        raise HTTPError(413, "Request headers too large")
+    if len(head) > MAX_HEADER_BYTES:
+        raise HTTPError(413, "Request headers too large")
+
+    lines = head.decode("latin-1").split("\r\n")
+    try:
+        method, target, _ = lines[0].split(" ", 2)
+    except ValueError:
+        raise HTTPError(400, "Malformed request line")
+
+    headers = {}
+    for line in lines[1:]:
+        if ":" in line:
+            name, value = line.split(":", 1)
+            headers[name.strip().lower()] = value.strip()
+
+    try:
+        length = int(headers.get("content-length", "0") or 0)
+    except ValueError:
+        raise HTTPError(400, "Invalid Content-Length")
+    if length < 0:
+        raise HTTPError(400, "Invalid Content-Length")
+    if length > MAX_BODY_BYTES:
+        raise HTTPError(413, "Request body too large")
+    body = await reader.readexactly(length) if length else b""
+    return Request(method.upper(), target, headers, body)
+
+
+def _head(status, headers):
+    lines = [f"HTTP/1.1 {status} {STATUS_TEXT.get(status, 'Unknown')}"]
+    lines += [f"{k}: {v}" for k, v in headers.items()]
+    return ("\r\n".join(lines) + "\r\n\r\n").encode("latin-1")
+
+
+async def send_json(writer, status, obj):
+    body = json.dumps(obj).encode("utf-8")
+    writer.write(_head(status, {
+        "Content-Type": "application/json",
+        "Content-Length": str(len(body)),
+        "Connection": "close",
+    }) + body)
+    await writer.drain()
+
+
+async def send_error(writer, status, message):
+    kind = "server_error" if status >= 500 else "invalid_request_error"
+    await send_json(writer, status, {"error": {"message": message, "type": kind, "code": status}})
+
+
+class SSEWriter:
+    """Server-sent events over chunked transfer encoding, one chunk per event."""
+
+    def __init__(self, writer):
+        self.writer = writer
+
+    async def start(self):
+        self.writer.write(_head(200, {
+            "Content-Type": "text/event-stream",
+            "Cache-Control": "no-cache",
+            "Transfer-Encoding": "chunked",
+            "Connection": "close",
+        }))
+        await self.writer.drain()
+
+    async def _chunk(self, data):
+        self.writer.write(b"%x\r\n%s\r\n" % (len(data), data))
+        await self.writer.drain()
+
+    async def send(self, obj):
+        await self._chunk(f"data: {json.dumps(obj)}\n\n".encode("utf-8"))
+
+    async def finish(self):
+        await self._chunk(b"data: [DONE]\n\n")
+        self.writer.write(b"0\r\n\r\n")
+        await self.writer.drain()
+
+
+async def watch_disconnect(reader, on_close):
+    """Calls on_close() when the peer closes its side of the connection."""
+    try:
+        while await reader.read(1024):
+            pass
+    except ConnectionError:
+        pass
+    except asyncio.CancelledError:
+        return # Response finished normally
+    on_close()
+
+
+async def start_server(handler, host, port):
+    """
+    Starts serving handler(request, reader, writer), one request per connection
+    (Connection: close keeps the state machine trivial). Returns the asyncio server.
+    """
+    async def on_connect(reader, writer):
+        try:
+            request = await read_request(reader)
+            if request is not None:
+                await handler(request, reader, writer)
+        except HTTPError as e:
+            try: await send_error(writer, e.status, e.message)
+            except ConnectionError: pass
+        except ConnectionError:
+            pass
+        except Exception as e:
+            # A handler bug must still answer, not drop the socket
+            print(f"[HTTP] ❌ Unhandled error: {type(e).__name__}: {e}")
+            try: await send_error(writer, 500, "Internal server error")
+            except (ConnectionError, OSError): pass
+        finally:
+            try:
+                writer.close()
+                await writer.wait_closed()
+            except (ConnectionError, OSError):
+                pass
+
+    return await asyncio.start_server(on_connect, host, port)
+
+
+def serve(handler, host, port):
+    """Runs start_server() until interrupted."""
+    async def main():
+        server = await start_server(handler, host, port)
+        async with server:
+            await server.serve_forever()
+
+    asyncio.run(main())
+
+
+# --- CLIENT ---
+class ClientResponse:
+    """Response from request(). The body is read incrementally (chunked, Content-Length or until EOF)."""
+
+    def __init__(self, status, headers, reader, writer):
+        self.status = status
+        self.headers = headers # Lower-cased names
+        self._reader = reader
+        self._writer = writer
+
+    async def chunks(self):
+        """Yields body bytes as they arrive. Raises ConnectionError if the body is cut short."""
+        reader = self._reader
+        try:
+            if self.headers.get("transfer-encoding", "").lower() == "chunked":
+                while True:
+                    size_line = await reader.readline()
+                    if not size_line:
+                        raise ConnectionError("connection closed mid-body")
+                    size = int(size_line.split(b";")[0].strip() or b"0", 16)
+                    if size == 0:
+                        while (await reader.readline()).strip(): # Trailers
+                            pass
+                        return
+                    data = await reader.readexactly(size)
+                    await reader.readexactly(2)
+                    yield data
+            elif "content-length" in self.headers:
+                remaining = int(self.headers["content-length"])
+                while remaining > 0:
+                    data = await reader.read(min(65536, remaining))
+                    if not data:
+                        raise ConnectionError("connection closed mid-body")
+                    remaining -= len(data)
+                    yield data
+            else:
+                while True:
+                    data = await reader.read(65536)
+                    if not data:
+                        return
+                    yield data
+        except asyncio.IncompleteReadError:
+            raise ConnectionError("connection closed mid-body")
+
+    async def read(self):
+        return b"".join([data async for data in self.chunks()])
+
+    async def json(self):
+        return json.loads((await self.read()).decode("utf-8") or "{}")
+
+    async def events(self):
+        """Yields the data payload of each server-sent event, ending at [DONE] or end of body."""
+        buffer = b""
+        async for data in self.chunks():
+            buffer += data.replace(b"\r\n", b"\n")
+            while b"\n\n" in buffer:
+                event, buffer = buffer.split(b"\n\n", 1)
+                for line in event.split(b"\n"):
+                    if line.startswith(b"data:"):
+                        payload = line[5:].strip().decode("utf-8")
+                        if payload == "[DONE]":
+                            return
+                        yield payload
+
+    def close(self):
+        try:
+            self._writer.close()
+        except (ConnectionError, OSError):
+            pass
+
+
+async def request(method, url, body=None, headers=None):
+    """
+    Sends one request (Connection: close) and returns a ClientResponse once the status line and
+    headers have arrived. body may be bytes or a JSON-serialisable object. Wrap the call and the
+    body reads in asyncio.wait_for() for timeouts.
+    """
+    parts = urlsplit(url)
+    secure = parts.scheme == "https"
+    port = parts.port or (443 if secure else 80)
+    reader, writer = await asyncio.open_connection(parts.hostname, port, ssl=secure or None,
+                                                   limit=MAX_HEADER_BYTES)
+    if body is not None and not isinstance(body, (bytes, bytearray)):
+        body = json.dumps(body).encode("utf-8")
+    body = body or b""
+    target = parts.path or "/"
+    if parts.query:
+        target += "?" + parts.query
+    lines = [f"{method.upper()} {target} HTTP/1.1", f"Host: {parts.netloc}",
+             f"Content-Length: {len(body)}", "Connection: close"]
+    if body:
+        lines.append("Content-Type: application/json")
+    lines += [f"{k}: {v}" for k, v in (headers or {}).items()]
+    writer.write(("\r\n".join(lines) + "\r\n\r\n").encode("latin-1") + body)
+    try:
+        await writer.drain()
+        head = await reader.readuntil(b"\r\n\r\n")
+    except (asyncio.IncompleteReadError, asyncio.LimitOverrunError) as e:
+        writer.close()
+        raise ConnectionError(f"no valid response from {parts.netloc}") from e
+
+    status_line, *header_lines = head.decode("latin-1").split("\r\n")
+    try:
+        status = int(status_line.split(" ", 2)[1])
+    except (IndexError, ValueError):
+        writer.close()
+        raise ConnectionError(f"malformed status line: {status_line!r}")
+    response_headers = {}
+    for line in header_lines:
+        if ":" in line:
+            name, value = line.split(":", 1)
+            response_headers[name.strip().lower()] = value.strip()
+    return ClientResponse(status, response_headers, reader, writer)
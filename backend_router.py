@@ -0,0 +1,226 @@
+import math
+import threading
+from contextlib import contextmanager
+
+import telemetry
+
+# ==========================================
+# BACKEND ROUTER (AUTO MODE)
+# ==========================================
+# Picks local or cloud per request. Each backend keeps live estimates (EWMA) of its prefill
+# and decode rate, fixed overhead, failure rate and hourly price, fed by the "turn",
+# "failover" and "stream_error" telemetry events the chat loop already records. A request's
+# expected completion time is
+#     queue + overhead + prompt_tokens / prefill_tps + reply_tokens / decode_tps
+#     + failure_rate * FAILURE_PENALTY_S
+# and its cost is the backend time it occupies at the hourly price. The router picks the
+# fastest backend whose expected cost is under the ceiling (the cheapest if none is).
+# Backends are plain names, so the policy runs with fake numbers and no engines.
+
+CHARS_PER_TOKEN = 4       # Prompt length estimate when no tokenizer is at hand
+EWMA_ALPHA = 0.3          # Weight of the newest observation
+FAILURE_PENALTY_S = 30.0  # Expected time lost to a failed attempt (deadline + local retry)
+MIN_PHASE_S = 0.005       # Floor for a measured prefill/decode phase
+
+# Starting points until real turns arrive. Local: a 7-14B GGUF on an APU/CPU. Cloud: vLLM on a
+# rented 48-80GB card, reached through the RunPod proxy.
+DEFAULT_PRIORS = {
+    "local": {"prefill_tps": 150.0, "decode_tps": 8.0, "overhead_s": 0.05, "cost_per_hour": 0.0, "slots": 1},
+    "cloud": {"prefill_tps": 2500.0, "decode_tps": 35.0, "overhead_s": 0.6, "cost_per_hour": 1.0, "slots": 16},
+}
+
+
+def estimate_tokens(messages):
+    """Rough prompt token count for a chat history (about 4 characters per token)."""
+    chars = sum(len(str(m.get("content") or "")) for m in messages)
+    return max(1, math.ceil(chars / CHARS_PER_TOKEN))
+
+
+def _ewma(old, new, alpha):
+    return new if old is None else old + alpha * (new - old)
+
+
+class BackendEstimate:
+    """Live performance and price estimates for one backend."""
+
+    def __init__(self, name, prefill_tps, decode_tps, overhead_s=0.0, cost_per_hour=0.0, slots=1):
+        self.name = name
+        self.prefill_tps = prefill_tps
+        self.decode_tps = decode_tps
+        self.overhead_s = overhead_s
+        self.cost_per_hour = cost_per_hour
+        self.slots = max(1, slots)     # Requests served at once (vLLM batches, llama.cpp does not)
+        self.latency_s = None          # EWMA of whole-turn time, for the queue estimate
+        self.failure_rate = 0.0
+        self.inflight = 0
+        self.samples = 0
+
+    def update(self, prompt_tokens, ttft_s, tokens, duration_s, alpha=EWMA_ALPHA):
+        """Folds one finished turn into the estimates."""
+        self.samples += 1
+        self.failure_rate = _ewma(self.failure_rate, 0.0, alpha)
+        if duration_s:
+            self.latency_s = _ewma(self.latency_s, duration_s, alpha)
+        if ttft_s is not None and prompt_tokens:
+            prefill_s = max(ttft_s - self.overhead_s, MIN_PHASE_S)
+            self.prefill_tps = _ewma(self.prefill_tps, prompt_tokens / prefill_s, alpha)
+        if ttft_s is not None and duration_s and tokens and tokens > 1:
+            decode_s = max(duration_s - ttft_s, MIN_PHASE_S)
+            self.decode_tps = _ewma(self.decode_tps, (tokens - 1) / decode_s, alpha)
+
+    def fail(self, alpha=EWMA_ALPHA):
+        self.failure_rate = _ewma(self.failure_rate, 1.0, alpha)
+
+    def queue_s(self):
+        """Wait before this request starts: requests ahead of it beyond the free slots."""
+        ahead = self.inflight - self.slots + 1
+        if ahead <= 0 or not self.latency_s:
+            return 0.0
+        return ahead / self.slots * self.latency_s
+
+    def estimate(self, prompt_tokens, reply_tokens):
+        queue_s = self.queue_s()
+        prefill_s = prompt_tokens / self.prefill_tps
+        decode_s = reply_tokens / self.decode_tps
+        busy_s = self.overhead_s + prefill_s + decode_s
+        time_s = queue_s + busy_s + self.failure_rate * FAILURE_PENALTY_S
+        return {
+            "backend": self.name,
+            "time_s": round(time_s, 3),
+            "queue_s": round(queue_s, 3),
+            "prefill_s": round(prefill_s, 3),
+            "decode_s": round(decode_s, 3),
+            "cost_usd": round(busy_s * self.cost_per_hour / 3600, 6),
+            "usd_per_token": self.cost_per_hour / 3600 / self.decode_tps if self.decode_tps else None,
+        }
+
+    def snapshot(self):
+        return {
+            "prefill_tps": round(self.prefill_tps, 1),
+            "decode_tps": round(self.decode_tps, 2),
+            "overhead_s": self.overhead_s,
+            "latency_s": round(self.latency_s, 3) if self.latency_s else None,
+            "failure_rate": round(self.failure_rate, 3),
+            "cost_per_hour": self.cost_per_hour,
+            "inflight": self.inflight,
+            "samples": self.samples,
+        }
+
+
+class BackendRouter:
+    """
+    Chooses the backend with the lowest expected completion time under a per-request
+    cost ceiling (USD, None = no ceiling).
+
+    attach() subscribes to telemetry so every recorded turn refines the estimates;
+    observe(event) can also be fed directly (tests, replays). Use track(name) around a
+    request so concurrent requests show up as queueing.
+    """
+
+    def __init__(self, backends=None, max_cost=None, alpha=EWMA_ALPHA):
+        priors = backends or DEFAULT_PRIORS
+        self.backends = {name: BackendEstimate(name, **prior) for name, prior in priors.items()}
+        self.max_cost = max_cost
+        self.alpha = alpha
+        self.reply_tokens = None # EWMA of reply length: the workload, not the backend
+        self._lock = threading.Lock()
+        self._attached = False
+
+    # --- TELEMETRY FEED ---
+    def attach(self):
+        if not self._attached:
+            telemetry.subscribe(self.observe)
+            self._attached = True
+        return self
+
+    def detach(self):
+        if self._attached:
+            telemetry.unsubscribe(self.observe)
+            self._attached = False
+
+    def observe(self, event):
+        """Updates estimates from a telemetry event; other kinds are ignored."""
+        kind = event.get("kind")
+        with self._lock:
+            if kind == "turn":
+                backend = event.get("backend") or ""
+                if "+" in backend: # "cloud+local": the first backend failed mid-stream
+                    return # Already counted by its failover event
+                est = self.backends.get(backend)
+                if est is None:
+                    return
+                if event.get("error"):
+                    est.fail(self.alpha)
+                    return
+                tokens = event.get("tokens")
+                est.update(event.get("prompt_tokens"), event.get("ttft_s"), tokens, event.get("duration_s"),
+                           self.alpha)
+                if tokens:
+                    self.reply_tokens = _ewma(self.reply_tokens, tokens, self.alpha)
+            elif kind in ("failover", "stream_error"):
+                est = self.backends.get(event.get("source"))
+                if est is not None:
+                    est.fail(self.alpha)
+
+    # --- LIVE STATE ---
+    def set_cost(self, name, cost_per_hour):
+        with self._lock:
+            if name in self.backends and cost_per_hour is not None:
+                self.backends[name].cost_per_hour = float(cost_per_hour)
+
+    @contextmanager
+    def track(self, name):
+        """Counts a request as in flight on `name` for the queue estimate."""
+        with self._lock:
+            est = self.backends.get(name)
+            if est is not None:
+                est.inflight += 1
+        try:
+            yield
+        finally:
+            with self._lock:
+                if est is not None:
+                    est.inflight -= 1
+
+    # --- POLICY ---
+    def expected_reply_tokens(self, max_tokens):
+        if self.reply_tokens is None:
+            return max_tokens
+        return min(max_tokens, self.reply_tokens)
+
+    def estimate(self, name, prompt_tokens, max_tokens):
+        with self._lock:
+            return self.backends[name].estimate(prompt_tokens, self.expected_reply_tokens(max_tokens))
+
+    def choose(self, prompt_tokens, max_tokens, available=None, max_cost=None):
+        """
+        Returns {"backend", "reason", "estimates"} for one request. `available` limits the
+        choice (e.g. the cloud pod is still booting); max_cost overrides the router's ceiling.
+        """
+        ceiling = self.max_cost if max_cost is None else max_cost
+        with self._lock:
+            names = [n for n in (available if available is not None else self.backends) if n in self.backends]
+            if not names:
+                raise ValueError("no routable backend available")
+            reply = self.expected_reply_tokens(max_tokens)
+            estimates = [self.backends[n].estimate(prompt_tokens, reply) for n in names]
+
+        affordable = [e for e in estimates if ceiling is None or e["cost_usd"] <= ceiling]
+        if affordable:
+            best = min(affordable, key=lambda e: (e["time_s"], e["cost_usd"]))
+            others = [e for e in affordable if e is not best]
+            reason = "fastest" if not others else \
+                f"fastest ({best['time_s']:.1f}s vs {min(e['time_s'] for e in others):.1f}s)"
+            if len(affordable) < len(estimates):
+                reason += f", under ${ceiling:g} ceiling"
+        else:
+            best = min(estimates, key=lambda e: (e["cost_usd"], e["time_s"]))
+            reason = f"cheapest (nothing under ${ceiling:g})"
+        decision = {"backend": best["backend"], "reason": reason, "estimates": estimates}
+        telemetry.record_event("route", backend=best["backend"], reason=reason, prompt_tokens=prompt_tokens,
+                               max_tokens=max_tokens, expected_s=best["time_s"], expected_usd=best["cost_usd"])
+        return decision
+
+    def snapshot(self):
+        with self._lock:
+            return {name: est.snapshot() for name, est in self.backends.items()}
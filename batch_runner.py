@@ -0,0 +1,292 @@
+import os
+import sys
+import json
+import time
+import argparse
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+# ==========================================
+# OFFLINE BATCH RUNNER
+# ==========================================
+# Pushes a JSONL file of chat requests through the local engine or an OpenAI-compatible
+# endpoint. One request per line:
+#   {"request_id": "q1", "messages": [{"role": "user", "content": "..."}], "max_tokens": 256}
+#   {"request_id": "q2", "prompt": "...", "system": "...", "temperature": 0.2}
+# Results are appended to the output JSONL as they finish; re-running with the same output
+# skips request IDs that already succeeded.
+
+DEFAULT_MAX_TOKENS = 512
+SAMPLING_FIELDS = ("temperature", "top_k", "top_p", "min_p", "repeat_penalty", "seed", "stop")
+
+
+class VoxAPIBackend:
+    """Sends each request's messages to VoxAPI as given (engine access is serialized by VoxAPI)."""
+    name = "local"
+
+    def __init__(self, engine):
+        self.engine = engine
+
+    def stream_chat(self, messages, max_tokens=DEFAULT_MAX_TOKENS, **sampling):
+        yield from self.engine.stream_messages(messages, max_tokens=max_tokens, **sampling)
+
+
+class BatchedLocalBackend:
+    """Shares one model between concurrent requests through the continuous-batching scheduler."""
+    name = "local-batched"
+
+    def __init__(self, scheduler, llm):
+        self.scheduler = scheduler
+        self.llm = llm
+
+    def stream_chat(self, messages, max_tokens=DEFAULT_MAX_TOKENS, **sampling):
+        import queue
+        pieces = queue.Queue()
+        req = self.scheduler.submit_chat(self.llm, messages, max_tokens=max_tokens, on_text=pieces.put, **sampling)
+        try:
+            while not (req.done.is_set() and pieces.empty()):
+                try:
+                    yield pieces.get(timeout=0.05)
+                except queue.Empty:
+                    pass
+            if req.error:
+                raise req.error
+        finally:
+            req.cancel()
+
+
+def load_requests(path):
+    """Yields (request_id, request dict). Malformed lines are reported and skipped."""
+    with open(path, "r", encoding="utf-8") as f:
+        for line_no, line in enumerate(f, 1):
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                req = json.loads(line)
+            except ValueError:
+                print(f"[BATCH] ⚠️ Skipping malformed line {line_no}")
+                continue
+            request_id = str(req.get("request_id") or req.get("id") or f"line-{line_no}")
+            yield request_id, req
+
+
+def build_messages(req):
+    if req.get("messages"):
+        return req["messages"]
+    if "prompt" not in req:
+        raise ValueError("request needs 'messages' or 'prompt'")
+    messages = []
+    if req.get("system"):
+        messages.append({"role": "system", "content": req["system"]})
+    messages.append({"role": "user", "content": req["prompt"]})
+    return messages
+
+
+def completed_ids(output_path):
+    """Request IDs that already have a successful result in the output file."""
+    done = set()
+    if not os.path.exists(output_path):
+        return done
+    with open(output_path, "r", encoding="utf-8") as f:
+        for line in f:
+            try:
+                result = json.loads(line)
+            except ValueError:
+                continue # Truncated last line from an interrupted run
+            if result.get("status") == "ok":
+                done.add(result.get("request_id"))
+    return done
+
+
+def run_one(backend, request_id, req):
+    """Streams one request and returns its result record."""
+    result = {"request_id": request_id, "backend": backend.name}
+    start = time.time()
+    first_token_at = None
+    text, n_chunks = "", 0
+    try:
+        sampling = {k: req[k] for k in SAMPLING_FIELDS if req.get(k) is not None}
+        for token in backend.stream_chat(build_messages(req), max_tokens=req.get("max_tokens") or DEFAULT_MAX_TOKENS, **sampling):
+            if first_token_at is None:
+                first_token_at = time.time()
+            text += token
+            n_chunks += 1
+        result["status"] = "ok"
+    except Exception as e:
+        result["status"] = "error"
+        result["error"] = str(e)
+    end = time.time()
+
+    decode_time = end - (first_token_at or end)
+    result.update({
+        "response": text,
+        "completion_tokens": n_chunks, # One streamed chunk per token on llama.cpp and vLLM
+        "ttft_s": round(first_token_at - start, 3) if first_token_at else None,
+        "latency_s": round(end - start, 3),
+        "decode_tok_s": round((n_chunks - 1) / decode_time, 2) if n_chunks > 1 and decode_time > 0 else None,
+    })
+    return result
+
+
+def percentile(values, pct):
+    if not values:
+        return None
+    values = sorted(values)
+    k = (len(values) - 1) * pct / 100
+    lo, hi = int(k), min(int(k) + 1, len(values) - 1)
+    return values[lo] + (values[hi] - values[lo]) * (k - lo)
+
+
+def summarize(results, wall_time):
+    ok = [r for r in results if r["status"] == "ok"]
+    latencies = [r["latency_s"] for r in ok]
+    ttfts = [r["ttft_s"] for r in ok if r["ttft_s"] is not None]
+    tokens = sum(r["completion_tokens"] for r in ok)
+    return {
+        "requests": len(results),
+        "ok": len(ok),
+        "errors": len(results) - len(ok),
+        "wall_s": round(wall_time, 2),
+        "requests_per_s": round(len(ok) / wall_time, 3) if wall_time > 0 else None,
+        "completion_tokens": tokens,
+        "tokens_per_s": round(tokens / wall_time, 2) if wall_time > 0 else None,
+        "latency_p50_s": percentile(latencies, 50),
+        "latency_p95_s": percentile(latencies, 95),
+        "latency_p99_s": percentile(latencies, 99),
+        "ttft_p50_s": percentile(ttfts, 50),
+        "ttft_p95_s": percentile(ttfts, 95),
+    }
+
+
+def run_batch(backend_factory, input_path, output_path, concurrency=1, resume=True, verbose=True):
+    """
+    Runs every request in input_path not yet completed in output_path.
+    backend_factory() must return a fresh backend (cloud backends hold per-stream state).
+    Returns the summary dict.
+    """
+    skip = completed_ids(output_path) if resume else set()
+    if not resume and os.path.exists(output_path):
+        os.remove(output_path)
+    if skip and verbose:
+        print(f"[BATCH] ⏩ Resuming: {len(skip)} requests already done")
+
+    results = []
+    write_lock = threading.Lock()
+    in_flight = threading.BoundedSemaphore(concurrency * 2) # Read the input lazily
+
+    def work(request_id, req):
+        try:
+            result = run_one(backend_factory(), request_id, req)
+            with write_lock:
+                with open(output_path, "a", encoding="utf-8") as f:
+                    f.write(json.dumps(result) + "\n")
+                results.append(result)
+                if verbose:
+                    mark = "✅" if result["status"] == "ok" else "❌"
+                    print(f"[BATCH] {mark} {request_id}: {result['completion_tokens']} tok in {result['latency_s']:.2f}s"
+                          + (f" ({result['error']})" if result.get("error") else ""))
+        finally:
+            in_flight.release()
+
+    start = time.time()
+    with ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix="vox-batch-run") as pool:
+        seen = set()
+        for request_id, req in load_requests(input_path):
+            if request_id in skip or request_id in seen:
+                continue
+            seen.add(request_id)
+            in_flight.acquire()
+            pool.submit(work, request_id, req)
+    return summarize(results, time.time() - start)
+
+
+def print_summary(summary):
+    print("\n" + "=" * 40)
+    print(" BATCH SUMMARY")
+    print("=" * 40)
+    print(f"Requests:    {summary['ok']} ok / {summary['errors']} failed in {summary['wall_s']}s")
+    if summary["ok"]:
+        print(f"Throughput:  {summary['tokens_per_s']} tok/s | {summary['requests_per_s']} req/s")
+        print(f"Latency:     p50 {summary['latency_p50_s']:.2f}s | p95 {summary['latency_p95_s']:.2f}s | p99 {summary['latency_p99_s']:.2f}s")
+        if summary["ttft_p50_s"] is not None:
+            print(f"TTFT:        p50 {summary['ttft_p50_s']:.2f}s | p95 {summary['ttft_p95_s']:.2f}s")
+    print("=" * 40)
+
+
+def make_backend_factory(backend, model=None, endpoint=None, api_key=None, concurrency=1, ctx_per_slot=2048):
+    """
+    Builds the backend for a run: the local engine (continuous batching when concurrency > 1)
+    or an OpenAI-compatible endpoint. Returns (factory, label, scheduler or None).
+    Raises ValueError when the model or endpoint cannot be resolved.
+    """
+    scheduler = None
+    if backend == "local":
+        from vox_api import VoxAPI
+        from vox_server import resolve_model_path
+        model_path = resolve_model_path(model, "./models") if model else None
+        if model and not model_path:
+            raise ValueError(f"Model not found: {model}")
+        engine = VoxAPI(model_path=model_path, pin_threads=True) # Standalone CLI: the whole process is ours
+        if concurrency > 1:
+            from batch_scheduler import BatchScheduler, LlamaBatchContext
+            scheduler = BatchScheduler(LlamaBatchContext(engine.llm, n_slots=concurrency, ctx_per_slot=ctx_per_slot,
+                                                         n_batch=engine.config.get("n_batch", 512)))
+            factory = lambda: BatchedLocalBackend(scheduler, engine.llm)
+        else:
+            factory = lambda: VoxAPIBackend(engine)
+        return factory, engine.model_name, scheduler
+
+    from chat_backends import EndpointBackend
+    try:
+        import config
+    except ImportError:
+        config = None
+    base_url = endpoint or getattr(config, "RUNPOD_BASE_URL", None)
+    api_key = api_key or getattr(config, "RUNPOD_API_KEY", None) or getattr(config, "API_KEY", "")
+    if not base_url:
+        raise ValueError("No endpoint: pass --endpoint or set RUNPOD_BASE_URL in config.py")
+    model_id = model or "default"
+    return lambda: EndpointBackend(base_url, model_id, api_key), f"{model_id} @ {base_url}", None
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Run a JSONL file of chat requests through VoxAI")
+    parser.add_argument("input", nargs="?", default="requests.jsonl")
+    parser.add_argument("-o", "--output", default=None, help="Results JSONL (default: <input>.results.jsonl)")
+    parser.add_argument("--backend", choices=("local", "endpoint"), default="local")
+    parser.add_argument("--model", help="Local: GGUF path/name. Endpoint: model id sent in requests")
+    parser.add_argument("--endpoint", default=None, help="OpenAI-compatible base URL (default: RUNPOD_BASE_URL)")
+    parser.add_argument("--api-key", default=None)
+    parser.add_argument("-c", "--concurrency", type=int, default=1,
+                        help="Requests in flight. Local runs >1 use continuous batching")
+    parser.add_argument("--ctx-per-slot", type=int, default=2048)
+    parser.add_argument("--no-resume", action="store_true", help="Start over instead of skipping finished IDs")
+    parser.add_argument("--summary-json", default=None, help="Also write the summary here")
+    parser.add_argument("--quiet", action="store_true")
+    args = parser.parse_args(argv)
+
+    if not os.path.exists(args.input):
+        sys.exit(f"[BATCH] ❌ Input not found: {args.input}")
+    output = args.output or os.path.splitext(args.input)[0] + ".results.jsonl"
+    concurrency = max(1, args.concurrency)
+
+    try:
+        factory, label, scheduler = make_backend_factory(args.backend, args.model, args.endpoint, args.api_key,
+                                                         concurrency, args.ctx_per_slot)
+    except ValueError as e:
+        sys.exit(f"[BATCH] ❌ {e}")
+
+    print(f"[BATCH] 🚀 {args.input} -> {output} | {label} | concurrency {concurrency}")
+    summary = run_batch(factory, args.input, output, concurrency=concurrency,
+                        resume=not args.no_resume, verbose=not args.quiet)
+    if scheduler:
+        scheduler.close()
+    print_summary(summary)
+    if args.summary_json:
+        with open(args.summary_json, "w", encoding="utf-8") as f:
+            json.dump(summary, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
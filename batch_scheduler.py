@@ -0,0 +1,387 @@
+import codecs
+import threading
+import queue
+import time
+
+import numpy as np
+
+# ==========================================
+# CONTINUOUS BATCHING (LOCAL)
+# ==========================================
+# Several chat sessions share one llama context. Each session owns a sequence ID (a KV slot).
+# Every step decodes one token for each active sequence plus a slice of any pending prompt,
+# all in a single llama_decode call. New requests are admitted between steps and finished
+# sequences hand their slot straight back to the pool.
+
+DEFAULT_SLOTS = 4
+DEFAULT_CTX_PER_SLOT = 2048
+DEFAULT_BATCH_TOKENS = 512
+PENALTY_LAST_N = 64 # Recent tokens the repeat/presence/frequency penalties look at (llama.cpp default)
+
+
+class LlamaBatchContext:
+    """
+    Multi-sequence llama context built on the weights of an already loaded Llama.
+
+    This is the engine interface the scheduler drives:
+        decode(entries) -> {seq_id: logits}   entries = [(seq_id, tokens, start_pos, want_logits)]
+        free(seq_id)                          drops the sequence from the KV cache
+        is_eog(token), token_bytes(token), tokenize(text), n_vocab
+    """
+
+    def __init__(self, llm, n_slots=DEFAULT_SLOTS, ctx_per_slot=DEFAULT_CTX_PER_SLOT, n_batch=DEFAULT_BATCH_TOKENS):
+        import llama_cpp
+        self._lib = llama_cpp
+        self.llm = llm
+        self.n_slots = n_slots
+        self.ctx_per_slot = ctx_per_slot
+        self.n_batch = n_batch
+        self.n_vocab = llm.n_vocab()
+
+        # Same threading/KV types as the parent engine, but one KV stream per slot
+        params = llama_cpp.llama_context_default_params()
+        for field in ("n_threads", "n_threads_batch", "type_k", "type_v", "flash_attn_type", "offload_kqv"):
+            if hasattr(llm.context_params, field) and hasattr(params, field):
+                setattr(params, field, getattr(llm.context_params, field))
+        params.n_ctx = n_slots * ctx_per_slot
+        params.n_batch = n_batch
+        params.n_ubatch = min(n_batch, 512)
+        params.n_seq_max = n_slots
+        if hasattr(params, "kv_unified"):
+            params.kv_unified = False # Each slot gets its own ctx_per_slot window
+
+        init = getattr(llama_cpp, "llama_init_from_model", None) or llama_cpp.llama_new_context_with_model
+        self.ctx = init(llm.model, params)
+        if not self.ctx:
+            raise RuntimeError("Failed to create a multi-sequence llama context")
+        self.batch = llama_cpp.llama_batch_init(n_batch, 0, 1)
+
+        vocab_fn = getattr(llama_cpp, "llama_model_get_vocab", None)
+        self._vocab = vocab_fn(llm.model) if vocab_fn else None
+
+    def tokenize(self, text):
+        bos_id = self.llm.token_bos()
+        bos = self.llm._model.token_get_text(bos_id) if bos_id != -1 else ""
+        add_bos = not (bos and text.startswith(bos))
+        return self.llm.tokenize(text.encode("utf-8"), add_bos=add_bos, special=True)
+
+    def token_bytes(self, token):
+        return self.llm.detokenize([token], special=False)
+
+    def is_eog(self, token):
+        if self._vocab is not None and hasattr(self._lib, "llama_vocab_is_eog"):
+            return bool(self._lib.llama_vocab_is_eog(self._vocab, token))
+        return token == self.llm.token_eos()
+
+    def decode(self, entries):
+        b = self.batch
+        n = 0
+        wanted = []
+        for seq_id, tokens, start_pos, want_logits in entries:
+            for i, tok in enumerate(tokens):
+                b.token[n] = tok
+                b.pos[n] = start_pos + i
+                b.n_seq_id[n] = 1
+                b.seq_id[n][0] = seq_id
+                b.logits[n] = 0
+                n += 1
+            if want_logits:
+                b.logits[n - 1] = 1
+                wanted.append((seq_id, n - 1))
+        b.n_tokens = n
+
+        rc = self._lib.llama_decode(self.ctx, b)
+        if rc != 0:
+            raise RuntimeError(f"llama_decode failed ({rc})")
+
+        out = {}
+        for seq_id, idx in wanted:
+            ptr = self._lib.llama_get_logits_ith(self.ctx, idx)
+            out[seq_id] = np.ctypeslib.as_array(ptr, shape=(self.n_vocab,)).copy()
+        return out
+
+    def free(self, seq_id):
+        lib = self._lib
+        if hasattr(lib, "llama_memory_seq_rm"):
+            lib.llama_memory_seq_rm(lib.llama_get_memory(self.ctx), seq_id, -1, -1)
+        else:
+            lib.llama_kv_cache_seq_rm(self.ctx, seq_id, -1, -1)
+
+    def close(self):
+        if self.batch is not None:
+            self._lib.llama_batch_free(self.batch)
+            self.batch = None
+        if self.ctx:
+            self._lib.llama_free(self.ctx)
+            self.ctx = None
+
+
+def apply_penalties(logits, recent, repeat_penalty=1.0, presence_penalty=0.0, frequency_penalty=0.0):
+    """llama.cpp-style penalties for the tokens in `recent`. Returns a new logits array."""
+    if not len(recent) or (repeat_penalty == 1.0 and not presence_penalty and not frequency_penalty):
+        return logits
+    tokens, counts = np.unique(np.asarray(recent, dtype=np.int64), return_counts=True)
+    logits = logits.astype(np.float64)
+    picked = logits[tokens]
+    picked = np.where(picked > 0, picked / repeat_penalty, picked * repeat_penalty)
+    logits[tokens] = picked - counts * frequency_penalty - presence_penalty
+    return logits
+
+
+def sample_token(logits, temperature=0.7, top_k=40, top_p=0.95, rng=None, min_p=0.0):
+    """Greedy when temperature <= 0, otherwise top-k / top-p / min-p sampling."""
+    if temperature <= 0:
+        return int(np.argmax(logits))
+    rng = rng or np.random
+    logits = logits.astype(np.float64) / temperature
+    if top_k and top_k < logits.size:
+        idx = np.argpartition(logits, -top_k)[-top_k:]
+    else:
+        idx = np.arange(logits.size)
+    sub = logits[idx]
+    probs = np.exp(sub - sub.max())
+    probs /= probs.sum()
+    if min_p > 0:
+        probs = np.where(probs >= min_p * probs.max(), probs, 0.0)
+        probs /= probs.sum()
+
+    order = np.argsort(-probs)
+    cum = np.cumsum(probs[order])
+    keep = order[: int(np.searchsorted(cum, top_p) + 1)]
+    p = probs[keep] / probs[keep].sum()
+    return int(idx[keep][rng.choice(len(keep), p=p)])
+
+
+class SequenceRequest:
+    """
+    One generation request. Tokens stream to on_text; wait() blocks for the full text.
+    Text that could be the start of a `stop` string is held back until it cannot be.
+    """
+
+    def __init__(self, prompt_tokens, max_tokens, temperature, top_k, top_p, on_text=None, min_p=0.0,
+                 repeat_penalty=1.0, presence_penalty=0.0, frequency_penalty=0.0, stop=None, rng=None):
+        self.prompt_tokens = list(prompt_tokens)
+        self.max_tokens = max_tokens
+        self.temperature = temperature
+        self.top_k = top_k
+        self.top_p = top_p
+        self.min_p = min_p
+        self.repeat_penalty = repeat_penalty
+        self.presence_penalty = presence_penalty
+        self.frequency_penalty = frequency_penalty
+        self.stop = [stop] if isinstance(stop, str) else [s for s in (stop or []) if s]
+        self.rng = rng               # Own generator when the request has a seed
+        self.on_text = on_text
+
+        self.seq_id = None
+        self.n_prefilled = 0         # Prompt tokens already in the KV cache
+        self.generated = []          # Sampled token ids
+        self.text = ""
+        self.finish_reason = None
+        self.error = None
+        self.submitted = time.time()
+        self.first_token_at = None
+        self.cancelled = False
+        self.done = threading.Event()
+        self._decoder = codecs.getincrementaldecoder("utf-8")(errors="replace")
+        self._held = ""              # Decoded text not yet released (possible stop-string prefix)
+
+    @property
+    def position(self):
+        return self.n_prefilled + len(self.generated)
+
+    def recent_tokens(self):
+        """The window the penalties apply to: prompt tail plus generated tokens."""
+        return (self.prompt_tokens[-PENALTY_LAST_N:] + self.generated[-PENALTY_LAST_N:])[-PENALTY_LAST_N:]
+
+    def feed(self, piece):
+        """Adds decoded text; returns (text safe to release, True if a stop string matched)."""
+        text = self._held + piece
+        cut = min((i for i in (text.find(s) for s in self.stop) if i != -1), default=-1)
+        if cut != -1:
+            self._held = ""
+            return text[:cut], True
+        hold = 0
+        for s in self.stop:
+            for n in range(min(len(s) - 1, len(text)), hold, -1):
+                if text.endswith(s[:n]):
+                    hold = n
+                    break
+        self._held = text[len(text) - hold:] if hold else ""
+        return text[:len(text) - hold], False
+
+    def cancel(self):
+        self.cancelled = True
+
+    def wait(self, timeout=None):
+        self.done.wait(timeout)
+        if self.error:
+            raise self.error
+        return self.text
+
+
+class BatchScheduler:
+    """
+    Runs a decode loop on its own thread, multiplexing requests onto `engine` sequence slots.
+    `engine` is a LlamaBatchContext or any object with the same interface (fakes in tests).
+    """
+
+    def __init__(self, engine, max_batch_tokens=None, seed=None):
+        self.engine = engine
+        self.max_batch_tokens = max_batch_tokens or engine.n_batch
+        self.rng = np.random.default_rng(seed)
+        self.free_slots = list(range(engine.n_slots))
+        self.active = []              # Requests holding a slot
+        self.pending = queue.Queue()  # Waiting for a slot
+        self.steps = 0
+        self.tokens_decoded = 0
+        self._stop = threading.Event()
+        self._wake = threading.Event()
+        self._thread = threading.Thread(target=self._loop, name="vox-batch", daemon=True)
+        self._thread.start()
+
+    # --- PUBLIC API ---
+    def submit(self, prompt_tokens, max_tokens=512, temperature=0.7, top_k=40, top_p=0.95, on_text=None,
+               min_p=0.0, repeat_penalty=1.0, presence_penalty=0.0, frequency_penalty=0.0, seed=None, stop=None):
+        """Queues a request. A seed gives it its own generator, so its output does not depend on its neighbours."""
+        limit = self.engine.ctx_per_slot
+        if len(prompt_tokens) >= limit:
+            raise ValueError(f"Prompt ({len(prompt_tokens)} tokens) exceeds the {limit}-token slot context")
+        max_tokens = min(max_tokens, limit - len(prompt_tokens))
+        rng = np.random.default_rng(seed) if seed is not None else None
+        req = SequenceRequest(prompt_tokens, max_tokens, temperature, top_k, top_p, on_text, min_p=min_p,
+                              repeat_penalty=repeat_penalty, presence_penalty=presence_penalty,
+                              frequency_penalty=frequency_penalty, stop=stop, rng=rng)
+        self.pending.put(req)
+        self._wake.set()
+        return req
+
+    def submit_chat(self, llm, messages, stop=None, **kwargs):
+        """Renders messages with the model's chat template and submits them, with the template's stop strings."""
+        from chat_backends import render_chat_prompt
+        prompt, template_stop = render_chat_prompt(llm, messages)
+        stop = [stop] if isinstance(stop, str) else list(stop or [])
+        stop += [template_stop] if isinstance(template_stop, str) else list(template_stop or [])
+        return self.submit(self.engine.tokenize(prompt), stop=stop, **kwargs)
+
+    def stats(self):
+        return {"active": len(self.active), "pending": self.pending.qsize(),
+                "free_slots": len(self.free_slots), "steps": self.steps, "tokens": self.tokens_decoded}
+
+    def close(self):
+        self._stop.set()
+        self._wake.set()
+        self._thread.join()
+        for req in self.active + self._drain_pending():
+            self._finish(req, "cancelled")
+
+    # --- SCHEDULER LOOP ---
+    def _drain_pending(self):
+        items = []
+        while True:
+            try: items.append(self.pending.get_nowait())
+            except queue.Empty: return items
+
+    def _admit(self):
+        """Moves pending requests into free slots (between steps only)."""
+        while self.free_slots:
+            try: req = self.pending.get_nowait()
+            except queue.Empty: return
+            if req.cancelled:
+                self._finish(req, "cancelled")
+                continue
+            req.seq_id = self.free_slots.pop(0)
+            self.active.append(req)
+
+    def _finish(self, req, reason):
+        if req.seq_id is not None:
+            try: self.engine.free(req.seq_id)
+            except Exception: pass
+            self.free_slots.append(req.seq_id)
+            req.seq_id = None
+        if req in self.active:
+            self.active.remove(req)
+        tail = req._held + req._decoder.decode(b"", final=True)
+        req._held = ""
+        if tail:
+            self._release(req, tail)
+        req.finish_reason = req.finish_reason or reason
+        req.done.set()
+
+    @staticmethod
+    def _release(req, text):
+        req.text += text
+        if req.on_text:
+            try: req.on_text(text)
+            except Exception: req.cancelled = True
+
+    def _build_batch(self):
+        """One token per decoding sequence first (latency), then prompt slices with the leftover budget."""
+        entries, budget = [], self.max_batch_tokens
+        for req in self.active:
+            if req.n_prefilled == len(req.prompt_tokens) and req.generated and budget > 0:
+                entries.append((req.seq_id, [req.generated[-1]], req.position - 1, True, req))
+                budget -= 1
+        for req in self.active:
+            remaining = len(req.prompt_tokens) - req.n_prefilled
+            if remaining > 0 and budget > 0:
+                take = min(remaining, budget)
+                chunk = req.prompt_tokens[req.n_prefilled:req.n_prefilled + take]
+                entries.append((req.seq_id, chunk, req.n_prefilled, take == remaining, req))
+                budget -= take
+        return entries
+
+    def _step(self):
+        for req in [r for r in self.active if r.cancelled]:
+            self._finish(req, "cancelled")
+        entries = self._build_batch()
+        if not entries:
+            return False
+
+        logits = self.engine.decode([e[:4] for e in entries])
+        self.steps += 1
+        self.tokens_decoded += sum(len(e[1]) for e in entries)
+
+        for seq_id, tokens, _, want_logits, req in entries:
+            if not want_logits:
+                req.n_prefilled += len(tokens)
+                continue
+            if req.n_prefilled < len(req.prompt_tokens):
+                req.n_prefilled += len(tokens) # Prompt just completed
+
+            scores = apply_penalties(logits[seq_id], req.recent_tokens(), req.repeat_penalty,
+                                     req.presence_penalty, req.frequency_penalty)
+            token = sample_token(scores, req.temperature, req.top_k, req.top_p, req.rng or self.rng, req.min_p)
+            if req.first_token_at is None:
+                req.first_token_at = time.time()
+            if self.engine.is_eog(token):
+                self._finish(req, "stop")
+                continue
+
+            req.generated.append(token)
+            piece = req._decoder.decode(self.engine.token_bytes(token))
+            if piece:
+                text, stopped = req.feed(piece)
+                if text:
+                    self._release(req, text)
+                if stopped:
+                    req._decoder.reset() # Nothing after the stop string is released
+                    self._finish(req, "stop")
+                    continue
+            if len(req.generated) >= req.max_tokens:
+                self._finish(req, "length")
+        return True
+
+    def _loop(self):
+        while not self._stop.is_set():
+            self._admit()
+            try:
+                busy = self._step()
+            except Exception as e:
+                for req in list(self.active):
+                    req.error = e
+                    self._finish(req, "error")
+                busy = False
+            if not busy:
+                self._wake.wait(0.05)
+                self._wake.clear()
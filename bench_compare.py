@@ -0,0 +1,269 @@
+import sys
+import json
+import math
+import argparse
+import itertools
+import statistics
+
+# ==========================================
+# BENCHMARK REGRESSION GATE
+# ==========================================
+# Compares two vox_bench.py result files (baseline vs candidate), config by config and prompt
+# by prompt. For each metric the per-trial samples go through a one-sided Mann-Whitney U test
+# (exact permutation distribution for small runs, normal approximation with tie correction
+# for large ones). A metric regresses when its median is worse by more than the threshold AND
+# the test says the shift is unlikely to be noise (p < alpha). Exit status: 0 = no regression,
+# 1 = regression, 2 = the files could not be compared.
+#
+#   python vox_bench.py --model qwen_0.5b_chat.gguf --set n_gpu_layers=0 --trials 7 -o base.json
+#   ... change the handshake defaults or the chat path ...
+#   python vox_bench.py --model qwen_0.5b_chat.gguf --set n_gpu_layers=0 --trials 7 -o cand.json
+#   python bench_compare.py base.json cand.json
+
+# metric -> (higher_is_better, default threshold in percent)
+METRICS = {
+    "decode_tps": (True, 5.0),
+    "prefill_tps": (True, 5.0),
+    "ttft_s": (False, 10.0),
+    "itl_p50_ms": (False, 10.0),
+    "itl_p95_ms": (False, 15.0),
+    "itl_p99_ms": (False, 20.0),
+}
+DEFAULT_ALPHA = 0.05
+MAX_EXACT_SPLITS = 20000 # Above this many relabelings the normal approximation is used
+
+EXIT_OK, EXIT_REGRESSION, EXIT_ERROR = 0, 1, 2
+
+
+class CompareError(ValueError):
+    pass
+
+
+# --- STATISTICS ---
+def _u_worse(base, cand, higher_is_better):
+    """Mann-Whitney U counting (candidate, baseline) pairs where the candidate is worse (ties 0.5)."""
+    u = 0.0
+    for c in cand:
+        for b in base:
+            if c == b:
+                u += 0.5
+            elif (c < b) == higher_is_better:
+                u += 1.0
+    return u
+
+
+def mann_whitney(base, cand, higher_is_better):
+    """
+    One-sided p-values (p_worse, p_better): the chance of a U at least this extreme in either
+    direction if baseline and candidate samples came from the same distribution.
+    """
+    n, m = len(base), len(cand)
+    observed = _u_worse(base, cand, higher_is_better)
+    pooled = list(base) + list(cand)
+
+    if math.comb(n + m, n) <= MAX_EXACT_SPLITS:
+        at_least = at_most = total = 0
+        for idx in itertools.combinations(range(n + m), n):
+            chosen = set(idx)
+            u = _u_worse([pooled[i] for i in idx], [pooled[i] for i in range(n + m) if i not in chosen],
+                         higher_is_better)
+            total += 1
+            at_least += u >= observed - 1e-9
+            at_most += u <= observed + 1e-9
+        return at_least / total, at_most / total
+
+    # Normal approximation with tie correction and continuity correction
+    mean = n * m / 2
+    counts = {}
+    for v in pooled:
+        counts[v] = counts.get(v, 0) + 1
+    ties = sum(t ** 3 - t for t in counts.values())
+    var = n * m / 12 * ((n + m + 1) - ties / ((n + m) * (n + m - 1)))
+    if var <= 0:
+        return 1.0, 1.0
+    sd = math.sqrt(var)
+    cdf = lambda z: 0.5 * (1 + math.erf(z / math.sqrt(2)))
+    return 1 - cdf((observed - mean - 0.5) / sd), cdf((observed - mean + 0.5) / sd)
+
+
+def min_pvalue(n, m):
+    """Smallest one-sided p an exact test can reach with n and m trials."""
+    return 1 / math.comb(n + m, n)
+
+
+def compare_metric(base, cand, higher_is_better, threshold_pct, alpha=DEFAULT_ALPHA):
+    """Verdict for one metric: 'regression', 'improved', 'noise' (big but not significant) or 'ok'."""
+    base = [v for v in base if v is not None]
+    cand = [v for v in cand if v is not None]
+    if not base or not cand:
+        return None
+    b_med, c_med = statistics.median(base), statistics.median(cand)
+    change = (c_med - b_med) / b_med * 100 if b_med else 0.0
+    worse_pct = -change if higher_is_better else change
+    p_worse, p_better = mann_whitney(base, cand, higher_is_better)
+
+    if worse_pct > threshold_pct:
+        verdict = "regression" if p_worse < alpha else "noise"
+    elif -worse_pct > threshold_pct:
+        verdict = "improved" if p_better < alpha else "noise"
+    else:
+        verdict = "ok"
+    return {
+        "baseline": b_med,
+        "candidate": c_med,
+        "change_pct": round(change, 2),
+        "p_value": round(p_worse if worse_pct >= 0 else p_better, 4),
+        "n": [len(base), len(cand)],
+        "threshold_pct": threshold_pct,
+        "verdict": verdict,
+    }
+
+
+# --- RESULT FILES ---
+def load_result(path):
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            data = json.load(f)
+    except (OSError, ValueError) as e:
+        raise CompareError(f"cannot read {path}: {e}")
+    if not isinstance(data, dict) or "results" not in data:
+        raise CompareError(f"{path} is not a vox_bench.py result file")
+    return data
+
+
+def _samples(result, prompt_id, metric):
+    return [t[metric] for t in result.get("trials", []) if t["prompt"] == prompt_id]
+
+
+def compare(baseline, candidate, thresholds=None, alpha=DEFAULT_ALPHA, metrics=None):
+    """
+    Compares two vox_bench reports. Configs are matched by name (then by fingerprint), prompts
+    by ID. Returns {"warnings", "rows", "regressions"}; each row is one config/prompt/metric.
+    """
+    thresholds = thresholds or {}
+    metrics = metrics or list(METRICS)
+    warnings = []
+    if baseline.get("machine", {}).get("fingerprint") != candidate.get("machine", {}).get("fingerprint"):
+        warnings.append("runs come from different machines; differences may be hardware, not code")
+    if baseline.get("model", {}).get("fingerprint") != candidate.get("model", {}).get("fingerprint"):
+        warnings.append(f"different models: {baseline.get('model', {}).get('file')} vs {candidate.get('model', {}).get('file')}")
+
+    cand_by_name = {r["name"]: r for r in candidate["results"]}
+    cand_by_fp = {r["fingerprint"]: r for r in candidate["results"]}
+    rows = []
+    for base_res in baseline["results"]:
+        cand_res = cand_by_name.get(base_res["name"]) or cand_by_fp.get(base_res["fingerprint"])
+        if cand_res is None:
+            warnings.append(f"config '{base_res['name']}' missing from candidate")
+            continue
+        if base_res.get("error") or cand_res.get("error"):
+            warnings.append(f"config '{base_res['name']}' failed: {base_res.get('error') or cand_res.get('error')}")
+            continue
+        if cand_res["fingerprint"] != base_res["fingerprint"]:
+            changed = sorted(k for k in set(base_res["config"]) | set(cand_res["config"])
+                             if base_res["config"].get(k) != cand_res["config"].get(k))
+            warnings.append(f"config '{base_res['name']}' settings differ: {', '.join(changed)}")
+        for prompt_id in base_res.get("prompts", {}):
+            if prompt_id not in cand_res.get("prompts", {}):
+                warnings.append(f"prompt '{prompt_id}' missing from candidate config '{base_res['name']}'")
+                continue
+            for metric in metrics:
+                higher_is_better, default = METRICS[metric]
+                row = compare_metric(_samples(base_res, prompt_id, metric), _samples(cand_res, prompt_id, metric),
+                                     higher_is_better, thresholds.get(metric, default), alpha)
+                if row:
+                    n, m = row["n"]
+                    if min_pvalue(n, m) >= alpha and math.comb(n + m, n) <= MAX_EXACT_SPLITS:
+                        warnings.append(f"{n} vs {m} trials cannot reach p < {alpha}; run more --trials")
+                    rows.append({"config": base_res["name"], "prompt": prompt_id, "metric": metric, **row})
+        for metric in ("load_s", "peak_rss_mb"):
+            if base_res.get(metric) and cand_res.get(metric):
+                rows.append({"config": base_res["name"], "prompt": "-", "metric": metric,
+                             "baseline": base_res[metric], "candidate": cand_res[metric],
+                             "change_pct": round((cand_res[metric] - base_res[metric]) / base_res[metric] * 100, 2),
+                             "p_value": None, "verdict": "info"})
+    return {
+        "warnings": list(dict.fromkeys(warnings)),
+        "rows": rows,
+        "regressions": [r for r in rows if r["verdict"] == "regression"],
+    }
+
+
+def _num(value):
+    if value is None:
+        return "-"
+    return f"{value:.4g}" if abs(value) < 1000 else f"{value:.0f}"
+
+
+def format_table(report, show_all=False):
+    """Diff table; without show_all, unchanged ('ok') metrics are left out."""
+    rows = [r for r in report["rows"] if show_all or r["verdict"] not in ("ok", "info")]
+    marks = {"regression": "❌ REGRESSION", "improved": "✅ improved", "noise": "~ noise", "ok": "ok", "info": ""}
+    lines = []
+    if rows:
+        header = f"{'config':<24} {'prompt':<20} {'metric':<12} {'baseline':>10} {'candidate':>10} {'change':>8} {'p':>7}  verdict"
+        lines += [header, "-" * len(header)]
+        for r in rows:
+            p = f"{r['p_value']:.3f}" if r["p_value"] is not None else "-"
+            lines.append(f"{r['config'][:24]:<24} {r['prompt'][:20]:<20} {r['metric']:<12} {_num(r['baseline']):>10} "
+                         f"{_num(r['candidate']):>10} {r['change_pct']:>+7.1f}% {p:>7}  {marks[r['verdict']]}")
+    else:
+        lines.append("No metric moved beyond its threshold.")
+    for w in report["warnings"]:
+        lines.append(f"⚠️ {w}")
+    n_reg = len(report["regressions"])
+    lines.append(f"{n_reg} regression(s) in {sum(r['verdict'] != 'info' for r in report['rows'])} comparisons.")
+    return "\n".join(lines)
+
+
+def parse_threshold(text):
+    """'5' (all metrics) or 'decode_tps=3' -> {metric: percent}"""
+    if "=" not in text:
+        return {m: float(text) for m in METRICS}
+    metric, _, value = text.partition("=")
+    if metric not in METRICS:
+        raise argparse.ArgumentTypeError(f"unknown metric '{metric}' (known: {', '.join(METRICS)})")
+    return {metric: float(value)}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Compare two vox_bench.py runs; exits 1 on a regression")
+    parser.add_argument("baseline")
+    parser.add_argument("candidate")
+    parser.add_argument("--threshold", action="append", type=parse_threshold, default=[], metavar="[METRIC=]PCT",
+                        help="Median change (percent) that counts as a regression; repeatable")
+    parser.add_argument("--alpha", type=float, default=DEFAULT_ALPHA, help="Significance level for the U test")
+    parser.add_argument("--metrics", help=f"Comma-separated subset of {', '.join(METRICS)}")
+    parser.add_argument("--all", action="store_true", help="Also list metrics that did not change")
+    parser.add_argument("--json", help="Write the full comparison here")
+    args = parser.parse_args(argv)
+
+    thresholds = {}
+    for t in args.threshold:
+        thresholds.update(t)
+    metrics = [m.strip() for m in args.metrics.split(",")] if args.metrics else None
+    if metrics and any(m not in METRICS for m in metrics):
+        print(f"[COMPARE] ❌ Unknown metric in --metrics (known: {', '.join(METRICS)})")
+        return EXIT_ERROR
+
+    try:
+        report = compare(load_result(args.baseline), load_result(args.candidate),
+                         thresholds=thresholds, alpha=args.alpha, metrics=metrics)
+    except CompareError as e:
+        print(f"[COMPARE] ❌ {e}")
+        return EXIT_ERROR
+    if not any(r["verdict"] != "info" for r in report["rows"]):
+        print("[COMPARE] ❌ Nothing to compare (no matching configs and prompts).")
+        for w in report["warnings"]:
+            print(f"⚠️ {w}")
+        return EXIT_ERROR
+
+    print(format_table(report, show_all=args.all))
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+    return EXIT_REGRESSION if report["regressions"] else EXIT_OK
+
+
+if __name__ == "__main__":
+    sys.exit(main())
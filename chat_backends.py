@@ -0,0 +1,273 @@
+import json
+import socket
+import threading
+import time
+
+import vox_trace
+
+# Cloud stream deadlines (seconds)
+DEFAULT_CONNECT_TIMEOUT = 10
+DEFAULT_FIRST_TOKEN_TIMEOUT = 60  # Prefill of a long history on a cold pod
+DEFAULT_STALL_TIMEOUT = 15        # Max silence between tokens once streaming
+
+# Used when a GGUF ships without a chat template
+CHATML_TEMPLATE = (
+    "{% for message in messages %}"
+    "{{ '<|im_start|>' + message['role'] + '\\n' + message['content'] + '<|im_end|>' + '\\n' }}"
+    "{% endfor %}"
+    "{% if add_generation_prompt %}{{ '<|im_start|>assistant\\n' }}{% endif %}"
+)
+
+
+class StreamStalled(Exception):
+    """Raised when a cloud stream misses its first-token or inter-token deadline."""
+
+
+def _abort_response(response):
+    """
+    Closes a streaming response from another thread. Shutting the socket down first
+    wakes a reader blocked in recv(); close() alone does not.
+    """
+    conn = getattr(response.raw, "connection", None) or getattr(response.raw, "_connection", None)
+    sock = getattr(conn, "sock", None)
+    if sock is not None:
+        try: sock.shutdown(socket.SHUT_RDWR)
+        except OSError: pass
+    try: response.close()
+    except Exception: pass
+
+
+def render_chat_prompt(llm, messages):
+    """
+    Renders messages with the model's own chat template, ending on an open assistant turn.
+    Returns (prompt, stop_strings).
+    """
+    from llama_cpp.llama_chat_format import Jinja2ChatFormatter
+
+    template = llm.metadata.get("tokenizer.chat_template") or CHATML_TEMPLATE
+    eos_id, bos_id = llm.token_eos(), llm.token_bos()
+    eos = llm._model.token_get_text(eos_id) if eos_id != -1 else ""
+    bos = llm._model.token_get_text(bos_id) if bos_id != -1 else ""
+
+    formatter = Jinja2ChatFormatter(template=template, eos_token=eos, bos_token=bos)
+    prompt = formatter(messages=messages).prompt
+    stop = [s for s in (eos, "<|im_end|>") if s]
+    return prompt, stop
+
+
+def tokenize_chat(llm, messages, suffix=""):
+    """
+    Tokenizes messages rendered with the model's chat template (plus suffix, e.g. a partial
+    reply) the way create_chat_completion would. Returns (tokens, stop_strings).
+    """
+    prompt, stop = render_chat_prompt(llm, messages)
+    prompt += suffix
+
+    # The template already emits BOS when the model wants one
+    bos_id = llm.token_bos()
+    bos = llm._model.token_get_text(bos_id) if bos_id != -1 else ""
+    add_bos = not (bos and prompt.startswith(bos))
+    return llm.tokenize(prompt.encode("utf-8"), add_bos=add_bos, special=True), stop
+
+
+class LocalBackend:
+    """Streams chat completions from a loaded llama.cpp engine."""
+    name = "local"
+
+    def __init__(self, llm):
+        self.llm = llm
+        self.cancelled = threading.Event()
+
+    def cancel(self):
+        """Stops decode at the next token. Safe to call from another thread."""
+        self.cancelled.set()
+
+    def stream_chat(self, messages, max_tokens=512, **sampling):
+        """Yields content tokens. Closing the generator stops decode."""
+        trace = vox_trace.enabled
+        start, first, n_tokens = time.perf_counter(), None, 0
+        stream = self.llm.create_chat_completion(
+            messages=messages,
+            max_tokens=max_tokens,
+            stream=True,
+            **sampling
+        )
+        try:
+            for chunk in stream:
+                if self.cancelled.is_set():
+                    break
+                delta = chunk['choices'][0]['delta']
+                if delta.get('content'):
+                    if trace:
+                        first = first or time.perf_counter()
+                        n_tokens += 1
+                    yield delta['content']
+        finally:
+            stream.close()
+            if trace:
+                vox_trace.record_generation("local", start, first, n_tokens)
+
+    def continue_chat(self, messages, prefix, max_tokens=512):
+        """
+        Continues a partially written assistant reply: the prompt is the rendered history
+        followed by `prefix`, so the model picks up mid-sentence. Yields content tokens.
+        """
+        tokens, stop = tokenize_chat(self.llm, messages, prefix)
+
+        trace = vox_trace.enabled
+        start, first, n_tokens = time.perf_counter(), None, 0
+        stream = self.llm.create_completion(
+            prompt=tokens,
+            max_tokens=max_tokens,
+            stop=stop,
+            stream=True
+        )
+        try:
+            for chunk in stream:
+                if self.cancelled.is_set():
+                    break
+                text = chunk['choices'][0].get('text')
+                if text:
+                    if trace:
+                        first = first or time.perf_counter()
+                        n_tokens += 1
+                    yield text
+        finally:
+            stream.close()
+            if trace:
+                vox_trace.record_generation("local", start, first, n_tokens)
+
+
+class CloudBackend:
+    """Streams chat completions from the vLLM server on the active RunPod pod."""
+    name = "cloud"
+
+    def __init__(self, driver, model_id, api_key, connect_timeout=DEFAULT_CONNECT_TIMEOUT,
+                 first_token_timeout=DEFAULT_FIRST_TOKEN_TIMEOUT, stall_timeout=DEFAULT_STALL_TIMEOUT):
+        self.driver = driver
+        self.model_id = model_id
+        self.api_key = api_key
+        self.connect_timeout = connect_timeout
+        self.first_token_timeout = first_token_timeout
+        self.stall_timeout = stall_timeout
+        self.cancelled = threading.Event()
+        self.stall_reason = None
+        self._response = None
+        self._last_activity = 0.0
+        self._got_token = False
+
+    @property
+    def ready(self):
+        return bool(self.driver and self.driver.new_pod_id)
+
+    @property
+    def url(self):
+        return f"https://{self.driver.new_pod_id}-8000.proxy.runpod.net/v1/chat/completions"
+
+    def cancel(self):
+        """Closes the HTTP stream. Safe to call from another thread."""
+        self.cancelled.set()
+        response = self._response
+        if response is not None:
+            _abort_response(response)
+
+    def _watchdog(self, response):
+        """Closes the response when the stream goes silent past its deadline."""
+        while self._response is response and not self.cancelled.is_set():
+            deadline = self.stall_timeout if self._got_token else self.first_token_timeout
+            silence = time.time() - self._last_activity
+            if silence > deadline:
+                phase = "between tokens" if self._got_token else "before the first token"
+                self.stall_reason = f"stalled {silence:.1f}s {phase}"
+                _abort_response(response)
+                return
+            time.sleep(min(0.25, deadline / 4))
+
+    def stream_chat(self, messages, max_tokens=512, **sampling):
+        """
+        Yields content tokens. Closing the generator closes the HTTP stream.
+        Raises StreamStalled if the server goes silent past the configured deadlines.
+        """
+        payload = {
+            "model": self.model_id,
+            "messages": messages,
+            "max_tokens": max_tokens,
+            "stream": True, # CRITICAL: Enable streaming response
+            **sampling
+        }
+        headers = {"Authorization": f"Bearer {self.api_key}"}
+
+        self.stall_reason = None
+        self._got_token = False
+        self._last_activity = time.time()
+        import requests # Cloud only: keeps local sessions from paying for the import
+        trace = vox_trace.enabled
+        start, first, n_tokens = time.perf_counter(), None, 0
+        try:
+            # Socket-level backstop; the watchdog enforces the tighter inter-token deadline
+            with vox_trace.span(f"{self.name}.request", "generate"):
+                response = requests.post(self.url, json=payload, headers=headers, stream=True,
+                                         timeout=(self.connect_timeout, self.first_token_timeout))
+        except requests.exceptions.ReadTimeout as e:
+            raise StreamStalled(f"no response within {self.first_token_timeout}s") from e
+
+        self._response = response
+        threading.Thread(target=self._watchdog, args=(response,), daemon=True).start()
+        try:
+            if self.cancelled.is_set():
+                return
+            # chunk_size=None hands over each SSE event as it arrives instead of buffering 512 bytes
+            for chunk in response.iter_lines(chunk_size=None):
+                self._last_activity = time.time()
+                if not chunk:
+                    continue
+                try:
+                    decoded = chunk.decode('utf-8')
+                    if decoded.startswith("data: "):
+                        decoded = decoded[6:] # Robust stripping
+
+                    if decoded.strip() == "[DONE]":
+                        continue
+
+                    j = json.loads(decoded)
+                    if 'choices' in j and len(j['choices']) > 0:
+                        token = j['choices'][0].get('delta', {}).get('content', '')
+                        if token:
+                            self._got_token = True
+                            if trace:
+                                first = first or time.perf_counter()
+                                n_tokens += 1
+                            yield token
+                except (ValueError, KeyError, IndexError, AttributeError):
+                    pass # Silent fail on bad chunks is fine for stream
+        except Exception as e:
+            # Closing the response from cancel()/the watchdog surfaces as a read error here
+            if self.stall_reason:
+                raise StreamStalled(self.stall_reason) from e
+            if not self.cancelled.is_set():
+                raise
+        finally:
+            self._response = None
+            response.close()
+            if trace:
+                vox_trace.record_generation(self.name, start, first, n_tokens)
+
+        if self.stall_reason and not self.cancelled.is_set():
+            raise StreamStalled(self.stall_reason)
+
+
+class EndpointBackend(CloudBackend):
+    """Streams from any OpenAI-compatible base URL (RUNPOD_BASE_URL, vox_server.py, ...)."""
+    name = "endpoint"
+
+    def __init__(self, base_url, model_id, api_key, **timeouts):
+        super().__init__(None, model_id, api_key, **timeouts)
+        self.base_url = base_url.rstrip("/")
+
+    @property
+    def ready(self):
+        return True
+
+    @property
+    def url(self):
+        return f"{self.base_url}/chat/completions"
@@ -58,3 +58,48 @@ KEYWORD_TIERS = [
     ("72b", "tier_ultra"),
     ("miqu", "tier_ultra"),
 ]
+
+# The GPU planner (gpu_planner.py) sizes a model from its Hugging Face config.json and rents the
+# cheapest listed GPU that fits. The tiers above are only used when no config.json is available.
+# CLOUD_MAX_MODEL_LEN is the context to aim for; CLOUD_CONCURRENCY is how many full-length
+# sequences the KV cache must hold at once. Smaller cards get a shorter --max-model-len.
+CLOUD_MAX_MODEL_LEN = 8192
+CLOUD_CONCURRENCY = 2
+
+
+# =====================================================
+# 4. LOCAL ENGINE SETTINGS
+# =====================================================
+# How many local models stay loaded in memory for instant swap-back.
+# Older models are evicted first when RAM/VRAM runs short.
+LOCAL_CACHE_SIZE = 2
+
+# HYBRID boot mode answers from a small local model while the cloud pod boots.
+# Set to a MODEL_MAP key or a filename in 'models/'. None = smallest GGUF on disk.
+HYBRID_LOCAL_MODEL = None
+
+# Hedged generation races the cloud pod against the local engine (both must be loaded,
+# e.g. HYBRID mode after cut-over) and keeps whichever streams a token first.
+# HEDGE_DELAY is how long the cloud gets a head start before the local engine joins in.
+HEDGE_ENABLED = False
+HEDGE_DELAY = 0.5
+
+# Cloud stream deadlines (seconds). A stream that goes silent longer than this is treated
+# as stalled: the partial reply is kept and the local engine (if loaded) finishes it.
+CLOUD_CONNECT_TIMEOUT = 10
+CLOUD_FIRST_TOKEN_TIMEOUT = 60
+CLOUD_STALL_TIMEOUT = 15
+
+# AUTO boot mode routes each request to local or cloud, whichever is expected to finish first.
+# ROUTER_MAX_COST caps the expected cloud spend per request in USD (pod $/hr x time it is busy);
+# requests that would cost more stay local. None = always take the fastest.
+ROUTER_MAX_COST = None
+
+# Speculative decoding for LOCAL mode: a draft proposes several tokens and the main model
+# verifies them in one pass. "lookup" = n-gram prompt lookup (no extra model), or a small
+# GGUF in 'models/' from the same family, e.g. "qwen_0.5b_chat.gguf" for Qwen models.
+SPECULATIVE_DRAFT = None
+
+# Read the selected GGUF into the OS page cache on a background thread while the handshake
+# and engine start, so the first reply does not wait on disk. Mostly helps HDDs and network drives.
+PREFETCH_MODEL = True
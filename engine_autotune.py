@@ -0,0 +1,302 @@
+import os
+import gc
+import sys
+import json
+import time
+import hashlib
+import argparse
+import platform
+
+import psutil
+
+# ==========================================
+# ENGINE AUTOTUNER
+# ==========================================
+# The handshake's "golden" profile was tuned by hand on one Ryzen APU. This sweeps the knobs
+# that matter on the current machine for a given model, one at a time (coordinate descent),
+# and stores the winner so get_hardware_config(model_path) can return it.
+#
+# Each trial loads the model, times a fixed prompt (prefill) and a short greedy run (decode).
+# Pruning: a candidate that is clearly slower over its first few decode tokens is abandoned
+# without the full measurement, and a dimension stops once two candidates in a row fail to improve on the best.
+
+PROFILE_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "engine_profiles.json")
+HASH_BYTES = 16 * 1024 * 1024  # Head of the file hashed for the model key (full hash takes minutes)
+
+TUNE_PROMPT = ("The quick brown fox jumps over the lazy dog. " * 12).strip()
+PROBE_TOKENS = 8     # Decode tokens timed before deciding whether to prune
+DECODE_TOKENS = 48   # Full decode measurement
+PRUNE_RATIO = 0.75   # Probe slower than this fraction of the best -> rejected
+PATIENCE = 2         # Non-improving candidates before a dimension is abandoned
+TUNE_CTX = 1024
+
+
+# --- PROFILE KEYS ---
+def model_fingerprint(model_path):
+    """sha256 over the file size and its first 16 MB (GGUF header + leading tensors)."""
+    h = hashlib.sha256()
+    h.update(str(os.path.getsize(model_path)).encode())
+    with open(model_path, "rb") as f:
+        h.update(f.read(HASH_BYTES))
+    return h.hexdigest()[:16]
+
+
+def cpu_model():
+    try:
+        with open("/proc/cpuinfo", "r") as f:
+            for line in f:
+                if line.startswith("model name"):
+                    return line.split(":", 1)[1].strip()
+    except OSError:
+        pass
+    return platform.processor() or platform.machine()
+
+
+def detect_backend(root_path="."):
+    """Names the GPU backend the handshake would use, from the DLLs/shared objects present."""
+    from hardware_probe import available_gpu_backends
+    backends = available_gpu_backends(root_path)
+    return backends[0] if backends else "cpu"
+
+
+def profile_key(model_path, root_path="."):
+    return f"{model_fingerprint(model_path)}|{cpu_model()}|{detect_backend(root_path)}"
+
+
+def load_profiles(path=PROFILE_FILE):
+    if not os.path.exists(path):
+        return {}
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def save_profile(key, entry, path=PROFILE_FILE):
+    profiles = load_profiles(path)
+    profiles[key] = entry
+    tmp = path + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(profiles, f, indent=4)
+    os.replace(tmp, path)
+
+
+def get_tuned_profile(model_path, root_path=".", path=PROFILE_FILE):
+    """Returns the stored profile entry for this model/CPU/backend, or None."""
+    if not model_path or not os.path.exists(model_path):
+        return None
+    return load_profiles(path).get(profile_key(model_path, root_path))
+
+
+# --- MEASUREMENT ---
+def measure(model_path, cfg, decode_tokens=DECODE_TOKENS, prune_below=None):
+    """
+    Loads the model with cfg and returns {"prefill_tps", "decode_tps", "load_s"}.
+    If the first PROBE_TOKENS decode slower than prune_below t/s, stops early and adds "pruned".
+    Raises on load/eval failure (e.g. too many GPU layers for the VRAM).
+    """
+    from llama_cpp import Llama
+
+    os.environ["GGML_VK_FORCE_BUSY_WAIT"] = cfg.get("busy_wait", "0")
+    t0 = time.perf_counter()
+    llm = Llama(
+        model_path=model_path,
+        n_ctx=TUNE_CTX,
+        n_gpu_layers=cfg['n_gpu_layers'],
+        n_threads=cfg['n_threads'],
+        n_threads_batch=cfg['n_threads_batch'],
+        n_batch=cfg['n_batch'],
+        flash_attn=cfg['flash_attn'],
+        cache_type_k=cfg['cache_type_k'],
+        cache_type_v=cfg['cache_type_v'],
+        use_mlock=False,
+        verbose=False
+    )
+    try:
+        load_s = time.perf_counter() - t0
+        tokens = llm.tokenize(TUNE_PROMPT.encode("utf-8"))
+
+        # Warm the compute graph once so the first trial isn't penalised
+        llm.eval(tokens[:8])
+        llm.reset()
+
+        t0 = time.perf_counter()
+        llm.eval(tokens)
+        prefill_tps = len(tokens) / (time.perf_counter() - t0)
+
+        # The prompt is already in the KV cache: generate() samples straight away
+        n, t_first, pruned = 0, None, False
+        gen = llm.generate(tokens, top_k=1, temp=0.0, repeat_penalty=1.0)
+        try:
+            for _ in gen:
+                n += 1
+                if n == 1:
+                    t_first = time.perf_counter() # Excludes sampling the first token
+                if n == PROBE_TOKENS + 1 and prune_below:
+                    if PROBE_TOKENS / (time.perf_counter() - t_first) < prune_below:
+                        pruned = True
+                        break
+                if n > decode_tokens:
+                    break
+        finally:
+            gen.close()
+        decode_tps = (n - 1) / (time.perf_counter() - t_first) if n > 1 else 0.0
+        result = {"prefill_tps": round(prefill_tps, 2), "decode_tps": round(decode_tps, 2), "load_s": round(load_s, 2)}
+        if pruned:
+            result["pruned"] = True
+        return result
+    finally:
+        del llm
+        gc.collect()
+
+
+def score(result, objective="decode"):
+    """Decode speed drives chat latency; prefill breaks ties (and wins for objective='prefill')."""
+    if result is None:
+        return 0.0
+    if objective == "prefill":
+        return result["prefill_tps"] + result["decode_tps"] * 1e-3
+    return result["decode_tps"] + result["prefill_tps"] * 1e-3
+
+
+# --- SEARCH SPACE ---
+def search_space(base):
+    phys = psutil.cpu_count(logical=False) or 4
+    logical = psutil.cpu_count(logical=True) or phys
+    threads = sorted({max(1, phys // 2), max(1, phys * 3 // 4), phys, logical})
+    return [
+        ("n_gpu_layers", sorted({0, 8, 16, 24, base["n_gpu_layers"], 32, 48}) + [-1]),
+        ("n_threads", threads),
+        ("n_threads_batch", sorted({max(1, phys // 2), phys, logical})),
+        ("n_batch", [128, 256, 512, 1024]),
+        ("kv_cache", ["f16", "q8_0"]),
+    ]
+
+
+def _apply(cfg, name, value):
+    cfg = dict(cfg)
+    if name == "kv_cache":
+        cfg["cache_type_k"] = cfg["cache_type_v"] = value
+        if value != "f16":
+            cfg["flash_attn"] = True # Quantized V cache requires flash attention
+    else:
+        cfg[name] = value
+    return cfg
+
+
+def autotune(model_path, base_config, objective="decode", max_trials=40, measure_fn=measure, verbose=True):
+    """
+    Coordinate-descent sweep starting from base_config.
+    Returns (best_config, best_result, trials) where trials lists every measured candidate.
+    """
+    log = print if verbose else (lambda *a, **k: None)
+    seen = {}
+    trials = []
+
+    def run(cfg):
+        key = json.dumps(cfg, sort_keys=True)
+        if key in seen:
+            return seen[key]
+        if len(trials) >= max_trials:
+            return None
+        result = None
+        prune_below = best_result["decode_tps"] * PRUNE_RATIO if best_result and objective == "decode" else None
+        try:
+            result = measure_fn(model_path, cfg, prune_below=prune_below)
+            if result.get("pruned"):
+                log(f"[AUTOTUNE]    pruned after {PROBE_TOKENS}-token probe ({result['decode_tps']} t/s)")
+        except Exception as e:
+            log(f"[AUTOTUNE]    failed: {e}")
+        seen[key] = result
+        trials.append({"config": cfg, "result": result})
+        return result
+
+    best_cfg = dict(base_config)
+    best_result = None
+    log(f"[AUTOTUNE] Baseline: {_describe(best_cfg)}")
+    best_result = run(best_cfg)
+    if best_result is None:
+        raise RuntimeError("Baseline configuration failed to load; cannot tune")
+    log(f"[AUTOTUNE]    prefill {best_result['prefill_tps']} t/s | decode {best_result['decode_tps']} t/s")
+
+    for name, candidates in search_space(base_config):
+        current = best_cfg["cache_type_k"] if name == "kv_cache" else best_cfg.get(name)
+        if name == "kv_cache":
+            directions = [[v for v in candidates if v != current]]
+        else:
+            # Walk outwards from the current value in both directions (-1 = all layers, the top)
+            rank = lambda v: float("inf") if (name == "n_gpu_layers" and v == -1) else v
+            directions = [sorted((v for v in candidates if rank(v) > rank(current)), key=rank),
+                          sorted((v for v in candidates if rank(v) < rank(current)), key=rank, reverse=True)]
+
+        for direction in directions:
+            misses = 0
+            for value in direction:
+                cfg = _apply(best_cfg, name, value)
+                log(f"[AUTOTUNE] {name}={value}")
+                result = run(cfg)
+                if result is None and name == "n_gpu_layers":
+                    break # Out of VRAM: more layers will not fit either
+                if result and not result.get("pruned"):
+                    log(f"[AUTOTUNE]    prefill {result['prefill_tps']} t/s | decode {result['decode_tps']} t/s")
+                if result and not result.get("pruned") and score(result, objective) > score(best_result, objective):
+                    best_cfg, best_result, misses = cfg, result, 0
+                else:
+                    misses += 1
+                    if misses >= PATIENCE:
+                        break
+        if len(trials) >= max_trials:
+            log("[AUTOTUNE] Trial budget exhausted.")
+            break
+
+    return best_cfg, best_result, trials
+
+
+def _describe(cfg):
+    return (f"gpu_layers={cfg['n_gpu_layers']} threads={cfg['n_threads']}/{cfg['n_threads_batch']} "
+            f"batch={cfg['n_batch']} kv={cfg['cache_type_k']}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Tune llama.cpp settings for a model on this machine")
+    parser.add_argument("--model", required=True, help="GGUF path or file name in models/")
+    parser.add_argument("--objective", choices=("decode", "prefill"), default="decode")
+    parser.add_argument("--max-trials", type=int, default=40)
+    args = parser.parse_args(argv)
+
+    model_path = args.model if os.path.isfile(args.model) else os.path.join("models", args.model)
+    if not os.path.isfile(model_path):
+        sys.exit(f"[AUTOTUNE] ❌ Model not found: {args.model}")
+
+    import hardware_probe
+    import machine_engine_handshake
+    mode, _, base = machine_engine_handshake.get_hardware_config(tuned=False)
+    base.pop("affinity", None) # Trials run unpinned; the profile's thread counts assume that
+
+    # Load the ggml backends the way the chat does, or the trials run without Vulkan/CPU variants
+    root_path = os.path.abspath(".")
+    os.environ["GGML_BACKEND_SEARCH_PATH"] = root_path
+    backends = hardware_probe.load_backends(root_path)
+    if backends.get("error"):
+        print(f"[AUTOTUNE] ⚠️ Backend load warning: {backends['error']}")
+
+    print(f"[AUTOTUNE] Tuning {os.path.basename(model_path)} on {cpu_model()} ({detect_backend(root_path)})")
+    best_cfg, best_result, trials = autotune(model_path, base, objective=args.objective, max_trials=args.max_trials)
+
+    save_profile(profile_key(model_path, root_path), {
+        "model": os.path.basename(model_path),
+        "mode": mode,
+        "objective": args.objective,
+        "config": best_cfg,
+        "result": best_result,
+        "trials": len(trials),
+        "tuned_at": time.strftime("%Y-%m-%d %H:%M:%S"),
+    })
+    print(f"\n[AUTOTUNE] ✅ Best: {_describe(best_cfg)}")
+    print(f"[AUTOTUNE]    prefill {best_result['prefill_tps']} t/s | decode {best_result['decode_tps']} t/s "
+          f"({len(trials)} trials). Saved to {PROFILE_FILE}")
+
+
+if __name__ == "__main__":
+    main()
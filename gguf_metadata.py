@@ -0,0 +1,254 @@
+import os
+import mmap
+import struct
+
+# ==========================================
+# GGUF HEADER READER
+# ==========================================
+# Reads the key/value metadata and tensor table of a .gguf file through mmap, without
+# loading llama.cpp or touching the tensor data. Used for memory planning and the model index.
+
+GGUF_MAGIC = b"GGUF"
+DEFAULT_ALIGNMENT = 32
+MAX_ARRAY_ITEMS = 64  # Longer arrays (vocab, merges) are skipped and reported by length only
+
+# Metadata value types
+_SCALARS = {
+    0: "<B", 1: "<b", 2: "<H", 3: "<h", 4: "<I", 5: "<i",
+    6: "<f", 7: "<?", 10: "<Q", 11: "<q", 12: "<d",
+}
+_STRING, _ARRAY = 8, 9
+
+# ggml tensor types -> (elements per block, bytes per block)
+GGML_TYPES = {
+    0: ("F32", 1, 4), 1: ("F16", 1, 2), 2: ("Q4_0", 32, 18), 3: ("Q4_1", 32, 20),
+    6: ("Q5_0", 32, 22), 7: ("Q5_1", 32, 24), 8: ("Q8_0", 32, 34), 9: ("Q8_1", 32, 36),
+    10: ("Q2_K", 256, 84), 11: ("Q3_K", 256, 110), 12: ("Q4_K", 256, 144), 13: ("Q5_K", 256, 176),
+    14: ("Q6_K", 256, 210), 15: ("Q8_K", 256, 292), 16: ("IQ2_XXS", 256, 66), 17: ("IQ2_XS", 256, 74),
+    18: ("IQ3_XXS", 256, 98), 19: ("IQ1_S", 256, 50), 20: ("IQ4_NL", 32, 18), 21: ("IQ3_S", 256, 110),
+    22: ("IQ2_S", 256, 82), 23: ("IQ4_XS", 256, 136), 24: ("I8", 1, 1), 25: ("I16", 1, 2),
+    26: ("I32", 1, 4), 27: ("I64", 1, 8), 28: ("F64", 1, 8), 29: ("IQ1_M", 256, 56),
+    30: ("BF16", 1, 2), 34: ("TQ1_0", 256, 54), 35: ("TQ2_0", 256, 66), 39: ("MXFP4", 32, 17),
+}
+
+
+class GGUFError(ValueError):
+    """The file is not a GGUF file or its header is truncated/corrupt."""
+
+
+class TensorInfo:
+    __slots__ = ("name", "shape", "type_id", "offset")
+
+    def __init__(self, name, shape, type_id, offset):
+        self.name = name
+        self.shape = shape
+        self.type_id = type_id
+        self.offset = offset
+
+    @property
+    def type_name(self):
+        return GGML_TYPES.get(self.type_id, (f"type{self.type_id}",))[0]
+
+    @property
+    def n_elements(self):
+        n = 1
+        for d in self.shape:
+            n *= d
+        return n
+
+    @property
+    def nbytes(self):
+        info = GGML_TYPES.get(self.type_id)
+        if info is None:
+            return 0
+        _, block, size = info
+        return self.n_elements // block * size
+
+    @property
+    def layer(self):
+        """Block index for 'blk.<N>.*' tensors, else None (embeddings, output, norms)."""
+        if self.name.startswith("blk."):
+            try:
+                return int(self.name.split(".", 2)[1])
+            except ValueError:
+                return None
+        return None
+
+
+class GGUFReader:
+    """
+    Parsed GGUF header.
+
+        meta = GGUFReader("models/x.gguf")
+        meta.architecture, meta.block_count, meta.context_length
+        meta.metadata["general.name"], meta.tensors[0].nbytes, meta.layer_bytes()
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.file_size = os.path.getsize(path)
+        self.metadata = {}
+        self.array_lengths = {} # Skipped arrays: key -> item count
+        self.tensors = []
+        self.version = None
+        self.data_offset = None
+        with open(path, "rb") as f:
+            try:
+                mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            except ValueError as e:
+                raise GGUFError(f"{path}: empty file") from e
+            try:
+                self._parse(mm)
+            except (struct.error, IndexError, UnicodeDecodeError) as e:
+                raise GGUFError(f"{path}: truncated or corrupt GGUF header") from e
+            finally:
+                mm.close()
+
+    # --- PARSING ---
+    def _parse(self, mm):
+        if mm[:4] != GGUF_MAGIC:
+            raise GGUFError(f"{self.path}: not a GGUF file")
+        self.version = struct.unpack_from("<I", mm, 4)[0]
+        if self.version == 1:
+            n_tensors, n_kv = struct.unpack_from("<II", mm, 8)
+            pos = 16
+        else:
+            n_tensors, n_kv = struct.unpack_from("<QQ", mm, 8)
+            pos = 24
+
+        for _ in range(n_kv):
+            key, pos = self._string(mm, pos)
+            vtype = struct.unpack_from("<I", mm, pos)[0]
+            value, pos = self._value(mm, pos + 4, vtype, key)
+            if value is not None:
+                self.metadata[key] = value
+
+        for _ in range(n_tensors):
+            name, pos = self._string(mm, pos)
+            n_dims = struct.unpack_from("<I", mm, pos)[0]
+            shape = list(struct.unpack_from(f"<{n_dims}Q", mm, pos + 4))
+            pos += 4 + 8 * n_dims
+            type_id, offset = struct.unpack_from("<IQ", mm, pos)
+            pos += 12
+            self.tensors.append(TensorInfo(name, shape, type_id, offset))
+
+        align = int(self.metadata.get("general.alignment", DEFAULT_ALIGNMENT))
+        self.data_offset = (pos + align - 1) // align * align
+
+    def _string(self, mm, pos):
+        length = struct.unpack_from("<Q", mm, pos)[0]
+        pos += 8
+        return bytes(mm[pos:pos + length]).decode("utf-8", errors="replace"), pos + length
+
+    def _value(self, mm, pos, vtype, key=None):
+        if vtype in _SCALARS:
+            fmt = _SCALARS[vtype]
+            return struct.unpack_from(fmt, mm, pos)[0], pos + struct.calcsize(fmt)
+        if vtype == _STRING:
+            return self._string(mm, pos)
+        if vtype == _ARRAY:
+            item_type, count = struct.unpack_from("<IQ", mm, pos)
+            pos += 12
+            if count > MAX_ARRAY_ITEMS:
+                self.array_lengths[key] = count
+                if item_type in _SCALARS:
+                    return None, pos + count * struct.calcsize(_SCALARS[item_type])
+                for _ in range(count):
+                    _, pos = self._value(mm, pos, item_type)
+                return None, pos
+            items = []
+            for _ in range(count):
+                item, pos = self._value(mm, pos, item_type)
+                items.append(item)
+            return items, pos
+        raise GGUFError(f"{self.path}: unknown metadata type {vtype}")
+
+    # --- CONVENIENCE ---
+    @property
+    def architecture(self):
+        return self.metadata.get("general.architecture", "llama")
+
+    def arch_value(self, name, default=None):
+        return self.metadata.get(f"{self.architecture}.{name}", default)
+
+    @property
+    def block_count(self):
+        return int(self.arch_value("block_count", 0)) or None
+
+    @property
+    def context_length(self):
+        return int(self.arch_value("context_length", 0)) or None
+
+    @property
+    def embedding_length(self):
+        return int(self.arch_value("embedding_length", 0)) or None
+
+    @property
+    def n_vocab(self):
+        return self.array_lengths.get("tokenizer.ggml.tokens") or len(self.metadata.get("tokenizer.ggml.tokens", [])) or None
+
+    def attention_dims(self):
+        """(n_head, n_head_kv, key_length, value_length) for KV cache sizing."""
+        n_head = self.arch_value("attention.head_count", 0)
+        n_head_kv = self.arch_value("attention.head_count_kv", n_head)
+        # Per-layer lists appear in some hybrid models; size for the widest layer
+        if isinstance(n_head, list):
+            n_head = max(n_head or [0])
+        if isinstance(n_head_kv, list):
+            n_head_kv = max(n_head_kv or [0])
+        n_head = int(n_head or 0)
+        n_head_kv = int(n_head_kv or n_head)
+        head_dim = (self.embedding_length or 0) // n_head if n_head else 0
+        key_length = int(self.arch_value("attention.key_length", head_dim) or head_dim)
+        value_length = int(self.arch_value("attention.value_length", head_dim) or head_dim)
+        return n_head, n_head_kv, key_length, value_length
+
+    @property
+    def weights_bytes(self):
+        total = sum(t.nbytes for t in self.tensors)
+        return total or max(0, self.file_size - (self.data_offset or 0))
+
+    def layer_bytes(self):
+        """{layer index: bytes} for repeating blocks, plus None for the rest (embeddings, output)."""
+        sizes = {}
+        for t in self.tensors:
+            sizes[t.layer] = sizes.get(t.layer, 0) + t.nbytes
+        return sizes
+
+    def output_bytes(self):
+        """Bytes of the output head (offloaded only when every layer is on the GPU)."""
+        return sum(t.nbytes for t in self.tensors if t.name.startswith("output"))
+
+    def summary(self):
+        n_head, n_head_kv, k_len, v_len = self.attention_dims()
+        return {
+            "name": self.metadata.get("general.name"),
+            "architecture": self.architecture,
+            "file_type": self.metadata.get("general.file_type"),
+            "block_count": self.block_count,
+            "context_length": self.context_length,
+            "embedding_length": self.embedding_length,
+            "n_head": n_head,
+            "n_head_kv": n_head_kv,
+            "head_dim_k": k_len,
+            "head_dim_v": v_len,
+            "n_vocab": self.n_vocab,
+            "n_tensors": len(self.tensors),
+            "weights_bytes": self.weights_bytes,
+            "chat_template": bool(self.metadata.get("tokenizer.chat_template")),
+        }
+
+
+def read_gguf(path):
+    """Returns a GGUFReader, or None if the file is not a readable GGUF."""
+    try:
+        return GGUFReader(path)
+    except (OSError, GGUFError):
+        return None
+
+
+if __name__ == "__main__":
+    import sys
+    import json
+    for path in sys.argv[1:]:
+        print(json.dumps(GGUFReader(path).summary(), indent=4))
@@ -0,0 +1,213 @@
+import os
+import sys
+import time
+import ctypes
+import threading
+
+try:
+    import psutil
+except ImportError:
+    psutil = None
+
+from gguf_metadata import read_gguf
+
+# ==========================================
+# GGUF PREFETCH
+# ==========================================
+# llama.cpp mmaps the model and faults weights in on first use, so on a slow disk the first
+# reply after a load or swap pays for reading the whole file. This starts pulling the tensor
+# data into the OS page cache as soon as a model is chosen, on a background thread, so the
+# read overlaps the handshake, backend DLL loading and Llama() setup.
+#
+# Linux: posix_fadvise(SEQUENTIAL + WILLNEED) starts kernel readahead, and sequential reads
+# make sure it happens (WILLNEED is only advisory on network filesystems).
+# Elsewhere: sequential reads (O_SEQUENTIAL on Windows).
+
+CHUNK_BYTES = 8 * 1024 * 1024
+RAM_FRACTION = 0.80  # Prefetching more than free RAM would evict its own earlier pages
+
+
+class ModelPrefetcher:
+    """
+        prefetcher = ModelPrefetcher(model_path).start()
+        ... handshake, backend load, Llama(...) ...
+        prefetcher.report()  # {"bytes_read", "total_bytes", "elapsed_s", "mb_s", "resident_pct", "done"}
+    """
+
+    def __init__(self, path, chunk_bytes=CHUNK_BYTES, budget=None):
+        self.path = path
+        self.chunk_bytes = chunk_bytes
+        self.ranges = tensor_ranges(path)
+        self.total_bytes = sum(length for _, length in self.ranges)
+        if budget is None and psutil is not None:
+            budget = int(psutil.virtual_memory().available * RAM_FRACTION)
+        self.budget = min(self.total_bytes, budget) if budget is not None else self.total_bytes
+        self.bytes_read = 0
+        self.started = None
+        self.finished = None
+        self.error = None
+        self._cancel = threading.Event()
+        self._thread = None
+
+    def start(self):
+        self.started = time.perf_counter()
+        self._thread = threading.Thread(target=self._run, name="gguf-prefetch", daemon=True)
+        self._thread.start()
+        return self
+
+    def _run(self):
+        flags = os.O_RDONLY | getattr(os, "O_BINARY", 0) | getattr(os, "O_SEQUENTIAL", 0)
+        try:
+            fd = os.open(self.path, flags)
+        except OSError as e:
+            self.error = str(e)
+            self.finished = time.perf_counter()
+            return
+        try:
+            if hasattr(os, "posix_fadvise"):
+                remaining = self.budget
+                for offset, length in self.ranges:
+                    length = min(length, remaining)
+                    if length <= 0:
+                        break
+                    os.posix_fadvise(fd, offset, length, os.POSIX_FADV_SEQUENTIAL)
+                    os.posix_fadvise(fd, offset, length, os.POSIX_FADV_WILLNEED)
+                    remaining -= length
+
+            buf = bytearray(self.chunk_bytes)
+            view = memoryview(buf)
+            with os.fdopen(fd, "rb", buffering=0, closefd=False) as f:
+                for offset, length in self.ranges:
+                    f.seek(offset)
+                    while length > 0 and self.bytes_read < self.budget:
+                        if self._cancel.is_set():
+                            return
+                        n = f.readinto(view[:min(length, self.chunk_bytes)])
+                        if not n:
+                            break
+                        self.bytes_read += n
+                        length -= n
+        except OSError as e:
+            self.error = str(e)
+        finally:
+            os.close(fd)
+            self.finished = time.perf_counter()
+
+    def cancel(self):
+        self._cancel.set()
+
+    def wait(self, timeout=None):
+        if self._thread is not None:
+            self._thread.join(timeout)
+        return self.done
+
+    @property
+    def done(self):
+        return self.finished is not None
+
+    def report(self, residency=True):
+        """Progress so far; resident_pct measures the page cache itself (Linux) rather than our reads."""
+        end = self.finished or time.perf_counter()
+        elapsed = end - self.started if self.started else 0.0
+        result = {
+            "bytes_read": self.bytes_read,
+            "total_bytes": self.total_bytes,
+            "elapsed_s": round(elapsed, 2),
+            "mb_s": round(self.bytes_read / elapsed / 1e6, 1) if elapsed > 0 else None,
+            "resident_pct": None,
+            "done": self.done,
+        }
+        if self.budget < self.total_bytes:
+            result["capped_at"] = self.budget
+        if self.error:
+            result["error"] = self.error
+        if residency:
+            frac = page_cache_residency(self.path)
+            result["resident_pct"] = round(frac * 100, 1) if frac is not None else None
+        return result
+
+
+def tensor_ranges(path):
+    """[(offset, length)] of the tensor data, merged into contiguous runs; the whole file if unparseable."""
+    size = os.path.getsize(path)
+    meta = read_gguf(path)
+    if meta is None or not meta.tensors:
+        return [(0, size)]
+    if any(t.nbytes == 0 for t in meta.tensors): # Tensor type we cannot size: read all of the data
+        return [(meta.data_offset, max(0, size - meta.data_offset))]
+    spans = sorted((meta.data_offset + t.offset, t.nbytes) for t in meta.tensors)
+    merged = []
+    for offset, length in spans:
+        if merged and offset <= merged[-1][0] + merged[-1][1] + 64 * 1024: # Alignment padding
+            start, prev = merged[-1]
+            merged[-1] = (start, max(prev, offset + length - start))
+        else:
+            merged.append((offset, length))
+    # Never read past EOF (truncated or partially downloaded files)
+    return [(o, min(l, size - o)) for o, l in merged if o < size]
+
+
+def page_cache_residency(path):
+    """Fraction of the file's pages in the page cache (Linux mincore), or None where unsupported."""
+    if not sys.platform.startswith("linux"):
+        return None
+    size = os.path.getsize(path)
+    if size == 0:
+        return 1.0
+    try:
+        libc = ctypes.CDLL(None, use_errno=True)
+        libc.mmap.restype = ctypes.c_void_p
+        libc.mmap.argtypes = [ctypes.c_void_p, ctypes.c_size_t, ctypes.c_int, ctypes.c_int, ctypes.c_int, ctypes.c_long]
+        libc.mincore.argtypes = [ctypes.c_void_p, ctypes.c_size_t, ctypes.c_void_p]
+        libc.munmap.argtypes = [ctypes.c_void_p, ctypes.c_size_t]
+    except (OSError, AttributeError):
+        return None
+
+    PROT_READ, MAP_SHARED = 1, 1
+    fd = os.open(path, os.O_RDONLY)
+    try:
+        addr = libc.mmap(None, size, PROT_READ, MAP_SHARED, fd, 0)
+        if addr is None or addr == ctypes.c_void_p(-1).value:
+            return None
+        try:
+            page = os.sysconf("SC_PAGE_SIZE")
+            n_pages = (size + page - 1) // page
+            vec = (ctypes.c_ubyte * n_pages)()
+            if libc.mincore(addr, size, vec) != 0:
+                return None
+            return (n_pages - bytes(vec).count(0)) / n_pages
+        finally:
+            libc.munmap(addr, size)
+    finally:
+        os.close(fd)
+
+
+def start_prefetch(path):
+    """Starts a prefetcher for path, or returns None if the file cannot be opened."""
+    try:
+        return ModelPrefetcher(path).start()
+    except OSError:
+        return None
+
+
+def describe(report):
+    gb = report["bytes_read"] / 1024**3
+    total = report["total_bytes"] / 1024**3
+    text = f"{gb:.1f}/{total:.1f} GB read"
+    if report["mb_s"]:
+        text += f" at {report['mb_s']:.0f} MB/s"
+    if report["resident_pct"] is not None:
+        text += f", {report['resident_pct']:.0f}% resident"
+    if not report["done"]:
+        text += " (still running)"
+    return text
+
+
+if __name__ == "__main__":
+    for path in sys.argv[1:]:
+        before = page_cache_residency(path)
+        prefetcher = ModelPrefetcher(path).start()
+        prefetcher.wait()
+        if before is not None:
+            print(f"{os.path.basename(path)}: {before:.0%} resident before")
+        print(f"{os.path.basename(path)}: {describe(prefetcher.report())}")
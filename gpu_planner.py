@@ -0,0 +1,322 @@
+import os
+import sys
+import glob
+import json
+import math
+import argparse
+import urllib.error
+import urllib.request
+
+from model_downloader import hf_url, USER_AGENT
+
+# ==========================================
+# GPU PLACEMENT PLANNER
+# ==========================================
+# Sizes a Hugging Face model for vLLM from its config.json instead of guessing from its name.
+# It counts parameters from the architecture (hidden size, layers, heads, MLP width, experts,
+# vocab), weight bytes from the quantization (AWQ/GPTQ/FP8/bnb/MXFP4 or the dtype), and KV cache
+# bytes per token from layers x KV heads x head_dim. Then it finds the cheapest GPU in the RunPod
+# catalog that fits weights + runtime overhead + KV for max_model_len x concurrency, with
+# headroom, and picks the --max-model-len and --gpu-memory-utilization to start vLLM with.
+#
+# Configs come from the local Hugging Face cache or model_configs/ (<org>--<name>.json).
+# With fetch=True / --fetch a missing config.json is downloaded there once.
+#
+#   python gpu_planner.py Qwen/Qwen2.5-72B-Instruct-AWQ --max-model-len 16384 --concurrency 4
+#   python gpu_planner.py path/to/config.json --catalog gpus.json
+
+CONFIG_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "model_configs")
+GIB = 1024 ** 3
+
+DEFAULT_MAX_MODEL_LEN = 8192
+DEFAULT_CONCURRENCY = 2     # Sequences at full max_model_len the KV cache must hold
+MIN_MODEL_LEN = 2048        # Below this the model is not worth serving
+LEN_STEP = 1024             # --max-model-len is shrunk in these steps
+HEADROOM = 0.08             # Slack on top of the estimate (allocator fragmentation, estimate error)
+DEFAULT_UTILIZATION = 0.90  # vLLM's default; leftover memory becomes extra KV cache
+MAX_UTILIZATION = 0.95      # Above this the CUDA context and NCCL buffers OOM at startup
+RUNTIME_OVERHEAD_GB = 1.5   # CUDA graphs, sampler and activation peak during vLLM's profile run
+ACTIVATION_FRACTION = 0.04  # ...plus a share of the weights for larger hidden sizes
+KV_DTYPE_BYTES = 2          # --kv-cache-dtype auto (fp16/bf16)
+
+_DTYPE_BYTES = {"float32": 2, "float": 2, "float16": 2, "half": 2, "bfloat16": 2, "float8": 1}  # vLLM serves fp32 as 16-bit
+_QUANT_BITS = {"awq": 4, "gptq": 4, "bitsandbytes": 4, "mxfp4": 4, "fp8": 8, "compressed-tensors": 4,
+               "squeezellm": 4, "marlin": 4, "aqlm": 2, "gguf": 4}
+
+
+class GPUPlanError(ValueError):
+    """A config.json that cannot be read or sized."""
+
+
+# --- CONFIG LOOKUP ---
+def _hf_cache_dirs():
+    if os.environ.get("HF_HUB_CACHE"):
+        return [os.environ["HF_HUB_CACHE"]]
+    home = os.environ.get("HF_HOME") or os.path.join(os.path.expanduser("~"), ".cache", "huggingface")
+    return [os.path.join(home, "hub")]
+
+
+def find_cached_config(model_id, config_dir=CONFIG_DIR):
+    """Path of a cached config.json for model_id (model_configs/ first, then the HF hub cache), or None."""
+    local = os.path.join(config_dir, model_id.replace("/", "--") + ".json")
+    if os.path.isfile(local):
+        return local
+    for hub in _hf_cache_dirs():
+        pattern = os.path.join(hub, "models--" + model_id.replace("/", "--"), "snapshots", "*", "config.json")
+        found = glob.glob(pattern)
+        if found:
+            return max(found, key=os.path.getmtime)
+    return None
+
+
+def fetch_config(model_id, config_dir=CONFIG_DIR, timeout=15):
+    """Downloads config.json into model_configs/ and returns its path. HF_TOKEN is used for gated repos."""
+    headers = {"User-Agent": USER_AGENT}
+    if os.environ.get("HF_TOKEN"):
+        headers["Authorization"] = f"Bearer {os.environ['HF_TOKEN']}"
+    try:
+        req = urllib.request.Request(hf_url(model_id, "config.json"), headers=headers)
+        with urllib.request.urlopen(req, timeout=timeout) as resp:
+            config = json.loads(resp.read().decode("utf-8"))
+    except (urllib.error.URLError, OSError, ValueError) as e:
+        raise GPUPlanError(f"could not fetch config.json for {model_id}: {e}")
+    os.makedirs(config_dir, exist_ok=True)
+    path = os.path.join(config_dir, model_id.replace("/", "--") + ".json")
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(config, f, indent=2)
+    return path
+
+
+def load_model_config(model_id_or_path, fetch=False, config_dir=CONFIG_DIR):
+    """config.json as a dict, from a file path or a cached/fetched Hugging Face ID. None if unavailable."""
+    path = model_id_or_path if os.path.isfile(model_id_or_path) else find_cached_config(model_id_or_path, config_dir)
+    if path is None and fetch:
+        path = fetch_config(model_id_or_path, config_dir)
+    if path is None:
+        return None
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError) as e:
+        raise GPUPlanError(f"unreadable config {path}: {e}")
+
+
+# --- MODEL SIZE ---
+def _quantization(config, text):
+    """(method, bits per weight incl. scales, bits for unquantized tensors)"""
+    quant = config.get("quantization_config") or text.get("quantization_config") or {}
+    dtype = str(config.get("torch_dtype") or text.get("torch_dtype") or "bfloat16").replace("torch.", "")
+    base_bits = _DTYPE_BYTES.get(dtype, 2) * 8
+    method = str(quant.get("quant_method") or "").lower()
+    if not method:
+        return None, base_bits, base_bits
+    if method == "bitsandbytes":
+        bits = 4 if quant.get("load_in_4bit") or quant.get("_load_in_4bit") else 8
+    elif method == "compressed-tensors":
+        groups = quant.get("config_groups") or {}
+        weights = next(iter(groups.values()), {}).get("weights", {}) if groups else {}
+        bits = weights.get("num_bits") or 8
+    else:
+        bits = quant.get("bits") or quant.get("w_bit") or _QUANT_BITS.get(method, 4)
+    if method == "mxfp4":
+        bits = 4.25 # E2M1 values + one 8-bit scale per 32
+    elif bits < 8:
+        group = quant.get("group_size") or quant.get("q_group_size") or 128
+        if group and group > 0:
+            bits += (16 + bits) / group # fp16 scale + zero point per group
+    return method, bits, base_bits
+
+
+def model_profile(config):
+    """
+    Size facts from a transformers config.json: params, weight bytes, KV bytes per token and
+    the context limit. Multimodal configs are sized by their text model (the vision tower is
+    small next to it and counted in the overhead share).
+    """
+    text = config.get("text_config") or config.get("llm_config") or config
+    get = lambda *keys, default=None: next((text[k] for k in keys if text.get(k) is not None), default)
+
+    hidden = get("hidden_size", "n_embd", "d_model")
+    layers = get("num_hidden_layers", "n_layer", "num_layers")
+    heads = get("num_attention_heads", "n_head")
+    vocab = get("vocab_size", default=32000)
+    if not (hidden and layers and heads):
+        raise GPUPlanError("config.json lacks hidden_size / num_hidden_layers / num_attention_heads")
+    kv_heads = get("num_key_value_heads", "num_kv_heads", default=heads)
+    head_dim = get("head_dim", default=hidden // heads)
+    intermediate = get("intermediate_size", "n_inner", "ffn_dim", default=4 * hidden)
+    experts = get("num_local_experts", "num_experts", "n_routed_experts", default=0)
+    expert_width = get("moe_intermediate_size", default=intermediate)
+    shared_experts = get("n_shared_experts", "num_shared_experts", default=0)
+    tied = text.get("tie_word_embeddings", config.get("tie_word_embeddings", False))
+
+    q_dim, kv_dim = heads * head_dim, kv_heads * head_dim
+    attn = hidden * q_dim * 2 + hidden * kv_dim * 2
+    if experts:
+        mlp = 3 * hidden * expert_width * (experts + shared_experts) + hidden * experts # + router
+        active_mlp = 3 * hidden * expert_width * (get("num_experts_per_tok", default=2) + shared_experts)
+    else:
+        mlp = 3 * hidden * intermediate # Gated MLP (up, gate, down)
+    body = layers * (attn + mlp)
+    embeddings = vocab * hidden * (1 if tied else 2)
+
+    method, bits, base_bits = _quantization(config, text)
+    weight_bytes = body * bits / 8 + embeddings * base_bits / 8 # Embeddings and lm_head stay unquantized
+    max_position = get("max_position_embeddings", "n_positions", "seq_length", default=None)
+    rope = text.get("rope_scaling") or {}
+    if max_position and rope.get("factor") and rope.get("type", rope.get("rope_type")) in ("yarn", "dynamic"):
+        max_position = int(max(max_position, (rope.get("original_max_position_embeddings") or max_position) * rope["factor"]))
+    return {
+        "architecture": (config.get("architectures") or [config.get("model_type")])[0],
+        "params_b": round((body + embeddings) / 1e9, 2),
+        "active_params_b": round((layers * (attn + active_mlp) + embeddings) / 1e9, 2) if experts else None,
+        "quantization": method,
+        "bits_per_weight": round(bits, 2),
+        "weights_gb": round(weight_bytes / GIB, 2),
+        "layers": layers,
+        "kv_heads": kv_heads,
+        "head_dim": head_dim,
+        "kv_bytes_per_token": 2 * layers * kv_dim * KV_DTYPE_BYTES,
+        "max_position": max_position,
+    }
+
+
+def estimate_vram(profile, max_model_len, concurrency=DEFAULT_CONCURRENCY):
+    """GiB needed: weights, KV for max_model_len x concurrency tokens, runtime overhead."""
+    kv_gb = profile["kv_bytes_per_token"] * max_model_len * concurrency / GIB
+    overhead_gb = RUNTIME_OVERHEAD_GB + ACTIVATION_FRACTION * profile["weights_gb"]
+    return {
+        "weights_gb": profile["weights_gb"],
+        "kv_gb": round(kv_gb, 2),
+        "overhead_gb": round(overhead_gb, 2),
+        "total_gb": round(profile["weights_gb"] + kv_gb + overhead_gb, 2),
+    }
+
+
+# --- PLACEMENT ---
+def plan_for_gpu(profile, vram_gb, max_model_len=DEFAULT_MAX_MODEL_LEN, concurrency=DEFAULT_CONCURRENCY,
+                 headroom=HEADROOM):
+    """
+    Largest --max-model-len (up to the target) that fits a card with vram_gb, and the
+    --gpu-memory-utilization to start with. None if not even MIN_MODEL_LEN fits.
+    """
+    target = max_model_len
+    if profile.get("max_position"):
+        target = min(target, profile["max_position"])
+    length = target
+    while length >= min(MIN_MODEL_LEN, target):
+        need = estimate_vram(profile, length, concurrency)["total_gb"] * (1 + headroom)
+        utilization = need / vram_gb
+        if utilization <= MAX_UTILIZATION:
+            return {
+                "max_model_len": length,
+                "gpu_memory_utilization": max(DEFAULT_UTILIZATION, math.ceil(utilization * 100) / 100),
+                "need_gb": round(need, 2),
+                "vram_gb": vram_gb,
+                "full_length": length == target,
+            }
+        next_length = (length - 1) // LEN_STEP * LEN_STEP
+        if next_length < MIN_MODEL_LEN or next_length >= length:
+            break
+        length = next_length
+    return None
+
+
+def plan_placement(profile, catalog, max_model_len=DEFAULT_MAX_MODEL_LEN, concurrency=DEFAULT_CONCURRENCY,
+                   headroom=HEADROOM):
+    """
+    Ranks the catalog ([{"name", "vram", "price"}]) for this model. Cards that hold the full
+    max_model_len come first, cheapest first; then cards that need a shorter context, longest
+    context first. Returns {"gpu", "price", "vram", "max_model_len", "gpu_memory_utilization",
+    "estimate", "ranked"} or None if nothing fits.
+    """
+    ranked = []
+    for gpu in catalog:
+        fit = plan_for_gpu(profile, gpu["vram"], max_model_len, concurrency, headroom)
+        if fit:
+            ranked.append({"name": gpu["name"], "vram": gpu["vram"], "price": gpu["price"], **fit})
+    if not ranked:
+        return None
+    ranked.sort(key=lambda g: (not g["full_length"], g["price"] if g["full_length"] else -g["max_model_len"], g["price"]))
+    best = ranked[0]
+    return {
+        "gpu": best["name"],
+        "price": best["price"],
+        "vram": best["vram"],
+        "max_model_len": best["max_model_len"],
+        "gpu_memory_utilization": best["gpu_memory_utilization"],
+        "estimate": estimate_vram(profile, best["max_model_len"], concurrency),
+        "ranked": ranked,
+    }
+
+
+def plan_model(model_id, catalog, max_model_len=DEFAULT_MAX_MODEL_LEN, concurrency=DEFAULT_CONCURRENCY,
+               fetch=False):
+    """Config lookup + profile + placement. Returns (profile, placement); (None, None) without a config."""
+    config = load_model_config(model_id, fetch=fetch)
+    if config is None:
+        return None, None
+    profile = model_profile(config)
+    return profile, plan_placement(profile, catalog, max_model_len, concurrency)
+
+
+def vllm_flags(fit):
+    """vLLM server flags for a plan_for_gpu()/plan_placement() result."""
+    return f"--gpu-memory-utilization {fit['gpu_memory_utilization']:.2f} --max-model-len {fit['max_model_len']}"
+
+
+def print_plan(model_id, profile, placement, max_model_len, concurrency):
+    active = f" ({profile['active_params_b']}B active)" if profile.get("active_params_b") else ""
+    quant = profile["quantization"] or "none"
+    print(f"[PLANNER] {model_id}: {profile['architecture']} | {profile['params_b']}B params{active} | "
+          f"quant {quant} ({profile['bits_per_weight']} bits) | weights {profile['weights_gb']} GB | "
+          f"KV {profile['kv_bytes_per_token'] / 1024:.0f} KB/token")
+    if placement is None:
+        print(f"[PLANNER] ❌ No GPU in the catalog fits even {MIN_MODEL_LEN} tokens x {concurrency}.")
+        return
+    est = placement["estimate"]
+    print(f"[PLANNER] Need at {placement['max_model_len']} x {concurrency}: {est['total_gb']} GB "
+          f"(weights {est['weights_gb']} + KV {est['kv_gb']} + overhead {est['overhead_gb']})")
+    print(f"{'GPU':<28} {'VRAM':>6} {'$/hr':>7} {'max len':>8} {'util':>5}")
+    for g in placement["ranked"]:
+        mark = " <-" if g["name"] == placement["gpu"] else ""
+        short = "" if g["full_length"] else " (short ctx)"
+        print(f"{g['name'][:28]:<28} {g['vram']:>4}GB {g['price']:>7.2f} {g['max_model_len']:>8} "
+              f"{g['gpu_memory_utilization']:>5.2f}{short}{mark}")
+    if placement["max_model_len"] < max_model_len:
+        print(f"[PLANNER] ⚠️ Context reduced to {placement['max_model_len']} to fit.")
+    print(f"[PLANNER] ✅ {placement['gpu']} (${placement['price']:.2f}/hr): {vllm_flags(placement)}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Choose a GPU and vLLM memory flags from a model's config.json")
+    parser.add_argument("model", help="Hugging Face ID (cached config) or a path to config.json")
+    parser.add_argument("--max-model-len", type=int, default=DEFAULT_MAX_MODEL_LEN)
+    parser.add_argument("--concurrency", type=int, default=DEFAULT_CONCURRENCY,
+                        help="Full-length sequences the KV cache must hold at once")
+    parser.add_argument("--catalog", help="JSON list of {name, vram, price} (default: live runpodctl listing)")
+    parser.add_argument("--fetch", action="store_true", help="Download config.json if it is not cached")
+    args = parser.parse_args(argv)
+
+    if args.catalog:
+        with open(args.catalog, "r", encoding="utf-8") as f:
+            catalog = json.load(f)
+    else:
+        from runpod_interface import RunPodDriver
+        catalog = RunPodDriver(None, None).get_available_gpus()
+        if not catalog:
+            print("[PLANNER] ⚠️ Empty GPU catalog (is runpodctl installed and configured?).")
+    try:
+        profile, placement = plan_model(args.model, catalog, args.max_model_len, args.concurrency, fetch=args.fetch)
+    except GPUPlanError as e:
+        print(f"[PLANNER] ❌ {e}")
+        return 1
+    if profile is None:
+        print(f"[PLANNER] ❌ No cached config.json for {args.model} (try --fetch).")
+        return 1
+    print_plan(args.model, profile, placement, args.max_model_len, args.concurrency)
+    return 0 if placement else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
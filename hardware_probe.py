@@ -0,0 +1,316 @@
+import os
+import sys
+import json
+import ctypes
+import hashlib
+import platform
+
+import psutil
+
+# ==========================================
+# HARDWARE PROBE
+# ==========================================
+# Detects the CPU's ISA extensions, core topology and memory once, caches the result on disk
+# (keyed by a machine fingerprint) and picks the ggml-cpu-* variant built for this CPU, so we
+# know exactly which kernel path is running instead of leaving it to ggml_backend_load_all.
+
+PROBE_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "hardware_probe.json")
+PROBE_VERSION = 1
+
+# ggml CPU variants, best first, with the ISA features each build requires
+# (mirrors GGML_CPU_ALL_VARIANTS in ggml/src/CMakeLists.txt)
+_HASWELL = {"sse4_2", "avx", "f16c", "avx2", "bmi2", "fma"}
+_AVX512 = _HASWELL | {"avx512f", "avx512cd", "avx512vl", "avx512dq", "avx512bw"}
+CPU_VARIANTS = [
+    ("sapphirerapids", _AVX512 | {"avx512vbmi", "avx512_vnni", "avx512_bf16", "avx512_fp16", "amx_tile", "amx_int8"}),
+    ("zen4",           _AVX512 | {"avx512vbmi", "avx512_vnni", "avx512_bf16"}),
+    ("cooperlake",     _AVX512 | {"avx512_vnni", "avx512_bf16"}),
+    ("icelake",        _AVX512 | {"avx512vbmi", "avx512_vnni"}),
+    ("cascadelake",    _AVX512 | {"avx512_vnni"}),
+    ("cannonlake",     _AVX512 | {"avx512vbmi"}),
+    ("skylakex",       _AVX512),
+    ("alderlake",      _HASWELL | {"avx_vnni"}),
+    ("haswell",        _HASWELL),
+    ("piledriver",     {"sse4_2", "avx", "f16c", "fma"}),
+    ("ivybridge",      {"sse4_2", "avx", "f16c"}),
+    ("sandybridge",    {"sse4_2", "avx"}),
+    ("sse42",          {"sse4_2"}),
+    ("x64",            set()),
+]
+
+GPU_BACKENDS = ("cuda", "vulkan", "hip", "sycl", "metal", "opencl")
+
+# Windows IsProcessorFeaturePresent ids (no VNNI/AMX ids exist; see _windows_flags)
+_PF_FEATURES = {"sse4_2": 38, "avx": 39, "avx2": 40, "avx512f": 41}
+
+_probe = None # In-process cache: swaps never re-probe
+
+
+# --- ISA FEATURES ---
+def _linux_flags():
+    try:
+        with open("/proc/cpuinfo", "r") as f:
+            for line in f:
+                if line.startswith("flags"):
+                    return set(line.split(":", 1)[1].split())
+    except OSError:
+        pass
+    return None
+
+
+def _cpuinfo_flags():
+    """py-cpuinfo (optional) reads CPUID directly, which covers VNNI/AMX on Windows."""
+    try:
+        import cpuinfo
+    except ImportError:
+        return None
+    try:
+        flags = set(cpuinfo.get_cpu_info().get("flags", []))
+    except Exception:
+        return None
+    # py-cpuinfo spells a few flags differently from /proc/cpuinfo
+    aliases = {"sse4.2": "sse4_2", "avx512vnni": "avx512_vnni", "avx512bf16": "avx512_bf16",
+               "avx512fp16": "avx512_fp16", "avxvnni": "avx_vnni", "amx-tile": "amx_tile", "amx-int8": "amx_int8"}
+    return {aliases.get(f, f) for f in flags}
+
+
+def _windows_flags():
+    try:
+        present = ctypes.windll.kernel32.IsProcessorFeaturePresent
+    except AttributeError:
+        return None
+    flags = {name for name, pf in _PF_FEATURES.items() if present(pf)}
+    if "avx2" in flags:
+        flags |= {"f16c", "fma", "bmi2"} # Every AVX2 CPU has these
+    if "avx512f" in flags:
+        flags |= {"avx512cd", "avx512vl", "avx512dq", "avx512bw"} # True for every AVX-512 client/server part
+    return flags
+
+
+def detect_cpu_flags():
+    for source in (_linux_flags, _cpuinfo_flags, _windows_flags):
+        flags = source()
+        if flags:
+            return flags
+    return set()
+
+
+def cpu_brand():
+    try:
+        with open("/proc/cpuinfo", "r") as f:
+            for line in f:
+                if line.startswith("model name"):
+                    return line.split(":", 1)[1].strip()
+    except OSError:
+        pass
+    return platform.processor() or platform.machine()
+
+
+# --- TOPOLOGY ---
+def _read(path):
+    try:
+        with open(path, "r") as f:
+            return f.read().strip()
+    except OSError:
+        return None
+
+
+def _parse_cpu_list(text):
+    """'0-3,8,10-11' -> [0, 1, 2, 3, 8, 10, 11]"""
+    cpus = []
+    for part in (text or "").split(","):
+        if "-" in part:
+            lo, hi = part.split("-")
+            cpus.extend(range(int(lo), int(hi) + 1))
+        elif part.strip():
+            cpus.append(int(part))
+    return cpus
+
+
+def detect_topology():
+    """
+    Returns {"physical_cores", "logical_cpus", "cpus": [...]} where each cpu entry is
+    {"cpu", "core", "package", "l3", "kind"}; kind is "P"/"E" on hybrid chips, else None.
+    Per-CPU detail comes from sysfs (Linux); elsewhere "cpus" is empty.
+    """
+    topology = {
+        "physical_cores": psutil.cpu_count(logical=False) or 4,
+        "logical_cpus": psutil.cpu_count(logical=True) or 4,
+        "cpus": [],
+    }
+    base = "/sys/devices/system/cpu"
+    if not os.path.isdir(base):
+        return topology
+
+    # Intel hybrid parts expose the two core PMUs separately
+    p_cores = set(_parse_cpu_list(_read("/sys/devices/cpu_core/cpus")))
+    e_cores = set(_parse_cpu_list(_read("/sys/devices/cpu_atom/cpus")))
+
+    online = _parse_cpu_list(_read(f"{base}/online")) or list(range(topology["logical_cpus"]))
+    for cpu in online:
+        topo = f"{base}/cpu{cpu}/topology"
+        core_id = _read(f"{topo}/core_id")
+        if core_id is None:
+            continue
+        l3 = _read(f"{base}/cpu{cpu}/cache/index3/id")
+        if l3 is None:
+            shared = _parse_cpu_list(_read(f"{base}/cpu{cpu}/cache/index3/shared_cpu_list"))
+            l3 = str(min(shared)) if shared else None
+        kind = "P" if cpu in p_cores else "E" if cpu in e_cores else None
+        topology["cpus"].append({
+            "cpu": cpu,
+            "core": int(core_id),
+            "package": int(_read(f"{topo}/physical_package_id") or 0),
+            "l3": int(l3) if l3 is not None else None,
+            "kind": kind,
+        })
+    return topology
+
+
+# --- BACKEND FILES ---
+def lib_name(name):
+    """ggml-cpu-haswell -> ggml-cpu-haswell.dll / libggml-cpu-haswell.so / .dylib"""
+    if sys.platform == "win32":
+        return f"{name}.dll"
+    return f"lib{name}.dylib" if sys.platform == "darwin" else f"lib{name}.so"
+
+
+def select_cpu_variant(flags, root_path="."):
+    """Best ggml-cpu-* build this CPU can run that is actually present. Returns (variant, path)."""
+    for variant, required in CPU_VARIANTS:
+        path = os.path.join(root_path, lib_name(f"ggml-cpu-{variant}"))
+        if required <= flags and os.path.exists(path):
+            return variant, path
+    plain = os.path.join(root_path, lib_name("ggml-cpu"))
+    return (None, plain) if os.path.exists(plain) else (None, None)
+
+
+def available_gpu_backends(root_path="."):
+    return [name for name in GPU_BACKENDS if os.path.exists(os.path.join(root_path, lib_name(f"ggml-{name}")))]
+
+
+# --- PROBE + CACHE ---
+def machine_fingerprint():
+    """Cheap identity of the box: changes with a CPU, RAM or OS swap, not between runs."""
+    parts = [platform.node(), platform.system(), platform.machine(), cpu_brand(),
+             str(psutil.cpu_count(logical=True)), str(psutil.virtual_memory().total // (1 << 30))]
+    return hashlib.sha256("|".join(parts).encode()).hexdigest()[:16]
+
+
+def run_probe(root_path="."):
+    flags = detect_cpu_flags()
+    variant, variant_path = select_cpu_variant(flags, root_path)
+    interesting = set().union(*(required for _, required in CPU_VARIANTS))
+    return {
+        "version": PROBE_VERSION,
+        "fingerprint": machine_fingerprint(),
+        "cpu": cpu_brand(),
+        "isa": sorted(flags & interesting),
+        "topology": detect_topology(),
+        "ram_total": psutil.virtual_memory().total,
+        "cpu_variant": variant,
+        "cpu_variant_path": variant_path,
+        "gpu_backends": available_gpu_backends(root_path),
+    }
+
+
+def get_probe(root_path=".", refresh=False, path=PROBE_FILE):
+    """
+    Returns the hardware probe, from memory, then from disk if the fingerprint still matches,
+    and only otherwise by probing. Sets probe["cached"] to say which.
+    """
+    global _probe
+    if _probe is not None and not refresh:
+        return _probe
+
+    fingerprint = machine_fingerprint()
+    if not refresh and os.path.exists(path):
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                stored = json.load(f)
+            if stored.get("fingerprint") == fingerprint and stored.get("version") == PROBE_VERSION:
+                # The variant file list can change between runs (engine updates), so re-check it
+                stored["cpu_variant"], stored["cpu_variant_path"] = select_cpu_variant(set(stored["isa"]), root_path)
+                stored["gpu_backends"] = available_gpu_backends(root_path)
+                stored["cached"] = True
+                _probe = stored
+                return _probe
+        except (OSError, ValueError, KeyError):
+            pass
+
+    probe = run_probe(root_path)
+    try:
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(probe, f, indent=4)
+    except OSError:
+        pass
+    probe["cached"] = False
+    _probe = probe
+    return _probe
+
+
+# --- BACKEND LOADING ---
+_loaded = None
+
+
+def load_backends(root_path=".", probe=None):
+    """
+    Registers the chosen CPU variant and any GPU backends with ggml, in place of
+    ggml_backend_load_all(). Safe to call repeatedly. Returns a report dict.
+    """
+    global _loaded
+    if _loaded is not None:
+        return _loaded
+    probe = probe or get_probe(root_path)
+    report = {"cpu_variant": probe["cpu_variant"], "gpu": [], "fallback": False}
+
+    ggml = None
+    for name in ("ggml", "ggml-base"):
+        lib = os.path.join(root_path, lib_name(name))
+        if os.path.exists(lib):
+            try:
+                ggml = ctypes.CDLL(lib)
+                break
+            except OSError:
+                continue
+    if ggml is None:
+        report["error"] = "ggml library not found"
+        _loaded = report
+        return report
+
+    if not hasattr(ggml, "ggml_backend_load"):
+        if hasattr(ggml, "ggml_backend_load_all"):
+            ggml.ggml_backend_load_all()
+        report["fallback"] = True
+        _loaded = report
+        return report
+
+    ggml.ggml_backend_load.restype = ctypes.c_void_p
+    ggml.ggml_backend_load.argtypes = [ctypes.c_char_p]
+
+    # Best variant first; an older build is the fallback if a newer one fails to load
+    flags = set(probe["isa"])
+    report["cpu_variant"] = None
+    for variant, required in CPU_VARIANTS:
+        lib = os.path.abspath(os.path.join(root_path, lib_name(f"ggml-cpu-{variant}")))
+        if required <= flags and os.path.exists(lib) and ggml.ggml_backend_load(lib.encode()):
+            report["cpu_variant"] = variant
+            break
+
+    if report["cpu_variant"] is None and hasattr(ggml, "ggml_backend_load_all"):
+        ggml.ggml_backend_load_all() # Let ggml score the variants (and find the GPU backends) itself
+        report["fallback"] = True
+    else:
+        for name in probe["gpu_backends"]:
+            lib = os.path.abspath(os.path.join(root_path, lib_name(f"ggml-{name}")))
+            if ggml.ggml_backend_load(lib.encode()):
+                report["gpu"].append(name)
+    _loaded = report
+    return report
+
+
+if __name__ == "__main__":
+    probe = get_probe(refresh="--refresh" in sys.argv)
+    print(json.dumps({k: v for k, v in probe.items() if k != "topology"}, indent=4))
+    topo = probe["topology"]
+    print(f"Topology: {topo['physical_cores']} cores / {topo['logical_cpus']} threads")
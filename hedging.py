@@ -0,0 +1,130 @@
+import queue
+import threading
+import time
+
+# Sentinels pushed by racer threads
+_DONE = object()
+
+# How long to wait for a cancelled remote racer to wind down before leaving it in the background
+REMOTE_JOIN_TIMEOUT = 0.5
+
+
+class _Racer:
+    """Runs one backend's stream on a worker thread and forwards tokens to a shared queue."""
+
+    def __init__(self, backend, messages, max_tokens, events):
+        self.backend = backend
+        self.messages = messages
+        self.max_tokens = max_tokens
+        self.events = events
+        self.error = None
+        self.thread = threading.Thread(target=self._run, name=f"vox-hedge-{backend.name}", daemon=True)
+
+    def start(self):
+        self.thread.start()
+
+    def _run(self):
+        try:
+            for token in self.backend.stream_chat(self.messages, max_tokens=self.max_tokens):
+                self.events.put((self, token))
+        except Exception as e:
+            self.error = e
+        finally:
+            self.events.put((self, _DONE))
+
+
+class HedgedStream:
+    """
+    Races the same chat request on two backends and commits to whichever yields a token first.
+
+    The primary starts immediately. The hedge backend starts once `hedge_delay` seconds pass
+    without a first token from the primary (0 = start both at once). The loser is cancelled
+    through its `cancel()` hook, which closes the HTTP stream or stops local decode.
+    Backends only need `name`, `stream_chat(messages, max_tokens)` and `cancel()`.
+
+    On exit the "local" racer is always joined, since the next turn reuses its llama context.
+    Remote racers get REMOTE_JOIN_TIMEOUT seconds and are otherwise left to finish on their own.
+    """
+
+    def __init__(self, primary, hedge, hedge_delay=0.5):
+        self.primary = primary
+        self.hedge = hedge
+        self.hedge_delay = max(0.0, hedge_delay)
+        self.winner = None       # Backend that produced the first token
+        self.first_token_s = None
+        self._active = []
+
+    @property
+    def name(self):
+        """Name of the winning backend once committed, so callers can label output."""
+        return self.winner.name if self.winner else "hedge"
+
+    def cancel(self):
+        for racer in list(self._active):
+            racer.backend.cancel()
+
+    def stream_chat(self, messages, max_tokens=512):
+        """Yields tokens from the winning backend only."""
+        events = queue.Queue()
+        self.winner = None
+        racers = [_Racer(self.primary, messages, max_tokens, events)]
+        self._active = racers
+        hedge_racer = _Racer(self.hedge, messages, max_tokens, events)
+        racers[0].start()
+
+        t0 = time.time()
+        committed = None
+        finished = set()
+        try:
+            # --- PHASE 1: Race for the first token ---
+            while committed is None:
+                hedge_started = hedge_racer in racers
+                timeout = None
+                if not hedge_started:
+                    timeout = max(0.0, self.hedge_delay - (time.time() - t0))
+
+                try:
+                    racer, item = events.get(timeout=timeout)
+                except queue.Empty:
+                    racers.append(hedge_racer)
+                    hedge_racer.start()
+                    continue
+
+                if item is _DONE:
+                    finished.add(racer)
+                    if not hedge_started:
+                        # Primary died before the hedge delay: launch the hedge now
+                        racers.append(hedge_racer)
+                        hedge_racer.start()
+                    elif len(finished) == len(racers):
+                        errors = [r.error for r in racers if r.error]
+                        if errors:
+                            raise errors[-1]
+                        return # Both completed with no output
+                    continue
+
+                committed = racer
+                self.winner = racer.backend
+                self.first_token_s = time.time() - t0
+                for other in racers:
+                    if other is not racer:
+                        other.backend.cancel()
+                yield item
+
+            # --- PHASE 2: Stream the winner, drop stragglers from the loser ---
+            while True:
+                racer, item = events.get()
+                if racer is not committed:
+                    continue
+                if item is _DONE:
+                    if racer.error:
+                        raise racer.error
+                    return
+                yield item
+        finally:
+            # Consumer stopped early, or we are done: make sure nobody keeps decoding
+            for racer in racers:
+                if racer.thread.is_alive():
+                    racer.backend.cancel()
+            for racer in racers:
+                racer.thread.join(None if racer.backend.name == "local" else REMOTE_JOIN_TIMEOUT)
@@ -0,0 +1,357 @@
+import os
+import sys
+import json
+import time
+import math
+import random
+import asyncio
+import argparse
+import itertools
+
+import async_http
+from batch_runner import percentile, build_messages
+from vox_bench import PROMPT_SETS, load_prompts
+
+# ==========================================
+# LOAD GENERATOR
+# ==========================================
+# Drives an OpenAI-compatible /v1/chat/completions endpoint (vox_server.py, the RunPod
+# manager, vLLM, stub_vllm_server.py) and reports TTFT, end-to-end latency and per-request
+# decode tok/s as percentiles and histograms.
+#
+#   closed: --users N virtual users, each sends a request, waits for the reply, thinks
+#           --think-s seconds, repeats. Measures what N interactive users see.
+#   open:   Poisson arrivals at --rate requests/s, whether or not earlier ones finished.
+#           Latency counts from the scheduled arrival, so a backed-up server is not
+#           hidden by the generator slowing down (no coordinated omission).
+#
+#   python stub_vllm_server.py --decode-tps 40 --max-num-seqs 8 &
+#   python loadgen.py --url http://127.0.0.1:8001/v1 --mode open --rate 4 --duration 30
+#   python loadgen.py --url http://127.0.0.1:8000/v1 --mode closed --users 16 --prompts chat,my.jsonl
+
+LOADGEN_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "logs", "loadgen")
+RESULT_VERSION = 1
+DEFAULT_MAX_TOKENS = 128
+DEFAULT_TIMEOUT = 120.0
+HIST_BUCKETS = 12
+HIST_WIDTH = 40
+PERCENTILES = (50, 90, 95, 99)
+
+
+# --- ONE REQUEST ---
+async def _exchange(url, payload, headers, stream, rec, started):
+    response = await async_http.request("POST", url, payload, headers)
+    try:
+        rec["status"] = response.status
+        if response.status != 200:
+            body = (await response.read()).decode("utf-8", "replace")
+            try:
+                message = json.loads(body)["error"]
+                message = message.get("message", message) if isinstance(message, dict) else message
+            except (ValueError, KeyError, TypeError):
+                message = body[:200]
+            rec["error"] = f"HTTP {response.status}: {message}"
+            return
+
+        if not stream:
+            data = await response.json()
+            usage = data.get("usage") or {}
+            rec["prompt_tokens"] = usage.get("prompt_tokens")
+            rec["completion_tokens"] = usage.get("completion_tokens")
+            return
+
+        chunks = 0
+        async for payload_text in response.events():
+            event = json.loads(payload_text)
+            if event.get("usage"):
+                rec["prompt_tokens"] = event["usage"].get("prompt_tokens")
+                rec["completion_tokens"] = event["usage"].get("completion_tokens")
+            for choice in event.get("choices") or []:
+                if (choice.get("delta") or {}).get("content"):
+                    if rec["ttft_s"] is None:
+                        rec["ttft_s"] = time.perf_counter() - started
+                    chunks += 1
+        if rec["completion_tokens"] is None:
+            rec["completion_tokens"] = chunks # One token per chunk without include_usage
+    finally:
+        response.close()
+
+
+async def send_request(url, prompt_id, req, model, headers, stream, max_tokens, timeout, scheduled=None):
+    """
+    One chat completion. Returns a record with ttft_s (streaming only), latency_s, tokens and
+    error. With scheduled (a perf_counter() arrival time) latencies count from that instant.
+    """
+    payload = {
+        "model": model,
+        "messages": build_messages(req),
+        "max_tokens": int(req.get("max_tokens") or max_tokens),
+        "stream": stream,
+    }
+    for key in ("temperature", "top_p", "seed", "stop"):
+        if key in req:
+            payload[key] = req[key]
+    if stream:
+        payload["stream_options"] = {"include_usage": True}
+
+    sent = time.perf_counter()
+    started = scheduled if scheduled is not None else sent
+    rec = {"prompt": prompt_id, "start_s": None, "queue_s": round(sent - started, 4), "status": None,
+           "ttft_s": None, "latency_s": None, "prompt_tokens": None, "completion_tokens": None,
+           "decode_tps": None, "error": None}
+    try:
+        await asyncio.wait_for(_exchange(url, payload, headers, stream, rec, started), timeout)
+    except asyncio.TimeoutError:
+        rec["error"] = f"timeout after {timeout:g}s"
+    except (ConnectionError, OSError) as e:
+        rec["error"] = f"connection: {e}"
+    except ValueError as e:
+        rec["error"] = f"bad response: {e}"
+    end = time.perf_counter()
+    rec["latency_s"] = end - started
+    tokens = rec["completion_tokens"]
+    if rec["error"] is None and tokens and rec["ttft_s"] is not None and tokens > 1 and end > started + rec["ttft_s"]:
+        rec["decode_tps"] = (tokens - 1) / (end - started - rec["ttft_s"])
+    return rec
+
+
+# --- TRAFFIC PATTERNS ---
+class _Run:
+    """Shared state of one load run: prompt rotation, stop condition and collected records."""
+
+    def __init__(self, prompts, duration, max_requests, send):
+        self.prompts = itertools.cycle(prompts)
+        self.duration = duration
+        self.max_requests = max_requests
+        self.send = send
+        self.issued = 0
+        self.records = []
+        self.t0 = time.perf_counter()
+
+    def more(self):
+        if self.max_requests is not None and self.issued >= self.max_requests:
+            return False
+        return self.duration is None or time.perf_counter() - self.t0 < self.duration
+
+    def next_prompt(self):
+        self.issued += 1
+        return next(self.prompts)
+
+    async def fire(self, scheduled=None):
+        prompt_id, req = self.next_prompt()
+        sent = time.perf_counter()
+        rec = await self.send(prompt_id, req, scheduled)
+        rec["start_s"] = round((scheduled or sent) - self.t0, 4)
+        self.records.append(rec)
+        return rec
+
+
+async def run_closed(run, users, think_s=0.0):
+    """users concurrent loops of send -> wait for reply -> think."""
+    async def user():
+        while run.more():
+            await run.fire()
+            if think_s and run.more():
+                await asyncio.sleep(think_s)
+
+    await asyncio.gather(*(user() for _ in range(users)))
+
+
+async def run_open(run, rate, rng, max_inflight=None):
+    """Poisson arrivals at rate/s; arrivals over max_inflight are counted as shed, not queued."""
+    tasks = set()
+    next_at = run.t0
+    while run.more():
+        next_at += rng.expovariate(rate)
+        delay = next_at - time.perf_counter()
+        if delay > 0:
+            await asyncio.sleep(delay)
+        if not run.more():
+            break
+        if max_inflight and len(tasks) >= max_inflight:
+            prompt_id, _ = run.next_prompt()
+            run.records.append({"prompt": prompt_id, "start_s": round(next_at - run.t0, 4), "status": None,
+                                "ttft_s": None, "latency_s": None, "error": "shed: client in-flight limit"})
+            continue
+        task = asyncio.create_task(run.fire(scheduled=next_at))
+        tasks.add(task)
+        task.add_done_callback(tasks.discard)
+    if tasks:
+        await asyncio.gather(*tasks)
+
+
+# --- REPORTING ---
+def _dist(values):
+    values = [v for v in values if v is not None]
+    if not values:
+        return None
+    out = {"n": len(values), "mean": sum(values) / len(values), "min": min(values), "max": max(values)}
+    for p in PERCENTILES:
+        out[f"p{p}"] = percentile(values, p)
+    return out
+
+
+def summarize(records, wall_s):
+    ok = [r for r in records if r["error"] is None]
+    errors = {}
+    for r in records:
+        if r["error"] is not None:
+            kind = r["error"].split(":")[0]
+            errors[kind] = errors.get(kind, 0) + 1
+    tokens = sum(r.get("completion_tokens") or 0 for r in ok)
+    return {
+        "requests": len(records),
+        "ok": len(ok),
+        "errors": errors,
+        "error_rate": round(1 - len(ok) / len(records), 4) if records else None,
+        "wall_s": round(wall_s, 3),
+        "throughput_rps": round(len(ok) / wall_s, 3) if wall_s else None,
+        "output_tps": round(tokens / wall_s, 2) if wall_s else None,
+        "ttft_s": _dist([r["ttft_s"] for r in ok]),
+        "latency_s": _dist([r["latency_s"] for r in ok]),
+        "decode_tps": _dist([r.get("decode_tps") for r in ok]),
+    }
+
+
+def histogram(values, buckets=HIST_BUCKETS, width=HIST_WIDTH, unit=""):
+    """Text histogram with log-spaced buckets (latencies span orders of magnitude)."""
+    values = [v for v in values if v is not None and v > 0]
+    if not values:
+        return ["  (no samples)"]
+    lo, hi = min(values), max(values)
+    if hi <= lo * 1.0001:
+        return [f"  {lo:>9.3g}{unit} | {'#' * width} {len(values)}"]
+    step = math.log(hi / lo) / buckets
+    counts = [0] * buckets
+    for v in values:
+        counts[min(int(math.log(v / lo) / step), buckets - 1)] += 1
+    peak = max(counts)
+    lines = []
+    for i, c in enumerate(counts):
+        upper = lo * math.exp(step * (i + 1))
+        bar = "#" * max(1 if c else 0, round(c / peak * width))
+        lines.append(f"  <={upper:>9.3g}{unit} | {bar:<{width}} {c}")
+    return lines
+
+
+def print_report(report):
+    s = report["summary"]
+    settings = report["settings"]
+    pattern = (f"{settings['users']} users" if settings["mode"] == "closed" else f"{settings['rate']:g} req/s Poisson")
+    print(f"\n[LOADGEN] {settings['mode']} loop, {pattern}, {'stream' if settings['stream'] else 'no stream'} "
+          f"-> {settings['url']}")
+    print(f"[LOADGEN] {s['ok']}/{s['requests']} ok in {s['wall_s']:.1f}s | {s['throughput_rps'] or 0:.2f} req/s | "
+          f"{s['output_tps'] or 0:.1f} output tok/s")
+    if s["errors"]:
+        print("[LOADGEN] ⚠️ Errors: " + ", ".join(f"{k} x{v}" for k, v in sorted(s["errors"].items())))
+
+    ok = [r for r in report["requests"] if r["error"] is None]
+    for key, label, unit in (("ttft_s", "TTFT", "s"), ("latency_s", "Latency", "s"), ("decode_tps", "Decode tok/s", "")):
+        d = s[key]
+        if not d:
+            continue
+        print(f"\n{label}: " + "  ".join(f"p{p} {d[f'p{p}']:.3g}{unit}" for p in PERCENTILES)
+              + f"  max {d['max']:.3g}{unit}")
+        for line in histogram([r.get(key) for r in ok], unit=unit):
+            print(line)
+
+
+def default_output():
+    return os.path.join(LOADGEN_DIR, f"loadgen_{time.strftime('%Y%m%d_%H%M%S')}.json")
+
+
+async def run_load(url, prompts, model="default", api_key=None, mode="closed", users=4, rate=1.0,
+                   duration=None, max_requests=None, stream=True, max_tokens=DEFAULT_MAX_TOKENS,
+                   timeout=DEFAULT_TIMEOUT, think_s=0.0, max_inflight=None, seed=0):
+    """Runs one load pattern against <url>/chat/completions and returns the report dict."""
+    endpoint = url.rstrip("/") + "/chat/completions"
+    headers = {"Authorization": f"Bearer {api_key}"} if api_key else {}
+    rng = random.Random(seed)
+    prompts = list(prompts)
+    rng.shuffle(prompts)
+
+    async def send(prompt_id, req, scheduled):
+        return await send_request(endpoint, prompt_id, req, model, headers, stream, max_tokens, timeout, scheduled)
+
+    run = _Run(prompts, duration, max_requests, send)
+    if mode == "closed":
+        await run_closed(run, users, think_s)
+    else:
+        await run_open(run, rate, rng, max_inflight)
+    wall_s = time.perf_counter() - run.t0
+    records = sorted(run.records, key=lambda r: r["start_s"])
+    for r in records:
+        for key in ("ttft_s", "latency_s", "decode_tps"):
+            if r.get(key) is not None:
+                r[key] = round(r[key], 4)
+    return {
+        "version": RESULT_VERSION,
+        "created": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "settings": {"url": url, "model": model, "mode": mode, "users": users, "rate": rate,
+                     "duration": duration, "requests": max_requests, "stream": stream, "max_tokens": max_tokens,
+                     "timeout": timeout, "think_s": think_s, "max_inflight": max_inflight, "seed": seed,
+                     "prompts": len(prompts)},
+        "summary": summarize(records, wall_s),
+        "requests": records,
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Load-test an OpenAI-compatible chat completions endpoint")
+    parser.add_argument("--url", default="http://127.0.0.1:8000/v1", help="Base URL (…/v1)")
+    parser.add_argument("--model", default="default")
+    parser.add_argument("--api-key", default=None)
+    parser.add_argument("--mode", choices=("closed", "open"), default="closed")
+    parser.add_argument("--users", type=int, default=4, help="Concurrent users (closed loop)")
+    parser.add_argument("--rate", type=float, default=1.0, help="Arrivals per second (open loop)")
+    parser.add_argument("--duration", type=float, default=None, help="Seconds to generate load (default 30)")
+    parser.add_argument("--requests", type=int, default=None, help="Stop after this many requests")
+    parser.add_argument("--stream", dest="stream", action="store_true", default=True)
+    parser.add_argument("--no-stream", dest="stream", action="store_false")
+    parser.add_argument("--prompts", default=",".join(PROMPT_SETS),
+                        help=f"Comma-separated built-in sets ({', '.join(PROMPT_SETS)}) and/or request JSONL files")
+    parser.add_argument("--max-tokens", type=int, default=DEFAULT_MAX_TOKENS)
+    parser.add_argument("--timeout", type=float, default=DEFAULT_TIMEOUT, help="Per-request timeout (s)")
+    parser.add_argument("--think-s", type=float, default=0.0, help="Pause between a user's requests (closed loop)")
+    parser.add_argument("--max-inflight", type=int, default=None, help="Open loop: shed arrivals beyond this")
+    parser.add_argument("--seed", type=int, default=0, help="Seed for arrivals and prompt order")
+    parser.add_argument("-o", "--output", default=None, help="Result JSON path (default logs/loadgen/...)")
+    args = parser.parse_args(argv)
+
+    if args.duration is None and args.requests is None:
+        args.duration = 30.0
+    if (args.mode == "closed" and args.users < 1) or (args.mode == "open" and args.rate <= 0):
+        print("[LOADGEN] ❌ Need --users >= 1 (closed) or --rate > 0 (open).")
+        return 1
+    try:
+        prompts = load_prompts([s.strip() for s in args.prompts.split(",") if s.strip()])
+    except ValueError as e:
+        print(f"[LOADGEN] ❌ {e}")
+        return 1
+    if not prompts:
+        print("[LOADGEN] ❌ No prompts loaded.")
+        return 1
+
+    limit = f"{args.duration:g}s" if args.duration is not None else f"{args.requests} requests"
+    print(f"[LOADGEN] {args.mode} loop against {args.url} for {limit} ({len(prompts)} prompts)...")
+    try:
+        report = asyncio.run(run_load(
+            args.url, prompts, model=args.model, api_key=args.api_key, mode=args.mode, users=args.users,
+            rate=args.rate, duration=args.duration, max_requests=args.requests, stream=args.stream,
+            max_tokens=args.max_tokens, timeout=args.timeout, think_s=args.think_s,
+            max_inflight=args.max_inflight, seed=args.seed))
+    except KeyboardInterrupt:
+        print("\n[LOADGEN] Interrupted.")
+        return 1
+
+    print_report(report)
+    output = args.output or default_output()
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2)
+    print(f"\n[LOADGEN] ✅ Results written to {output}")
+    return 0 if report["summary"]["ok"] else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
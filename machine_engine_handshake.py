@@ -1,18 +1,69 @@
 import os
-import psutil
 import ctypes
+import hardware_probe
+import memory_planner
+import vox_trace
+try:
+    import psutil
+except ImportError:
+    psutil = None
 
-def get_hardware_config():
+_results = {} # (model_path, tuned) -> hardware result; swaps and reloads skip the protocol
+
+def get_hardware_config(model_path=None, tuned=True):
     """
     VOX-AI Hardware Handshake
     Status: GOLDEN CONFIGURATION (Ryzen APU Optimized)
+    
+    If model_path has a profile from engine_autotune.py for this CPU/backend, the tuned
+    settings replace the golden defaults (tuned=False skips the lookup).
+    With a model_path, memory_planner also sizes n_ctx, the KV cache type and mlock
+    from the GGUF header and free RAM/VRAM (config["memory_plan"] records the outcome).
     """
+    key = (os.path.abspath(model_path) if model_path else None, tuned)
+    if key in _results:
+        mode, physical_cores, config = _results[key]
+        print(f"[HANDSHAKE] Reusing {mode} profile.")
+    else:
+        mode, physical_cores, config = _run_protocol(model_path, tuned)
+        _results[key] = (mode, physical_cores, config)
+    config = dict(config)
+
+    # === MEMORY PLAN ===
+    # Context, KV cache type and mlock sized to what is actually free (an APU's GPU shares system RAM).
+    # Planned on every call, cached or not: free memory changes between loads.
+    if model_path:
+        kv_types = memory_planner.KV_TYPES
+        if mode.endswith("TUNED") and config["cache_type_k"] in kv_types:
+            kv_types = kv_types[kv_types.index(config["cache_type_k"]):] # Never above the tuned cache type
+        with vox_trace.span("handshake.memory_plan", "startup"):
+            mem_plan = memory_planner.plan_memory(model_path, config, unified_memory=mode.startswith("APU"), kv_types=kv_types)
+        if mem_plan:
+            memory_planner.apply_plan(config, mem_plan)
+            print(f"[HANDSHAKE] Memory: {memory_planner.describe(mem_plan)}")
+            if mem_plan["action"] == "downgraded":
+                print("[HANDSHAKE] ⚠️ Not enough free memory for the preferred context; downgraded to avoid paging.")
+            elif mem_plan["action"] == "refused":
+                print("[HANDSHAKE] ❌ Model does not fit in free memory without paging.")
+    return mode, physical_cores, config
+
+def _run_protocol(model_path, tuned):
+    """Probe, backend detection, tuned profile and thread placement: fixed for the machine and model."""
     print("\n[HANDSHAKE] --- PROTOCOL STARTED ---")
     
-    # 1. CPU DETECTION
-    print("[HANDSHAKE] Probing CPU Topology...")
-    physical_cores = psutil.cpu_count(logical=False) or 4
+    # 1. CPU DETECTION (probed once per machine, then cached in hardware_probe.json)
+    root_path = os.path.abspath(".")
+    with vox_trace.span("handshake.probe", "startup") as s:
+        probe = hardware_probe.get_probe(root_path)
+        s.set(cached=bool(probe.get("cached")))
+    source = "cached probe" if probe.get("cached") else "fresh probe"
+    print(f"[HANDSHAKE] CPU: {probe['cpu']} ({source})")
+    physical_cores = probe["topology"]["physical_cores"]
     print(f"[HANDSHAKE] Detected {physical_cores} Physical Cores.")
+    isa = set(probe["isa"])
+    highlights = [f for f in ("avx2", "avx512f", "avx512_vnni", "avx_vnni", "amx_int8") if f in isa]
+    print(f"[HANDSHAKE] ISA: {', '.join(highlights) or 'baseline x86-64'}")
+    print(f"[HANDSHAKE] CPU Kernel: ggml-cpu-{probe['cpu_variant'] or 'auto'}")
 
     # 2. CALCULATE THREADS
     # 8 Threads was proven stable and fastest for Vulkan Mode
@@ -20,7 +71,6 @@ def get_hardware_config():
     optimal_batch_threads = max(2, physical_cores // 2)
 
     # 3. BACKEND DETECTION
-    root_path = os.path.abspath(".")
     print(f"[HANDSHAKE] Scanning for High-Performance Backend in: {root_path}")
     
     # === DEFAULT MODE: APU (Vulkan Hybrid) ===
@@ -30,17 +80,20 @@ def get_hardware_config():
         "n_gpu_layers": 26,           # The Bandwidth Sweet Spot
         "n_threads": optimal_threads, 
         "n_threads_batch": optimal_batch_threads, 
+        "n_ctx": memory_planner.DEFAULT_CTX,
         "n_batch": 512,
         "flash_attn": True,
         "use_mlock": True,            # Keep RAM locked for stability
+        "use_mmap": True,
         "busy_wait": "1",             # Force driver performance
         "cache_type_k": "f16",
-        "cache_type_v": "f16"
+        "cache_type_v": "f16",
+        "cpu_variant": probe["cpu_variant"]
     }
 
     # === FUTURE MODE: UNLEASHED (CUDA/ZLUDA) ===
     # Automatically activates if you install ZLUDA or upgrade to NVIDIA
-    cuda_lib_path = os.path.join(root_path, "ggml-cuda.dll")
+    cuda_lib_path = os.path.join(root_path, hardware_probe.lib_name("ggml-cuda"))
     
     if os.path.exists(cuda_lib_path):
         print("[HANDSHAKE] High-Performance Driver Found.")
@@ -58,9 +111,112 @@ def get_hardware_config():
         except:
             print("[HANDSHAKE] Driver check failed. Staying on APU.")
 
+    # === TUNED PROFILE (engine_autotune.py) ===
+    if model_path and tuned:
+        from engine_autotune import get_tuned_profile
+        profile = get_tuned_profile(model_path, root_path)
+        if profile:
+            config.update(profile["config"])
+            mode = f"{mode} + TUNED"
+            print(f"[HANDSHAKE] Tuned profile found ({profile.get('tuned_at', 'unknown date')}).")
+
+    # === THREAD PLACEMENT ===
+    # One thread per physical core, on P-cores only and inside one L3 domain when the chip has several
+    # (skipped for tuned profiles: their thread counts were measured unpinned)
+    plan = None if mode.endswith("TUNED") else plan_affinity(probe["topology"], config["n_threads"])
+    if plan:
+        config["affinity"] = plan["cpus"]
+        config["n_threads"] = min(config["n_threads"], len(plan["cpus"]))
+        config["n_threads_batch"] = min(config["n_threads_batch"], len(plan["cpus"]))
+        print(f"[HANDSHAKE] Affinity: {plan['policy']} -> CPUs {plan['cpus']}")
+
     print(f"[HANDSHAKE] Final Mode Decision: {mode}")
     print("[HANDSHAKE] --- PROTOCOL COMPLETE ---\n")
     return mode, physical_cores, config
 
+def plan_affinity(topology, n_threads):
+    """
+    Picks the logical CPUs to pin inference threads to. Returns
+    {"cpus": [...], "policy": str} or None when there is nothing to choose.
+
+    Decode is memory-bound and llama.cpp splits work evenly, so one slow thread (an E-core,
+    or an SMT sibling sharing a busy core) holds up every token. Threads that span two L3
+    domains (Zen CCDs, multi-socket) also pay cross-die latency on every sync.
+    """
+    cpus = topology.get("cpus") or []
+    if not cpus:
+        # No sysfs (Windows): SMT siblings are numbered adjacently, so even ids = one per core
+        logical, physical = topology.get("logical_cpus", 0), topology.get("physical_cores", 0)
+        if physical > 1 and logical == 2 * physical:
+            return {"cpus": list(range(0, logical, 2))[:n_threads], "policy": "1 thread/core (SMT heuristic)"}
+        return None
+
+    policy = []
+    if any(c["kind"] == "P" for c in cpus):
+        cpus = [c for c in cpus if c["kind"] == "P"]
+        policy.append("P-cores")
+
+    # One logical CPU per physical core (the lowest-numbered sibling)
+    per_core = {}
+    for c in sorted(cpus, key=lambda c: c["cpu"]):
+        per_core.setdefault((c["package"], c["core"]), c)
+    cores = list(per_core.values())
+    policy.append("1 thread/core")
+
+    # Largest L3 domain
+    domains = {}
+    for c in cores:
+        domains.setdefault((c["package"], c["l3"]), []).append(c)
+    if len(domains) > 1:
+        (package, l3), cores = max(domains.items(), key=lambda kv: len(kv[1]))
+        policy.append(f"L3 domain {l3} on socket {package}")
+
+    chosen = sorted(c["cpu"] for c in cores)[:max(1, n_threads)]
+    if len(chosen) < 2 and len(topology["cpus"]) < 2:
+        return None
+    return {"cpus": chosen, "policy": ", ".join(policy)}
+
+
+def apply_affinity(cpus):
+    """
+    Pins this process to `cpus`. Linux: every existing thread is pinned and new threads
+    (ggml's pool) inherit it. Elsewhere: psutil's process affinity. Returns True on success.
+    """
+    if not cpus:
+        return False
+    if hasattr(os, "sched_setaffinity"):
+        try:
+            tids = [int(t) for t in os.listdir("/proc/self/task")]
+        except OSError:
+            tids = [0]
+        ok = False
+        for tid in tids:
+            try:
+                os.sched_setaffinity(tid, cpus)
+                ok = True
+            except OSError:
+                pass
+        return ok
+    if psutil is not None:
+        try:
+            psutil.Process().cpu_affinity(list(cpus))
+            return True
+        except (psutil.Error, AttributeError, ValueError):
+            pass
+    return False
+
+
+def current_affinity():
+    """The CPUs this process may run on (for restoring after a pinned run)."""
+    if hasattr(os, "sched_getaffinity"):
+        return sorted(os.sched_getaffinity(0))
+    if psutil is not None:
+        try:
+            return psutil.Process().cpu_affinity()
+        except (psutil.Error, AttributeError):
+            pass
+    return None
+
+
 if __name__ == "__main__":
     get_hardware_config()
\ No newline at end of file
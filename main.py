@@ -1,9 +1,9 @@
 import sys
-import subprocess
+import startup_profile
+if "--profile-startup" in sys.argv:
+    startup_profile.enable() # Before the other imports so they are timed too
 import os
-import urllib.request
-import json
-import zipfile
+import importlib
 import importlib.util
 
 # ==========================================
@@ -12,7 +12,6 @@ import importlib.util
 MODELS_DIR = "./models"
 # ENGINE IS NOW ROOT (The same place as this script)
 ENGINE_DIR = "." 
-TARGET_SCRIPT = "vox_core_chat.py"
 
 # GitHub API endpoints
 LATEST_ENGINE_API = "https://api.github.com/repos/ggml-org/llama.cpp/releases/latest"
@@ -26,9 +25,11 @@ VERSION_FILE = ".wrapper_version"
 def print_header(text):
     print(f"\n[VOX BOOT] --- {text} ---")
 
-def download_progress(count, block_size, total_size):
-    percent = int(count * block_size * 100 / total_size)
-    sys.stdout.write(f"\rDownloading... {percent}%")
+def download_progress(done, total):
+    if total:
+        sys.stdout.write(f"\rDownloading... {done * 100 // total}% ({done / 1024**2:.0f}/{total / 1024**2:.0f} MB)")
+    else:
+        sys.stdout.write(f"\rDownloading... {done / 1024**2:.0f} MB")
     sys.stdout.flush()
 
 # ==========================================
@@ -80,6 +81,9 @@ def check_wrapper_updates():
         return
 
     print(" [INIT] First-time setup. Syncing...")
+    import json
+    import subprocess
+    import urllib.request
     try:
         req = urllib.request.Request(WRAPPER_COMMIT_API, headers={'User-Agent': 'VoxAI/1.0'})
         with urllib.request.urlopen(req) as response:
@@ -104,21 +108,54 @@ def check_wrapper_updates():
 # ==========================================
 # 5. ENVIRONMENT & LAUNCH
 # ==========================================
+def ensure_default_model():
+    """Fetches the small default model when models/ has no GGUF yet (resumes an interrupted download)."""
+    if not os.path.exists(MODELS_DIR): os.makedirs(MODELS_DIR)
+    if any(f.endswith(".gguf") for f in os.listdir(MODELS_DIR)):
+        return
+    print_header("Downloading Starter Model")
+    from model_downloader import download_model, DownloadError
+    try:
+        result, _ = download_model(DEFAULT_MODEL_URL, DEFAULT_MODEL_NAME, MODELS_DIR,
+                                   cloud_id="Qwen/Qwen1.5-0.5B-Chat", progress=download_progress)
+        state = "verified" if result["verified"] else "unverified"
+        print(f"\n [OK] {DEFAULT_MODEL_NAME} ({result['size'] / 1024**2:.0f} MB, {state}) in {result['elapsed_s']}s.")
+    except KeyboardInterrupt:
+        print("\n [WARN] Download interrupted. It resumes on the next start.")
+    except (DownloadError, OSError) as e:
+        print(f"\n [WARN] Starter model download failed ({e}). Proceeding without it.")
+
 def check_environment():
     if not os.path.exists(MODELS_DIR): os.makedirs(MODELS_DIR)
-    gguf_files = [f for f in os.listdir(MODELS_DIR) if f.endswith(".gguf")]
-    print(f"\n [READY] {len(gguf_files)} models available.")
+    import model_index
+    index = model_index.scan(MODELS_DIR)
+    print(f"\n [READY] {len(index)} models available.")
+    try:
+        from config import MODEL_MAP
+        model_index.print_reconcile(model_index.reconcile(MODEL_MAP, index), prefix=" [MODELS]")
+    except ImportError:
+        pass
 
 def launch_chat():
+    """Runs the chat in this process (no second interpreter start-up or re-import)."""
     print_header("Handing over to Core AI Engine")
-    subprocess.run([sys.executable, TARGET_SCRIPT])
+    importlib.invalidate_caches() # A wrapper installed by check_wrapper_updates() must be importable
+    with startup_profile.stage("import vox_core_chat"):
+        import vox_core_chat
+    vox_core_chat.launch_chat()
 
 # ==========================================
 # MAIN EXECUTION
 # ==========================================
 if __name__ == "__main__":
-    check_wrapper_updates()
-    verify_root_engine() # Checks root folder "."
-    purge_system_dependency()
-    check_environment()
+    with startup_profile.stage("wrapper check"):
+        check_wrapper_updates()
+    with startup_profile.stage("engine verification"):
+        verify_root_engine() # Checks root folder "."
+    with startup_profile.stage("dependency purge"):
+        purge_system_dependency()
+    with startup_profile.stage("starter model check"):
+        ensure_default_model()
+    with startup_profile.stage("model index"):
+        check_environment()
     launch_chat()
\ No newline at end of file
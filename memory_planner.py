@@ -0,0 +1,237 @@
+import os
+import sys
+import shutil
+import subprocess
+
+try:
+    import psutil
+except ImportError:
+    psutil = None
+
+from gguf_metadata import read_gguf
+
+# ==========================================
+# MEMORY PLANNER
+# ==========================================
+# Sizes a load before llama.cpp allocates anything: weights (per layer, from the GGUF tensor
+# table) plus the KV cache for each candidate context and cache type, checked against free
+# RAM/VRAM. Picks the largest context that fits with the best cache type, decides whether
+# the weights can be mlock'ed, and refuses loads that could only run by paging.
+
+# Bytes per KV element (q8_0 / q4_0 store 32 values in 34 / 18 bytes)
+KV_TYPE_BYTES = {"f16": 2.0, "q8_0": 34 / 32, "q4_0": 18 / 32}
+KV_TYPES = ("f16", "q8_0", "q4_0")      # Best quality first
+
+CONTEXT_STEPS = (32768, 16384, 8192, 4096, 2048, 1024)
+DEFAULT_CTX = 4096      # Preferred context: cache types are downgraded before going below it
+MAX_CTX = 16384         # Larger windows are rarely filled in chat and slow every allocation
+MIN_CTX = 1024
+RAM_HEADROOM = 0.15     # Share of total RAM left for the OS and other programs
+VRAM_HEADROOM = 0.05
+MLOCK_MARGIN = 1.25     # mlock only when the locked bytes fit this many times over
+COMPUTE_FRACTION = 0.05 # Compute buffers and scratch, relative to the weights
+
+
+def kv_bytes_per_token(meta, cache_type_k="f16", cache_type_v="f16"):
+    """Per-layer KV bytes for one token, from the attention geometry."""
+    _, n_head_kv, k_len, v_len = meta.attention_dims()
+    return n_head_kv * (k_len * KV_TYPE_BYTES[cache_type_k] + v_len * KV_TYPE_BYTES[cache_type_v])
+
+
+def available_ram():
+    if psutil is None:
+        return None
+    return psutil.virtual_memory().available
+
+
+def total_ram():
+    if psutil is None:
+        return None
+    return psutil.virtual_memory().total
+
+
+def available_vram():
+    """Free VRAM in bytes on the first NVIDIA GPU, or None when it cannot be queried."""
+    if not shutil.which("nvidia-smi"):
+        return None
+    try:
+        out = subprocess.run(
+            ["nvidia-smi", "--query-gpu=memory.free", "--format=csv,noheader,nounits"],
+            capture_output=True, text=True, timeout=5,
+            creationflags=subprocess.CREATE_NO_WINDOW if sys.platform == "win32" else 0
+        ).stdout
+        return int(out.split()[0]) * 1024 * 1024
+    except (OSError, subprocess.SubprocessError, ValueError, IndexError):
+        return None
+
+
+def mlock_allowed(nbytes):
+    """RLIMIT_MEMLOCK check on POSIX (an over-limit mlock just warns and pages anyway)."""
+    try:
+        import resource
+    except ImportError:
+        return True # Windows: VirtualLock grows the working set on demand
+    soft, _ = resource.getrlimit(resource.RLIMIT_MEMLOCK)
+    return soft == resource.RLIM_INFINITY or soft >= nbytes
+
+
+def split_weights(meta, n_gpu_layers):
+    """(ram_bytes, vram_bytes) for the weights; llama.cpp offloads the last n_gpu_layers blocks."""
+    sizes = meta.layer_bytes()
+    n_layers = meta.block_count or len([k for k in sizes if k is not None])
+    total = sum(sizes.values())
+    if n_gpu_layers is None or n_gpu_layers == 0 or not n_layers:
+        return total, 0
+    if n_gpu_layers < 0 or n_gpu_layers > n_layers:
+        on_gpu = sum(v for k, v in sizes.items() if k is not None) + meta.output_bytes()
+    else:
+        on_gpu = sum(v for k, v in sizes.items() if k is not None and k >= n_layers - n_gpu_layers)
+    return total - on_gpu, on_gpu
+
+
+def estimate(meta, cfg, n_ctx, cache_type_k="f16", cache_type_v=None):
+    """
+    Returns {"weights_ram", "weights_vram", "kv_ram", "kv_vram", "compute", "ram", "vram"} in bytes
+    for loading `meta` with cfg's n_gpu_layers at n_ctx.
+    """
+    cache_type_v = cache_type_v or cache_type_k
+    n_layers = meta.block_count or 1
+    gpu_layers = cfg.get("n_gpu_layers", 0)
+    offloaded = n_layers if gpu_layers < 0 else min(gpu_layers, n_layers)
+
+    weights_ram, weights_vram = split_weights(meta, gpu_layers)
+    kv_layer = kv_bytes_per_token(meta, cache_type_k, cache_type_v) * n_ctx
+    kv_vram = int(kv_layer * offloaded)
+    kv_ram = int(kv_layer * (n_layers - offloaded))
+
+    # Logits for one batch plus a share of the weights for compute buffers
+    compute = int((weights_ram + weights_vram) * COMPUTE_FRACTION) + cfg.get("n_batch", 512) * (meta.n_vocab or 32000) * 4
+    return {
+        "weights_ram": weights_ram, "weights_vram": weights_vram,
+        "kv_ram": kv_ram, "kv_vram": kv_vram, "compute": compute,
+        "ram": weights_ram + kv_ram + compute,
+        "vram": weights_vram + kv_vram,
+    }
+
+
+def plan_memory(model_path, cfg, unified_memory=False, preferred_ctx=DEFAULT_CTX, max_ctx=MAX_CTX,
+                kv_types=KV_TYPES, ram_free=None, vram_free=None):
+    """
+    Chooses n_ctx, KV cache type and mlock/mmap for model_path under cfg's GPU split.
+
+    unified_memory: the GPU allocates from system RAM (APU/iGPU), so VRAM use counts against RAM.
+    kv_types: cache types to consider, preferred first.
+    ram_free / vram_free: override the detected free memory (bytes).
+
+    Returns a plan dict with "action": "ok" (best choice fits), "downgraded" (a smaller context
+    or quantized cache was needed) or "refused" (even the smallest load would page), or None
+    when the file has no readable GGUF header.
+    """
+    meta = read_gguf(model_path)
+    if meta is None or not meta.block_count:
+        return None
+
+    ram_free = available_ram() if ram_free is None else ram_free
+    vram_free = available_vram() if vram_free is None and not unified_memory else vram_free
+    ram_total = total_ram()
+    ram_budget = None
+    if ram_free is not None:
+        ram_budget = ram_free - int((ram_total or ram_free) * RAM_HEADROOM)
+    vram_budget = int(vram_free * (1 - VRAM_HEADROOM)) if vram_free is not None else None
+
+    trained = meta.context_length or max_ctx
+    ceiling = max(MIN_CTX, min(trained, max_ctx))
+    steps = [c for c in CONTEXT_STEPS if c <= ceiling]
+    if ceiling not in steps:
+        steps.insert(0, ceiling)
+
+    def fits(est):
+        ram = est["ram"] + (est["vram"] if unified_memory else 0)
+        if ram_budget is not None and ram > ram_budget:
+            return False
+        if vram_budget is not None and est["vram"] > vram_budget:
+            return False
+        return True
+
+    # Best cache type at the largest context; go below preferred_ctx only after every cache type failed there
+    preferred = min(preferred_ctx, ceiling)
+    order = [(kv, c) for kv in kv_types for c in steps if c >= preferred]
+    order += [(kv, c) for c in steps if c < preferred for kv in kv_types]
+
+    choice = None
+    for kv, n_ctx in order:
+        est = estimate(meta, cfg, n_ctx, kv)
+        if fits(est):
+            choice = (kv, n_ctx, est)
+            break
+
+    if choice is None:
+        kv, n_ctx = kv_types[-1], steps[-1]
+        est = estimate(meta, cfg, n_ctx, kv)
+        action = "refused"
+    else:
+        kv, n_ctx, est = choice
+        action = "ok" if kv == kv_types[0] and n_ctx >= preferred else "downgraded"
+
+    # mlock pins the CPU-side weights; only worth it (and only safe) with room to spare
+    locked = est["weights_ram"] + (est["weights_vram"] if unified_memory else 0)
+    use_mlock = (action != "refused" and ram_budget is not None
+                 and locked * MLOCK_MARGIN <= ram_budget and mlock_allowed(locked))
+
+    return {
+        "action": action,
+        "n_ctx": n_ctx,
+        "cache_type_k": kv,
+        "cache_type_v": kv,
+        "use_mlock": use_mlock,
+        "use_mmap": True,
+        "trained_ctx": meta.context_length,
+        "n_layers": meta.block_count,
+        "estimate": est,
+        "ram_budget": ram_budget,
+        "vram_budget": vram_budget,
+        "unified_memory": unified_memory,
+    }
+
+
+def apply_plan(cfg, plan):
+    """Copies a plan's choices into a handshake config (quantized V needs flash attention)."""
+    cfg.update({k: plan[k] for k in ("n_ctx", "cache_type_k", "cache_type_v", "use_mlock", "use_mmap")})
+    if plan["cache_type_v"] != "f16":
+        cfg["flash_attn"] = True
+    cfg["memory_plan"] = {k: plan[k] for k in ("action", "trained_ctx", "n_layers", "ram_budget", "vram_budget")}
+    cfg["memory_plan"]["ram"] = plan["estimate"]["ram"]
+    cfg["memory_plan"]["vram"] = plan["estimate"]["vram"]
+    return cfg
+
+
+def describe(plan):
+    gb = lambda b: f"{b / 1024**3:.1f} GB" if b is not None else "?"
+    est = plan["estimate"]
+    return (f"ctx {plan['n_ctx']} | KV {plan['cache_type_k']} | "
+            f"RAM {gb(est['ram'])} / {gb(plan['ram_budget'])} | VRAM {gb(est['vram'])} / {gb(plan['vram_budget'])} | "
+            f"{'mlock' if plan['use_mlock'] else 'mmap'}")
+
+
+class MemoryPlanError(MemoryError):
+    """Raised by callers that refuse a load the planner says would page."""
+
+
+def check_plan(cfg, model_path):
+    """Raises MemoryPlanError when cfg carries a refused plan."""
+    plan = cfg.get("memory_plan")
+    if plan and plan.get("action") == "refused":
+        raise MemoryPlanError(
+            f"{os.path.basename(model_path)} does not fit in free memory even at ctx {cfg.get('n_ctx')} "
+            f"with a {cfg.get('cache_type_k')} KV cache (needs {plan['ram'] / 1024**3:.1f} GB RAM, "
+            f"{plan['vram'] / 1024**3:.1f} GB VRAM). Close other programs, lower n_gpu_layers or pick a smaller quant."
+        )
+
+
+if __name__ == "__main__":
+    import json
+    import machine_engine_handshake
+    mode, _, base = machine_engine_handshake.get_hardware_config(tuned=False)
+    for path in sys.argv[1:]:
+        plan = plan_memory(path, base, unified_memory=mode.startswith("APU"))
+        print(json.dumps(plan, indent=4) if plan else f"{path}: not a readable GGUF")
@@ -0,0 +1,212 @@
+import os
+import gc
+from collections import OrderedDict
+
+import vox_trace
+
+try:
+    import psutil
+except ImportError:
+    psutil = None
+
+# ==========================================
+# MODEL RESIDENCY SETTINGS
+# ==========================================
+DEFAULT_MAX_MODELS = 2
+DEFAULT_RAM_FRACTION = 0.70   # Share of total system RAM the cache may occupy
+DEFAULT_LAYER_GUESS = 32      # Used when the real block count is unknown
+OVERHEAD_FACTOR = 1.10        # Compute buffers, scratch and tokenizer on top of the weights
+
+
+def load_llama(model_path, cfg, n_ctx=None, verbose=True):
+    """
+    Default engine factory: builds a Llama from a handshake config.
+    cfg["draft_model"] ("lookup" or a draft GGUF) enables speculative decoding.
+    """
+    n_ctx = n_ctx or cfg.get('n_ctx', 4096)
+    from llama_cpp import Llama
+    draft = None
+    if cfg.get('draft_model'):
+        from speculative import make_draft_model
+        draft = make_draft_model(cfg['draft_model'], cfg, n_ctx=n_ctx, verbose=verbose)
+    with vox_trace.span("llama.construct", "startup", model=os.path.basename(model_path), n_ctx=n_ctx,
+                        n_gpu_layers=cfg['n_gpu_layers']):
+        llm = Llama(
+            model_path=model_path,
+            n_ctx=n_ctx,
+            verbose=verbose,
+            draft_model=draft,
+            n_gpu_layers=cfg['n_gpu_layers'],
+            n_threads=cfg['n_threads'],
+            n_threads_batch=cfg['n_threads_batch'],
+            n_batch=cfg['n_batch'],
+            flash_attn=cfg['flash_attn'],
+            use_mlock=cfg['use_mlock'],
+            use_mmap=cfg.get('use_mmap', True),
+            cache_type_k=cfg['cache_type_k'],
+            cache_type_v=cfg['cache_type_v']
+        )
+    if draft is not None:
+        from speculative import check_draft_compatible
+        check_draft_compatible(llm)
+    return llm
+
+
+def estimate_footprint(model_path, cfg, n_layers=None):
+    """
+    Splits a model's memory cost into (ram_bytes, vram_bytes).
+    Uses the GGUF tensor table and KV geometry when readable; otherwise the file size is the
+    weight cost and n_gpu_layers decides how much of it lives on the GPU.
+    """
+    from memory_planner import estimate
+    from gguf_metadata import read_gguf
+    meta = read_gguf(model_path) if n_layers is None else None
+    if meta is not None and meta.block_count:
+        est = estimate(meta, cfg, cfg.get('n_ctx', 4096), cfg.get('cache_type_k', 'f16'), cfg.get('cache_type_v'))
+        return est["ram"], est["vram"]
+
+    total = int(os.path.getsize(model_path) * OVERHEAD_FACTOR)
+    gpu_layers = cfg.get('n_gpu_layers', 0)
+    layers = n_layers or DEFAULT_LAYER_GUESS
+
+    if gpu_layers < 0 or gpu_layers >= layers:
+        offload = 1.0
+    else:
+        offload = gpu_layers / layers
+
+    vram = int(total * offload)
+    return total - vram, vram
+
+
+def default_ram_budget():
+    if psutil is None:
+        return None
+    return int(psutil.virtual_memory().total * DEFAULT_RAM_FRACTION)
+
+
+class ModelResidencyManager:
+    """
+    Keeps up to N local engines loaded so swapping back to a recent model is instant.
+    Engines are evicted least-recently-used first when the count or memory budget is exceeded.
+    """
+
+    def __init__(self, max_models=DEFAULT_MAX_MODELS, ram_budget=None, vram_budget=None,
+                 engine_factory=None, footprint_fn=None, verbose=True):
+        """
+        Args:
+            max_models: Maximum number of engines kept resident at once
+            ram_budget: Bytes of system RAM the cache may use (default: 70% of total RAM)
+            vram_budget: Bytes of VRAM the cache may use (None = unlimited/unknown)
+            engine_factory: Callable(model_path, cfg, n_ctx) -> engine. Defaults to load_llama.
+            footprint_fn: Callable(model_path, cfg) -> (ram_bytes, vram_bytes). Defaults to estimate_footprint.
+        """
+        self.max_models = max(1, max_models)
+        self.ram_budget = ram_budget if ram_budget is not None else default_ram_budget()
+        self.vram_budget = vram_budget
+        self.engine_factory = engine_factory or (lambda path, cfg, n_ctx: load_llama(path, cfg, n_ctx, verbose))
+        self.footprint_fn = footprint_fn or estimate_footprint
+        self.verbose = verbose
+
+        # key -> {"engine", "path", "ram", "vram"}, oldest first
+        self._entries = OrderedDict()
+
+    def _log(self, msg):
+        if self.verbose:
+            print(f"[CACHE] {msg}")
+
+    @staticmethod
+    def _key(model_path, cfg, n_ctx):
+        path = os.path.abspath(model_path).replace("\\", "/")
+        return (path, n_ctx, cfg.get('n_gpu_layers'), cfg.get('cache_type_k'), cfg.get('cache_type_v'))
+
+    def used(self):
+        """Returns (ram_bytes, vram_bytes) currently held by cached engines."""
+        ram = sum(e["ram"] for e in self._entries.values())
+        vram = sum(e["vram"] for e in self._entries.values())
+        return ram, vram
+
+    def _fits(self, ram, vram):
+        used_ram, used_vram = self.used()
+        if len(self._entries) >= self.max_models:
+            return False
+        if self.ram_budget is not None and used_ram + ram > self.ram_budget:
+            return False
+        if self.vram_budget is not None and used_vram + vram > self.vram_budget:
+            return False
+        return True
+
+    def _evict_oldest(self):
+        _, entry = self._entries.popitem(last=False)
+        self._log(f"Evicting {os.path.basename(entry['path'])} (least recently used)")
+        engine = entry.pop("engine")
+        if hasattr(engine, "close"):
+            try: engine.close()
+            except Exception: pass
+        del engine
+        gc.collect()
+
+    def acquire(self, model_path, cfg, n_ctx=None):
+        """
+        Returns (engine, was_cached). Loads the model if it is not resident,
+        evicting the least recently used engines until it fits.
+        n_ctx defaults to cfg["n_ctx"] (set by the handshake's memory plan).
+        """
+        n_ctx = n_ctx or cfg.get('n_ctx', 4096)
+        key = self._key(model_path, cfg, n_ctx)
+        if key in self._entries:
+            self._entries.move_to_end(key)
+            self._log(f"Reusing resident engine: {os.path.basename(model_path)}")
+            return self._entries[key]["engine"], True
+
+        ram, vram = self.footprint_fn(model_path, cfg)
+        while self._entries and not self._fits(ram, vram):
+            self._evict_oldest()
+
+        if not self._fits(ram, vram):
+            self._log(f"⚠️ {os.path.basename(model_path)} exceeds the cache budget on its own. Loading anyway.")
+
+        engine = self.engine_factory(model_path, cfg, n_ctx)
+        self._entries[key] = {"engine": engine, "path": model_path, "cfg": dict(cfg), "n_ctx": n_ctx, "ram": ram, "vram": vram}
+        return engine, False
+
+    def make_room(self):
+        """
+        Evicts least recently used engines until one more fits under max_models, so callers
+        can plan a new load against the RAM that is actually free. Returns the bytes of RAM released.
+        """
+        released = 0
+        while self._entries and len(self._entries) >= self.max_models:
+            released += next(iter(self._entries.values()))["ram"]
+            self._evict_oldest()
+        return released
+
+    def resident_config(self, model_path):
+        """The cfg a resident engine for model_path was loaded with (most recent), or None."""
+        path = os.path.abspath(model_path).replace("\\", "/")
+        for key, entry in reversed(self._entries.items()):
+            if key[0] == path:
+                return entry["cfg"]
+        return None
+
+    def evict(self, model_path):
+        """Drops every cached engine for a model path."""
+        path = os.path.abspath(model_path).replace("\\", "/")
+        for key in [k for k in self._entries if k[0] == path]:
+            self._entries.move_to_end(key, last=False)
+            self._evict_oldest()
+
+    def clear(self):
+        """Unloads all cached engines."""
+        while self._entries:
+            self._evict_oldest()
+
+    def resident_models(self):
+        """File names of resident models, most recently used last."""
+        return [os.path.basename(e["path"]) for e in self._entries.values()]
+
+    def __contains__(self, model_path):
+        path = os.path.abspath(model_path).replace("\\", "/")
+        return any(k[0] == path for k in self._entries)
+
+    def __len__(self):
+        return len(self._entries)
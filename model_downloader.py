@@ -0,0 +1,343 @@
+import os
+import re
+import sys
+import json
+import time
+import hashlib
+import argparse
+import threading
+import urllib.error
+import urllib.parse
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+
+# ==========================================
+# MODEL DOWNLOADER
+# ==========================================
+# Fetches multi-GB GGUFs into models/ with parallel HTTP Range requests. Progress is kept in a
+# "<file>.part.json" manifest beside the "<file>.part" data, so an interrupted download resumes
+# where it stopped. Completed chunks are SHA-256 hashed in order while later ones are still
+# downloading. The finished file is renamed into place atomically and added to the model index.
+
+MODELS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "models")
+USER_AGENT = "VoxAI/1.0"
+CHUNK_BYTES = 64 * 1024 * 1024
+CONNECTIONS = 4
+RETRIES = 5
+TIMEOUT = 30
+READ_BYTES = 1024 * 1024
+MANIFEST_VERSION = 1
+MAX_REDIRECTS = 5
+REDIRECT_CODES = (301, 302, 303, 307, 308)
+
+_SHA256_RE = re.compile(r"^[0-9a-f]{64}$")
+
+
+class DownloadError(RuntimeError):
+    pass
+
+
+def hf_url(repo, filename, revision="main"):
+    return f"https://huggingface.co/{repo}/resolve/{revision}/{filename}"
+
+
+class _NoRedirect(urllib.request.HTTPRedirectHandler):
+    def redirect_request(self, *args, **kwargs):
+        return None # urlopen raises HTTPError with the 3xx response instead
+
+
+_no_redirect = urllib.request.build_opener(_NoRedirect)
+
+
+def _request(url, headers=None, method="GET", follow=True):
+    req = urllib.request.Request(url, method=method, headers={"User-Agent": USER_AGENT, **(headers or {})})
+    if not follow:
+        return _no_redirect.open(req, timeout=TIMEOUT)
+    return urllib.request.urlopen(req, timeout=TIMEOUT)
+
+
+def _range_probe(url):
+    """One-byte Range GET without following redirects. 3xx and 416 (empty file) are returned, not raised."""
+    try:
+        return _request(url, {"Range": "bytes=0-0"}, follow=False)
+    except urllib.error.HTTPError as e:
+        if e.code in REDIRECT_CODES or e.code == 416:
+            return e
+        raise
+
+
+def probe(url):
+    """
+    Returns {"url", "size", "ranges", "etag", "sha256"} for url; "url" is where the bytes are
+    (after redirects). A one-byte Range GET works on servers and CDNs that mishandle HEAD.
+    Redirects are followed by hand: Hugging Face redirects to its CDN, and only its own
+    response carries X-Linked-ETag (the LFS object's SHA-256) and X-Linked-Size.
+    """
+    linked_etag = linked_size = None
+    target = url
+    for _ in range(MAX_REDIRECTS + 1):
+        resp = _range_probe(target)
+        if resp.getcode() not in REDIRECT_CODES:
+            break
+        linked_etag = linked_etag or resp.headers.get("X-Linked-ETag")
+        linked_size = linked_size or resp.headers.get("X-Linked-Size")
+        location = resp.headers.get("Location")
+        resp.close()
+        if not location:
+            raise DownloadError(f"redirect without a Location from {target}")
+        target = urllib.parse.urljoin(target, location)
+    else:
+        raise DownloadError(f"more than {MAX_REDIRECTS} redirects from {url}")
+
+    with resp:
+        headers = resp.headers
+        status = resp.getcode()
+    ranges = status == 206
+    if status in (206, 416):
+        total = headers.get("Content-Range", "").rsplit("/", 1)[-1]
+        size = int(total) if total.isdigit() else None
+    else:
+        size = int(headers["Content-Length"]) if headers.get("Content-Length") else None
+    if size is None and linked_size and linked_size.isdigit():
+        size = int(linked_size)
+    etag = (linked_etag or headers.get("X-Linked-ETag") or headers.get("ETag") or "").strip()
+    if etag.startswith("W/"):
+        etag = etag[2:]
+    etag = etag.strip('"')
+    return {
+        "url": target,
+        "size": size,
+        "ranges": ranges and bool(size), # An empty file has no byte range to ask for
+        "etag": etag or None,
+        "sha256": etag.lower() if _SHA256_RE.match(etag.lower()) else None,
+    }
+
+
+# --- MANIFEST ---
+def _manifest_path(dest):
+    return dest + ".part.json"
+
+
+def load_manifest(dest):
+    try:
+        with open(_manifest_path(dest), "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def save_manifest(dest, manifest):
+    tmp = _manifest_path(dest) + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(manifest, f)
+    os.replace(tmp, _manifest_path(dest))
+
+
+# --- DOWNLOAD ---
+def _fetch_chunk(url, part_path, start, end, retries, cancel):
+    """Downloads bytes [start, end] into part_path at offset start, retrying with backoff."""
+    for attempt in range(retries + 1):
+        if cancel.is_set():
+            raise DownloadError("cancelled")
+        written = 0
+        try:
+            with _request(url, {"Range": f"bytes={start}-{end}"}) as resp, open(part_path, "r+b") as f:
+                if resp.status != 206:
+                    raise DownloadError(f"server ignored Range request (HTTP {resp.status})")
+                f.seek(start)
+                while True:
+                    if cancel.is_set():
+                        raise DownloadError("cancelled")
+                    data = resp.read(READ_BYTES)
+                    if not data:
+                        break
+                    f.write(data)
+                    written += len(data)
+            if written != end - start + 1:
+                raise DownloadError(f"short read: {written} of {end - start + 1} bytes")
+            return written
+        except (OSError, urllib.error.URLError, DownloadError) as e:
+            if cancel.is_set() or attempt == retries:
+                raise
+            time.sleep(min(30, 2 ** attempt))
+    return 0
+
+
+def _fetch_whole(url, part_path, hasher, progress, cancel):
+    """Single stream for servers without Range support (no resume)."""
+    done = 0
+    with _request(url) as resp, open(part_path, "wb") as f:
+        total = int(resp.headers["Content-Length"]) if resp.headers.get("Content-Length") else None
+        while True:
+            if cancel.is_set():
+                raise DownloadError("cancelled")
+            data = resp.read(READ_BYTES)
+            if not data:
+                break
+            f.write(data)
+            hasher.update(data)
+            done += len(data)
+            if progress:
+                progress(done, total)
+    return done
+
+
+def download(url, dest, sha256=None, connections=CONNECTIONS, chunk_bytes=CHUNK_BYTES,
+             retries=RETRIES, progress=None, cancel=None):
+    """
+    Downloads url to dest. Resumes a previous partial download of the same URL/ETag/size.
+
+    sha256: expected digest; if omitted, the server's (Hugging Face X-Linked-ETag) is used when present.
+    progress: callable(done_bytes, total_bytes), called from this thread.
+    cancel: threading.Event that aborts the download (the partial file is kept for resume).
+
+    Returns {"path", "size", "sha256", "verified", "resumed_bytes", "elapsed_s"}.
+    Raises DownloadError on a checksum mismatch or when retries are exhausted.
+    """
+    cancel = cancel or threading.Event()
+    os.makedirs(os.path.dirname(os.path.abspath(dest)), exist_ok=True)
+    part_path = dest + ".part"
+    t0 = time.perf_counter()
+
+    info = probe(url)
+    source = info["url"] # The CDN location after redirects; the manifest keeps the original URL
+    expected = (sha256 or info["sha256"] or "").lower() or None
+    hasher = hashlib.sha256()
+    resumed = 0
+
+    if not info["ranges"]:
+        size = _fetch_whole(source, part_path, hasher, progress, cancel)
+    else:
+        size = info["size"]
+        n_chunks = max(1, -(-size // chunk_bytes))
+        manifest = load_manifest(dest)
+        fresh = {"version": MANIFEST_VERSION, "url": url, "size": size, "etag": info["etag"],
+                 "chunk_bytes": chunk_bytes, "done": []}
+        if (not manifest or not os.path.exists(part_path)
+                or any(manifest.get(k) != fresh[k] for k in ("version", "url", "size", "etag", "chunk_bytes"))):
+            manifest = fresh
+            with open(part_path, "wb") as f:
+                f.truncate(size)
+        done = set(manifest["done"])
+        resumed = sum(min(chunk_bytes, size - i * chunk_bytes) for i in done)
+        save_manifest(dest, manifest)
+
+        next_hash = 0
+        done_bytes = resumed
+
+        def advance_hash():
+            """Hash every contiguous finished chunk from the front (pages are still cached)."""
+            nonlocal next_hash
+            with open(part_path, "rb") as f:
+                f.seek(next_hash * chunk_bytes)
+                while next_hash in done:
+                    remaining = min(chunk_bytes, size - next_hash * chunk_bytes)
+                    while remaining:
+                        data = f.read(min(READ_BYTES, remaining))
+                        hasher.update(data)
+                        remaining -= len(data)
+                    next_hash += 1
+
+        advance_hash()
+        if progress:
+            progress(done_bytes, size)
+        todo = [i for i in range(n_chunks) if i not in done]
+        with ThreadPoolExecutor(max_workers=max(1, connections), thread_name_prefix="vox-download") as pool:
+            futures = {pool.submit(_fetch_chunk, source, part_path, i * chunk_bytes,
+                                   min(size, (i + 1) * chunk_bytes) - 1, retries, cancel): i for i in todo}
+            try:
+                pending = set(futures)
+                while pending:
+                    finished, pending = wait(pending, return_when=FIRST_COMPLETED)
+                    for fut in finished:
+                        done_bytes += fut.result()
+                        done.add(futures[fut])
+                        manifest["done"] = sorted(done)
+                        save_manifest(dest, manifest)
+                    advance_hash()
+                    if progress:
+                        progress(done_bytes, size)
+            except BaseException:
+                cancel.set() # Stop the other workers; finished chunks stay in the manifest
+                raise
+
+    digest = hasher.hexdigest()
+    if expected and digest != expected:
+        for path in (part_path, _manifest_path(dest)):
+            try: os.remove(path)
+            except OSError: pass
+        raise DownloadError(f"SHA-256 mismatch for {os.path.basename(dest)}: expected {expected}, got {digest}")
+
+    os.replace(part_path, dest)
+    try: os.remove(_manifest_path(dest))
+    except OSError: pass
+    return {
+        "path": dest,
+        "size": size,
+        "sha256": digest,
+        "verified": bool(expected),
+        "resumed_bytes": resumed,
+        "elapsed_s": round(time.perf_counter() - t0, 2),
+    }
+
+
+def register(path, cloud_id=None):
+    """Adds a downloaded GGUF to the model index (and its Hugging Face ID to known_models.json)."""
+    import model_index
+    index = model_index.scan(os.path.dirname(os.path.abspath(path)))
+    if cloud_id:
+        known = model_index.load_known_models()
+        if known.get(os.path.basename(path)) != cloud_id:
+            known[os.path.basename(path)] = cloud_id
+            with open(model_index.KNOWN_MODELS_FILE, "w") as f:
+                json.dump(known, f, indent=4)
+    return index.get(os.path.basename(path))
+
+
+def download_model(url, filename, models_dir=MODELS_DIR, sha256=None, cloud_id=None,
+                   connections=CONNECTIONS, progress=None):
+    """download() into models/ followed by register(). Returns (result, index_entry)."""
+    result = download(url, os.path.join(models_dir, filename), sha256=sha256,
+                      connections=connections, progress=progress)
+    return result, register(result["path"], cloud_id)
+
+
+def print_progress(done, total):
+    if total:
+        pct = done * 100 // total
+        sys.stdout.write(f"\rDownloading... {pct}% ({done / 1024**3:.2f}/{total / 1024**3:.2f} GB)")
+    else:
+        sys.stdout.write(f"\rDownloading... {done / 1024**2:.0f} MB")
+    sys.stdout.flush()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Download a GGUF into models/ (resumable, parallel, verified)")
+    parser.add_argument("url", help="Direct URL, or a Hugging Face repo with --file")
+    parser.add_argument("--file", help="File in the Hugging Face repo given as url")
+    parser.add_argument("-o", "--output", help="File name in models/ (default: the URL's file name)")
+    parser.add_argument("--sha256", help="Expected SHA-256 (default: the server's, when it publishes one)")
+    parser.add_argument("-c", "--connections", type=int, default=CONNECTIONS)
+    parser.add_argument("--cloud-id", help="Hugging Face ID to record in known_models.json for cloud mode")
+    parser.add_argument("--models-dir", default=MODELS_DIR)
+    args = parser.parse_args(argv)
+
+    url = hf_url(args.url, args.file) if args.file else args.url
+    filename = args.output or os.path.basename(url.split("?", 1)[0])
+    try:
+        result, entry = download_model(url, filename, args.models_dir, sha256=args.sha256,
+                                       cloud_id=args.cloud_id, connections=args.connections,
+                                       progress=print_progress)
+    except KeyboardInterrupt:
+        sys.exit("\n[DOWNLOAD] Interrupted. Run the same command again to resume.")
+    except (DownloadError, OSError, urllib.error.URLError) as e:
+        sys.exit(f"\n[DOWNLOAD] ❌ {e}")
+    print(f"\n[DOWNLOAD] ✅ {filename}: {result['size'] / 1024**3:.2f} GB in {result['elapsed_s']}s "
+          f"({'verified' if result['verified'] else 'unverified'} sha256 {result['sha256'][:12]}…)")
+    if entry:
+        import model_index
+        print(f"[DOWNLOAD] Indexed: {model_index.describe(entry)}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,232 @@
+import os
+import sys
+import json
+
+try:
+    import psutil
+except ImportError:
+    psutil = None
+
+from gguf_metadata import read_gguf
+
+# ==========================================
+# MODEL INDEX
+# ==========================================
+# What is in models/, from GGUF headers only: architecture, parameter count, quantization,
+# trained context and chat template. Entries are cached in model_index.json and re-read only
+# when a file's size or mtime changes, so menus and model picking cost a few stat() calls.
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+MODELS_DIR = os.path.join(BASE_DIR, "models")
+INDEX_FILE = os.path.join(BASE_DIR, "model_index.json")
+KNOWN_MODELS_FILE = os.path.join(BASE_DIR, "known_models.json")
+INDEX_VERSION = 1
+
+# llama_ftype (general.file_type) -> quantization label
+FILE_TYPES = {
+    0: "F32", 1: "F16", 2: "Q4_0", 3: "Q4_1", 7: "Q8_0", 8: "Q5_0", 9: "Q5_1",
+    10: "Q2_K", 11: "Q3_K_S", 12: "Q3_K_M", 13: "Q3_K_L", 14: "Q4_K_S", 15: "Q4_K_M",
+    16: "Q5_K_S", 17: "Q5_K_M", 18: "Q6_K", 19: "IQ2_XXS", 20: "IQ2_XS", 21: "Q2_K_S",
+    22: "IQ3_XS", 23: "IQ3_XXS", 24: "IQ1_S", 25: "IQ4_NL", 26: "IQ3_S", 27: "IQ3_M",
+    28: "IQ2_S", 29: "IQ2_M", 30: "IQ4_XS", 31: "IQ1_M", 32: "BF16", 36: "TQ1_0",
+    37: "TQ2_0", 38: "MXFP4_MOE",
+}
+
+RAM_FIT_FRACTION = 0.70 # pick_default(): weights must fit in this share of available RAM
+
+
+def _entry(path, stat):
+    meta = read_gguf(path)
+    entry = {"size": stat.st_size, "mtime": stat.st_mtime}
+    if meta is None:
+        entry["error"] = "unreadable GGUF header"
+        return entry
+
+    # Quantization: the declared file type, else the type holding the most bytes
+    quant = FILE_TYPES.get(meta.metadata.get("general.file_type"))
+    if quant is None and meta.tensors:
+        by_type = {}
+        for t in meta.tensors:
+            by_type[t.type_name] = by_type.get(t.type_name, 0) + t.nbytes
+        quant = max(by_type, key=by_type.get)
+
+    entry.update({
+        "name": meta.metadata.get("general.name"),
+        "architecture": meta.architecture,
+        "params": sum(t.n_elements for t in meta.tensors),
+        "quant": quant,
+        "context_length": meta.context_length,
+        "block_count": meta.block_count,
+        "embedding_length": meta.embedding_length,
+        "n_vocab": meta.n_vocab,
+        "weights_bytes": meta.weights_bytes,
+        "chat_template": bool(meta.metadata.get("tokenizer.chat_template")),
+    })
+    return entry
+
+
+def read_entry(path):
+    """Index entry for a GGUF anywhere on disk, read directly (not cached)."""
+    return _entry(path, os.stat(path))
+
+
+def load_index(path=INDEX_FILE):
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            data = json.load(f)
+        if data.get("version") == INDEX_VERSION:
+            return data.get("models", {})
+    except (OSError, ValueError, AttributeError):
+        pass
+    return {}
+
+
+def save_index(models, path=INDEX_FILE):
+    tmp = path + ".tmp"
+    try:
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump({"version": INDEX_VERSION, "models": models}, f, indent=4)
+        os.replace(tmp, path)
+    except OSError:
+        pass
+
+
+def scan(models_dir=MODELS_DIR, path=INDEX_FILE):
+    """
+    Returns {filename: entry} for every .gguf in models_dir, sorted by name.
+    Only new or changed files (size/mtime) have their header read; the index file is
+    rewritten only when something changed.
+    """
+    cached = load_index(path)
+    models = {}
+    changed = False
+    if os.path.isdir(models_dir):
+        for name in sorted(os.listdir(models_dir)):
+            if not name.endswith(".gguf"):
+                continue
+            full = os.path.join(models_dir, name)
+            try:
+                stat = os.stat(full)
+            except OSError:
+                continue
+            entry = cached.get(name)
+            if not entry or entry.get("size") != stat.st_size or entry.get("mtime") != stat.st_mtime:
+                entry = _entry(full, stat)
+                changed = True
+            models[name] = entry
+    if changed or set(models) != set(cached):
+        save_index(models, path)
+    return models
+
+
+def load_known_models(path=KNOWN_MODELS_FILE):
+    try:
+        with open(path, "r") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def reconcile(model_map, index, known_models=None):
+    """
+    Cross-checks config.MODEL_MAP and known_models.json against the files on disk.
+    Returns lists of:
+        missing      - MODEL_MAP keys whose GGUF is not in models/
+        unmapped     - GGUFs in models/ that no MODEL_MAP entry points to
+        no_cloud_id  - MODEL_MAP files with no Hugging Face ID in known_models.json
+        orphaned     - known_models.json files that are neither on disk nor in MODEL_MAP
+        unreadable   - GGUFs whose header could not be parsed (partial download, wrong format)
+    """
+    known_models = load_known_models() if known_models is None else known_models
+    mapped = set(model_map.values())
+    return {
+        "missing": [k for k, f in model_map.items() if f.endswith(".gguf") and f not in index],
+        "unmapped": [f for f, e in index.items() if f not in mapped and not e.get("error")],
+        "no_cloud_id": [f for f in model_map.values() if f not in known_models],
+        "orphaned": [f for f in known_models if f not in mapped and f not in index],
+        "unreadable": [f for f, e in index.items() if e.get("error")],
+    }
+
+
+def print_reconcile(report, prefix="[MODELS]"):
+    labels = {
+        "missing": "In MODEL_MAP but not downloaded",
+        "unmapped": "On disk but not in MODEL_MAP (added to the menu)",
+        "no_cloud_id": "No cloud ID in known_models.json",
+        "unreadable": "Unreadable GGUF header",
+    }
+    for key, label in labels.items():
+        if report.get(key):
+            print(f"{prefix} {label}: {', '.join(report[key])}")
+
+
+def menu_map(model_map, index):
+    """MODEL_MAP plus any unmapped, readable GGUF on disk (keyed by its file name), for the model menus."""
+    merged = dict(model_map)
+    mapped = set(model_map.values())
+    for name, entry in index.items():
+        if name not in mapped and not entry.get("error"):
+            merged[name] = name
+    return merged
+
+
+def format_params(n):
+    if not n:
+        return "?"
+    return f"{n / 1e9:.1f}B" if n >= 1e9 else f"{n / 1e6:.0f}M"
+
+
+def describe(entry):
+    """'14.8B Q4_K_M, 32K ctx, 8.4 GB' for menus."""
+    if entry is None:
+        return "not downloaded"
+    if entry.get("error"):
+        return entry["error"]
+    parts = [format_params(entry.get("params")), entry.get("quant") or "?"]
+    if entry.get("context_length"):
+        parts.append(f"{entry['context_length'] // 1024}K ctx")
+    parts.append(f"{entry['size'] / 1024**3:.1f} GB")
+    if not entry.get("chat_template"):
+        parts.append("no chat template")
+    return ", ".join(parts)
+
+
+def menu_label(key, filename, index):
+    if not filename.endswith(".gguf"):
+        return f"{key} (cloud only)"
+    return f"{key} ({describe(index.get(filename))})"
+
+
+def pick_default(index, ram_available=None):
+    """
+    The file to load when none was chosen: the largest chat model whose weights fit in
+    RAM_FIT_FRACTION of available RAM, else the smallest readable model. None if there is none.
+    """
+    usable = {f: e for f, e in index.items() if not e.get("error")}
+    if not usable:
+        return None
+    chat = {f: e for f, e in usable.items() if e.get("chat_template")} or usable
+    if ram_available is None and psutil is not None:
+        ram_available = psutil.virtual_memory().available
+    if ram_available:
+        fitting = [f for f, e in chat.items() if e["weights_bytes"] <= ram_available * RAM_FIT_FRACTION]
+        if fitting:
+            return max(fitting, key=lambda f: chat[f]["weights_bytes"])
+    return min(usable, key=lambda f: usable[f]["size"])
+
+
+def smallest(index):
+    usable = [f for f, e in index.items() if not e.get("error")]
+    return min(usable, key=lambda f: index[f]["size"]) if usable else None
+
+
+if __name__ == "__main__":
+    models_dir = sys.argv[1] if len(sys.argv) > 1 else MODELS_DIR
+    index = scan(models_dir)
+    for name, entry in index.items():
+        print(f" {name}: {entry.get('architecture', '?')} | {describe(entry)}")
+    try:
+        from config import MODEL_MAP
+    except ImportError:
+        MODEL_MAP = {}
+    print_reconcile(reconcile(MODEL_MAP, index))
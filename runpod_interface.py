@@ -3,11 +3,17 @@ import time
 import requests
 import sys
 import re
+import vox_trace
+import gpu_planner
 try:
     from config import GPU_TIERS, MODEL_SPECIFIC_TIERS, KEYWORD_TIERS
 except ImportError:
     # Fallback if config is missing (for safety)
     GPU_TIERS, MODEL_SPECIFIC_TIERS, KEYWORD_TIERS = {}, {}, []
+try:
+    from config import CLOUD_MAX_MODEL_LEN, CLOUD_CONCURRENCY
+except ImportError:
+    CLOUD_MAX_MODEL_LEN, CLOUD_CONCURRENCY = gpu_planner.DEFAULT_MAX_MODEL_LEN, gpu_planner.DEFAULT_CONCURRENCY
 
 class RunPodDriver:
     def __init__(self, api_key, pod_id):
@@ -15,7 +21,14 @@ class RunPodDriver:
         self.pod_id = pod_id 
         self.new_pod_id = None
         self.current_gpu_type = None
+        self.current_gpu_vram = None
         self.pod_cost = 0.0
+        self.gpu_plan = None # gpu_planner placement for the model being switched to
+        self.cancel_requested = False # Set from another thread to abort a pending boot
+
+    def cancel_boot(self):
+        """Asks a switch_model/wait_for_boot running on another thread to give up."""
+        self.cancel_requested = True
 
     def _run_cmd(self, cmd_list):
         """Executes shell commands via subprocess."""
@@ -78,7 +91,43 @@ class RunPodDriver:
                 gpus.append({"name": name, "vram": vram, "price": price})
         return gpus
 
-    def create_pod_on_gpu(self, gpu_type, target_model):
+    def _plan_gpus(self, target_model):
+        """Ranks the cloud catalog for target_model from its config.json. None = use the tiers."""
+        try:
+            profile, placement = gpu_planner.plan_model(target_model, self.get_available_gpus(),
+                                                        CLOUD_MAX_MODEL_LEN, CLOUD_CONCURRENCY, fetch=True)
+        except gpu_planner.GPUPlanError as e:
+            print(f"[PHOENIX] ⚠️ GPU planner: {e}")
+            return None
+        if profile is None:
+            return None
+        if placement is None:
+            print(f"[PHOENIX] ⚠️ GPU planner: no listed GPU fits {target_model} ({profile['weights_gb']} GB weights).")
+            return None
+        est = placement["estimate"]
+        print(f"[PHOENIX] 📐 Planner: {profile['params_b']}B params ({profile['quantization'] or 'unquantized'}) needs "
+              f"{est['total_gb']} GB at {placement['max_model_len']} x {CLOUD_CONCURRENCY} -> {placement['gpu']}")
+        placement["model"] = target_model
+        placement["profile"] = profile
+        return placement
+
+    def _vllm_flags(self, target_model, vram=None):
+        """
+        Memory flags for the vLLM command line. Sized by the GPU plan when there is one for this
+        model and card (vLLM reads the quantization from config.json); otherwise the fixed defaults.
+        """
+        plan = self.gpu_plan
+        if plan and plan["model"] == target_model and vram:
+            fit = gpu_planner.plan_for_gpu(plan["profile"], vram, CLOUD_MAX_MODEL_LEN, CLOUD_CONCURRENCY)
+            if fit:
+                return gpu_planner.vllm_flags(fit) + " "
+        flags = "--gpu-memory-utilization 0.95 --max-model-len 8192 "
+        # Auto-detect AWQ
+        if "awq" in target_model.lower() or "4bit" in target_model.lower():
+            flags += "--quantization awq "
+        return flags
+
+    def create_pod_on_gpu(self, gpu_type, target_model, vram=None):
         """Rents GPU with verified Image and Token handling."""
         print(f"[PHOENIX] 🐣 Renting {gpu_type}...")
         
@@ -89,19 +138,13 @@ class RunPodDriver:
             "pip install vllm transformers --cache-dir /root/.cache/huggingface/pip_cache && "
             "python3 -m vllm.entrypoints.openai.api_server "
             f"--model {target_model} "
-            "--gpu-memory-utilization 0.95 "
-            "--max-model-len 8192 "
+            f"{self._vllm_flags(target_model, vram)}"
             "--dtype auto "
             "--trust-remote-code "
             "--disable-frontend-multiprocessing "  # Fix for Engine Core Init failures
+            "|| sleep infinity\""
         )
         
-        # Auto-detect AWQ
-        if "awq" in target_model.lower() or "4bit" in target_model.lower():
-            start_cmd += " --quantization awq"
-            
-        start_cmd += " || sleep infinity\""
-        
         args = [
             "runpodctl", "create", "pod",
             "--name", "VoxAI_Cloud",
@@ -115,7 +158,9 @@ class RunPodDriver:
             "--args", start_cmd 
         ]
 
-        output = self._run_cmd(args)
+        with vox_trace.span("cloud.rent", "cloud", gpu=gpu_type, model=target_model) as s:
+            output = self._run_cmd(args)
+            s.set(created="created" in output.lower())
         # print(f"[DEBUG] Raw RunPod Output: {output}") # Reduce noise
         
         pod_id = None
@@ -129,6 +174,7 @@ class RunPodDriver:
         
         if pod_id:
             self.current_gpu_type = gpu_type
+            self.current_gpu_vram = vram
             # Try to update cost if possible, or do it later
             # For now, we set it to 0 and let switch_model update it or get_balace
             # Actually, to get cost, we need to know the price of the GPU we just rented.
@@ -138,11 +184,13 @@ class RunPodDriver:
             for g in avail:
                 if g['name'] == gpu_type:
                     self.pod_cost = g['price']
+                    self.current_gpu_vram = g['vram']
                     break
             
             return pod_id
         return None
 
+    @vox_trace.traced("cloud.restart_server", "cloud")
     def restart_server(self, target_model):
         """Hot-swaps the model inside the existing pod."""
         print(f"[PHOENIX] ♻️  Optimizing: Reusing active GPU ({self.current_gpu_type})...")
@@ -172,18 +220,12 @@ class RunPodDriver:
         start_cmd = (
             f"nohup python3 -m vllm.entrypoints.openai.api_server "
             f"--model {target_model} "
-            "--gpu-memory-utilization 0.95 "
-            "--max-model-len 8192 "
+            f"{self._vllm_flags(target_model, self.current_gpu_vram)}"
             "--dtype auto "
             "--trust-remote-code "
             "--disable-frontend-multiprocessing "
+            "> /var/log/vllm.log 2>&1 &"
         )
-        
-        # Auto-detect AWQ
-        if "awq" in target_model.lower() or "4bit" in target_model.lower():
-            start_cmd += " --quantization awq"
-            
-        start_cmd += " > /var/log/vllm.log 2>&1 &"
         self._run_cmd(["runpodctl", "exec", "pod", active_id, "--", "bash", "-c", start_cmd])
         return True
 
@@ -205,9 +247,18 @@ class RunPodDriver:
                 return tier
         return None
 
-    def switch_model(self, target_model):
-        """Priority: Defined List -> Scrape 48GB+ -> User Pick -> Retry 3x."""
+    @vox_trace.traced("cloud.switch_model", "cloud")
+    def switch_model(self, target_model, interactive=True):
+        """
+        Priority: Planned/Defined List -> Scrape 48GB+ -> User Pick -> Retry 3x.
+        The planned list comes from gpu_planner when the model's config.json is cached or
+        downloadable (cheapest card that fits first); otherwise the GPU tiers decide.
+        With interactive=False (background boots) the user-pick phase is skipped
+        and boot progress is not streamed to the console.
+        """
         print(f"\n[PHOENIX] 🔥 Initiating Swap...")
+        self.cancel_requested = False
+        quiet = not interactive
         active_id = self.new_pod_id if self.new_pod_id else self.pod_id
         
         # Resolve Tiers
@@ -215,16 +266,22 @@ class RunPodDriver:
         current_tier = self._get_gpu_tier(self.current_gpu_type)
         
         print(f"[PHOENIX] 📊 Swap Analysis: Target={target_tier} | Current={current_tier} ({self.current_gpu_type})")
+        self.gpu_plan = self._plan_gpus(target_model)
 
         # --- PHASE 1: Try In-Pod Swap (Reuse) ---
         can_reuse = False
-        if active_id and current_tier:
+        if active_id and self.gpu_plan and self.current_gpu_vram:
+            # Reuse when the current card serves as much context as the best planned card
+            fit = gpu_planner.plan_for_gpu(self.gpu_plan["profile"], self.current_gpu_vram,
+                                           CLOUD_MAX_MODEL_LEN, CLOUD_CONCURRENCY)
+            can_reuse = bool(fit) and fit["max_model_len"] >= self.gpu_plan["max_model_len"]
+        elif active_id and current_tier:
             if current_tier == target_tier: can_reuse = True
             elif current_tier == "tier_ultra" and target_tier == "tier_standard": can_reuse = True
             
         if can_reuse:
             if self.restart_server(target_model):
-                if self.wait_for_boot(target_model, is_swap=True):
+                if self.wait_for_boot(target_model, is_swap=True, quiet=quiet):
                     return True
                 else:
                     print("[PHOENIX] ⚠️ In-Pod Swap failed (Container likely reset). Retrying with fresh pod...")
@@ -232,20 +289,24 @@ class RunPodDriver:
         # --- PHASE 2: Terminate Old Pod ---
         if active_id:
             print(f"[PHOENIX] ☠️ Terminating old pod {active_id}...")
-            self._run_cmd(["runpodctl", "remove", "pod", active_id])
+            with vox_trace.span("cloud.terminate", "cloud", pod=active_id):
+                self._run_cmd(["runpodctl", "remove", "pod", active_id])
             time.sleep(2)
 
         # --- PHASE 3: Automatic Priority List ---
-        # 3.1 Tier Selection
+        # 3.1 Tier Selection (skipped when the planner ranked the catalog)
         selected_tier = None
+        planned_vram = {g["name"]: g["vram"] for g in self.gpu_plan["ranked"]} if self.gpu_plan else {}
         
         # A. Check Specific Model ID (High Priority)
-        if target_model in MODEL_SPECIFIC_TIERS:
+        if self.gpu_plan:
+            print("[PHOENIX] 📐 Using the planner's ranking (cheapest fitting GPU first).")
+        elif target_model in MODEL_SPECIFIC_TIERS:
             selected_tier = MODEL_SPECIFIC_TIERS[target_model]
             print(f"[PHOENIX] 🎯 Exact Match: '{target_model}' -> {selected_tier}")
             
         # B. Check Keywords (Fallback)
-        if not selected_tier:
+        if not selected_tier and not self.gpu_plan:
             for keywords, tier_name in KEYWORD_TIERS:
                 for kw in keywords:
                     if kw == "*" or kw.lower() in target_model.lower():
@@ -255,7 +316,7 @@ class RunPodDriver:
                 if selected_tier: break
         
         # 3.2 Resolve GPU List
-        priority_list = GPU_TIERS.get(selected_tier, [])
+        priority_list = list(planned_vram) if self.gpu_plan else GPU_TIERS.get(selected_tier, [])
             
         # Hardcoded fallback just in case config is weird
         if not priority_list:
@@ -264,14 +325,20 @@ class RunPodDriver:
         
         print(f"[PHOENIX] 🕵️ Checking Priority List: {priority_list}")
         for gpu in priority_list:
-            new_id = self.create_pod_on_gpu(gpu, target_model)
+            if self.cancel_requested:
+                print("[PHOENIX] 🛑 Boot cancelled.")
+                return False
+            new_id = self.create_pod_on_gpu(gpu, target_model, planned_vram.get(gpu))
             if new_id:
                 self.new_pod_id = new_id
                 print(f"[PHOENIX] ✅ Successfully secured {gpu}.")
-                return self.wait_for_boot(target_model)
+                return self.wait_for_boot(target_model, quiet=quiet)
             # print(f"[PHOENIX] ⚠️ {gpu} unavailable...")
 
         # --- PHASE 4: Manual Selection from Available 48GB+ ---
+        if not interactive:
+            print("[PHOENIX] ❌ Priority GPUs unavailable. Skipping manual selection (background boot).")
+            return False
         print("\n[PHOENIX] ⚠️ Priority GPUs unavailable. Scanning cloud for options...")
         all_gpus = self.get_available_gpus()
         
@@ -294,11 +361,12 @@ class RunPodDriver:
             choice_idx = int(input("\nSelect GPU # (0 to cancel): ")) - 1
             if choice_idx < 0: return False
             selected_gpu_name = candidates[choice_idx]['name']
+            selected_vram = candidates[choice_idx]['vram']
             
             # --- PHASE 5: Retry Loop (3x) ---
             print(f"[PHOENIX] 🎯 Targeting: {selected_gpu_name}. Attempting to rent (Max 3 retries)...")
             for attempt in range(3):
-                new_id = self.create_pod_on_gpu(selected_gpu_name, target_model)
+                new_id = self.create_pod_on_gpu(selected_gpu_name, target_model, selected_vram)
                 if new_id:
                     self.new_pod_id = new_id
                     print(f"[PHOENIX] ✅ Successfully secured {selected_gpu_name}.")
@@ -312,7 +380,8 @@ class RunPodDriver:
             
         except: return False
 
-    def wait_for_boot(self, target_model, is_swap=False):
+    @vox_trace.traced("cloud.boot", "cloud")
+    def wait_for_boot(self, target_model, is_swap=False, quiet=False):
         """Monitors boot status and verifies the pod actually exists."""
         print(f"[PHOENIX] ⏳ Waiting for Engine...")
         
@@ -321,8 +390,13 @@ class RunPodDriver:
         
         # Wait up to 10 mins (600s) because large models take time to download/load
         for i in range(100): 
+            if self.cancel_requested:
+                print("\n[PHOENIX] 🛑 Boot cancelled.")
+                return False
+
             # 1. Verify Pod Exists
-            pod_list = self._run_cmd(["runpodctl", "get", "pod"])
+            with vox_trace.span("cloud.pod_status", "cloud"):
+                pod_list = self._run_cmd(["runpodctl", "get", "pod"])
             if self.new_pod_id not in pod_list:
                 print(f"\n[PHOENIX] ❌ CRITICAL: Pod {self.new_pod_id} disappeared from server!")
                 print("[PHOENIX] This usually means it crashed on boot (Driver/Backend mismatch).")
@@ -331,7 +405,9 @@ class RunPodDriver:
             # 2. Check HTTP Endpoint AND Model ID
             try:
                 url = f"https://{self.new_pod_id}-8000.proxy.runpod.net/v1/models"
-                resp = requests.get(url, timeout=3)
+                with vox_trace.span("cloud.health", "cloud") as s:
+                    resp = requests.get(url, timeout=3)
+                    s.set(status=resp.status_code)
                 if resp.status_code == 200:
                     data = resp.json()
                     # Check if the LOADED model matches the TARGET model
@@ -352,10 +428,10 @@ class RunPodDriver:
                 pass
 
             # 3. Stream Logs
-            self.stream_container_logs(self.new_pod_id)
-
-            sys.stdout.write(f"\r[PHOENIX] ⏳ Booting... ({i*6}s)")
-            sys.stdout.flush()
+            if not quiet:
+                self.stream_container_logs(self.new_pod_id)
+                sys.stdout.write(f"\r[PHOENIX] ⏳ Booting... ({i*6}s)")
+                sys.stdout.flush()
             time.sleep(6)
             
         print("\n[PHOENIX] ❌ Boot Timed Out.")
@@ -383,7 +459,8 @@ class RunPodDriver:
         pod_id = self.new_pod_id if self.new_pod_id else self.pod_id
         if pod_id:
             print(f"\n[PHOENIX] ☠️ Terminating pod {pod_id}...")
-            self._run_cmd(["runpodctl", "remove", "pod", pod_id])
+            with vox_trace.span("cloud.terminate", "cloud", pod=pod_id):
+                self._run_cmd(["runpodctl", "remove", "pod", pod_id])
             self.new_pod_id = None
             self.pod_id = None
             print(f"[PHOENIX] ✅ Pod terminated successfully.")
@@ -0,0 +1,176 @@
+import os
+
+import numpy as np
+from llama_cpp.llama_speculative import LlamaDraftModel, LlamaPromptLookupDecoding
+
+# ==========================================
+# SPECULATIVE DECODING
+# ==========================================
+# Local decode is memory-bandwidth bound: every token streams the full weights once.
+# A draft proposes K tokens, llama.cpp verifies them in a single batched eval of the main
+# model, and every accepted token is a weight pass saved. K grows while drafts keep landing
+# and shrinks when they miss, so a bad draft costs little.
+#
+# Spec strings (VoxAPI(draft_model=...), SPECULATIVE_DRAFT in config.py):
+#   "lookup"            prompt-lookup (n-gram) drafting, no extra model
+#   "<file>.gguf"       a small GGUF of the same family (same tokenizer), e.g. qwen_0.5b_chat.gguf
+
+DEFAULT_K = 4
+MIN_K = 1
+MAX_K = 12
+LOOKUP_SPEC = "lookup"
+
+
+class AdaptiveDraft(LlamaDraftModel):
+    """
+    Base draft model with acceptance tracking and adaptive K.
+
+    llama.cpp calls the draft with the token history after each verify step. Whatever was
+    appended since the previous call is the accepted prefix of our last proposal plus one
+    token sampled by the main model, which is how acceptance is measured.
+    """
+
+    def __init__(self, k=DEFAULT_K, min_k=MIN_K, max_k=MAX_K):
+        self.k = k
+        self.min_k = min_k
+        self.max_k = max_k
+        self._last_ids = None
+        self._last_proposal = None
+        self.reset_stats()
+
+    def reset_stats(self):
+        self.steps = 0      # Verify steps that had a proposal
+        self.proposed = 0
+        self.accepted = 0
+
+    def stats(self):
+        return {
+            "draft": type(self).__name__,
+            "k": self.k,
+            "steps": self.steps,
+            "proposed": self.proposed,
+            "accepted": self.accepted,
+            "acceptance_rate": round(self.accepted / self.proposed, 3) if self.proposed else None,
+            # Tokens produced per main-model pass: accepted drafts + the verified token
+            "tokens_per_step": round((self.accepted + self.steps) / self.steps, 2) if self.steps else None,
+        }
+
+    def _observe(self, input_ids):
+        last, proposal = self._last_ids, self._last_proposal
+        self._last_ids, self._last_proposal = input_ids.copy(), None
+        if last is None or proposal is None or len(proposal) == 0:
+            return
+        n = len(last)
+        if not n < len(input_ids) <= n + len(proposal) + 1 or not np.array_equal(input_ids[:n], last):
+            return # New prompt, not a verify step
+
+        new = input_ids[n:]
+        accepted = 0
+        for drafted, actual in zip(proposal, new[:-1]):
+            if drafted != actual:
+                break
+            accepted += 1
+
+        self.steps += 1
+        self.proposed += len(proposal)
+        self.accepted += accepted
+        if accepted == len(proposal):
+            self.k = min(self.k + 1, self.max_k)
+        elif accepted < len(proposal) / 2:
+            self.k = max(self.k - 1, self.min_k)
+
+    def _propose(self, input_ids, k):
+        raise NotImplementedError()
+
+    def __call__(self, input_ids, /, **kwargs):
+        self._observe(input_ids)
+        proposal = np.asarray(self._propose(input_ids, self.k), dtype=np.intc)[: self.k]
+        self._last_proposal = proposal
+        return proposal
+
+
+class PromptLookupDraft(AdaptiveDraft):
+    """Model-free drafting: copies the continuation of the latest n-gram match in the context."""
+
+    def __init__(self, max_ngram_size=3, **kwargs):
+        super().__init__(**kwargs)
+        self.max_ngram_size = max_ngram_size
+
+    def _propose(self, input_ids, k):
+        return LlamaPromptLookupDecoding.find_candidate_pred_tokens(
+            input_ids=input_ids, max_ngram_size=self.max_ngram_size, num_pred_tokens=k
+        )
+
+
+class GGUFDraftModel(AdaptiveDraft):
+    """Greedy proposals from a small GGUF sharing the main model's tokenizer."""
+
+    def __init__(self, draft_llm, **kwargs):
+        super().__init__(**kwargs)
+        self.llm = draft_llm
+
+    def _propose(self, input_ids, k):
+        out = []
+        # generate() reuses the draft's KV cache for the common prefix, so each call
+        # only evaluates the tokens accepted since the last one
+        gen = self.llm.generate(input_ids.tolist(), top_k=1, temp=0.0, repeat_penalty=1.0)
+        try:
+            for token in gen:
+                if token == self.llm.token_eos():
+                    break
+                out.append(token)
+                if len(out) >= k:
+                    break
+        finally:
+            gen.close()
+        return out
+
+
+def resolve_draft_path(spec, models_dir="./models"):
+    if os.path.isfile(spec):
+        return spec
+    candidate = os.path.join(models_dir, spec)
+    return candidate if os.path.isfile(candidate) else None
+
+
+def make_draft_model(spec, cfg=None, n_ctx=4096, k=DEFAULT_K, verbose=False):
+    """Builds a draft model from a spec string. Returns None when spec is falsy."""
+    if not spec:
+        return None
+    if spec == LOOKUP_SPEC:
+        return PromptLookupDraft(k=k)
+
+    path = resolve_draft_path(spec)
+    if path is None:
+        raise FileNotFoundError(f"Draft model not found: {spec}")
+
+    from llama_cpp import Llama
+    cfg = cfg or {}
+    draft_llm = Llama(
+        model_path=path,
+        n_ctx=n_ctx,
+        n_gpu_layers=cfg.get('n_gpu_layers', 0),
+        n_threads=cfg.get('n_threads'),
+        n_threads_batch=cfg.get('n_threads_batch'),
+        n_batch=cfg.get('n_batch', 512),
+        verbose=verbose
+    )
+    return GGUFDraftModel(draft_llm, k=k)
+
+
+def check_draft_compatible(llm):
+    """
+    A GGUF draft must share the main model's vocabulary, otherwise every proposal is noise.
+    Falls back to prompt lookup (llm was built with logits_all, so any draft works).
+    """
+    draft = getattr(llm, "draft_model", None)
+    if isinstance(draft, GGUFDraftModel) and draft.llm.n_vocab() != llm.n_vocab():
+        print(f"[SPEC] ⚠️ Draft vocab ({draft.llm.n_vocab()}) != main vocab ({llm.n_vocab()}). Using prompt lookup instead.")
+        llm.draft_model = PromptLookupDraft(k=draft.k)
+    return llm.draft_model
+
+
+def draft_stats(llm):
+    """Acceptance stats for an engine's draft model, or None without speculation."""
+    draft = getattr(llm, "draft_model", None)
+    return draft.stats() if isinstance(draft, AdaptiveDraft) else None
@@ -2,6 +2,7 @@ import sys
 import time
 import requests
 import json
+import traffic_recorder
 from config import *
 
 # ==========================================
@@ -84,7 +85,10 @@ def chat_loop():
 
     # Initialize History
     messages = []
+    turn = None
     print_system("Listening for input...\n")
+    if traffic_recorder.enabled:
+        print_system(f"Recording turns to {traffic_recorder.path}")
 
     while True:
         try:
@@ -114,12 +118,15 @@ def chat_loop():
             start_time = time.time()
             token_count = 0
             collected_message = ""
+            turn = traffic_recorder.start("standalone_chat", messages, max_tokens=payload["max_tokens"],
+                                          temperature=payload["temperature"])
             
             # STREAMING REQUEST
             response = requests.post(f"{RUNPOD_BASE_URL}/chat/completions", headers=headers, json=payload, stream=True)
 
             if response.status_code != 200:
                 print(f"\n[ERROR] Server returned {response.status_code}: {response.text}")
+                turn.finish(backend="endpoint", model=DEFAULT_REMOTE_MODEL, error=f"HTTP {response.status_code}")
                 continue
 
             for line in response.iter_lines():
@@ -139,12 +146,14 @@ def chat_loop():
                                         print(content, end="", flush=True)
                                         collected_message += content
                                         token_count += 1
+                                        turn.token()
                         except:
                             pass
 
             # Print Stats at the end
             total_time = time.time() - start_time
             print_speed(token_count, total_time)
+            turn.finish(backend="endpoint", model=DEFAULT_REMOTE_MODEL)
 
             # Save Assistant Reply to History
             if collected_message:
@@ -155,6 +164,8 @@ def chat_loop():
             break
         except Exception as e:
             print(f"\n[ERROR] {e}")
+            if turn is not None:
+                turn.finish(backend="endpoint", model=DEFAULT_REMOTE_MODEL, error=e) # No-op if already finished
 
 if __name__ == "__main__":
     chat_loop()
\ No newline at end of file
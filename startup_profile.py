@@ -0,0 +1,113 @@
+import sys
+import time
+import importlib.abc
+from contextlib import contextmanager
+
+import vox_trace
+
+# ==========================================
+# STARTUP PROFILER (--profile-startup)
+# ==========================================
+# Times boot stages and every module import until the first prompt, so slow launches can be
+# pinned on a specific import or step. Disabled by default: stage() and mark() then cost one
+# attribute check. Stages are also vox_trace spans (category "startup") when tracing is on.
+
+enabled = False
+_t0 = time.perf_counter()
+_stages = []   # (name, start_s, duration_s) relative to process start
+_marks = []    # (name, at_s)
+_imports = {}  # module -> [inclusive_s, self_s]
+_reported = 0  # Stages already printed by report()
+
+
+class _TimedLoader(importlib.abc.Loader):
+    """Wraps a module's loader and times exec_module (inclusive of nested imports)."""
+
+    _stack = []
+
+    def __init__(self, loader):
+        self._loader = loader
+
+    def __getattr__(self, name):
+        return getattr(self._loader, name)
+
+    def create_module(self, spec):
+        return self._loader.create_module(spec)
+
+    def exec_module(self, module):
+        name = module.__name__
+        start = time.perf_counter()
+        _TimedLoader._stack.append(0.0)
+        try:
+            self._loader.exec_module(module)
+        finally:
+            elapsed = time.perf_counter() - start
+            children = _TimedLoader._stack.pop()
+            if _TimedLoader._stack:
+                _TimedLoader._stack[-1] += elapsed
+            _imports[name] = [elapsed, elapsed - children]
+
+
+class _ImportTimer(importlib.abc.MetaPathFinder):
+    def find_spec(self, fullname, path, target=None):
+        for finder in sys.meta_path:
+            if finder is self or not hasattr(finder, "find_spec"):
+                continue
+            spec = finder.find_spec(fullname, path, target)
+            if spec is not None:
+                if spec.loader is not None and hasattr(spec.loader, "exec_module"):
+                    spec.loader = _TimedLoader(spec.loader)
+                return spec
+        return None
+
+
+def enable():
+    """Starts timing imports and stages (call as early as possible)."""
+    global enabled
+    if not enabled:
+        enabled = True
+        sys.meta_path.insert(0, _ImportTimer())
+
+
+def now():
+    return time.perf_counter() - _t0
+
+
+@contextmanager
+def stage(name):
+    with vox_trace.span(name, "startup"):
+        if not enabled:
+            yield
+            return
+        start = now()
+        try:
+            yield
+        finally:
+            _stages.append((name, start, now() - start))
+
+
+def mark(name):
+    """Records a point in time (e.g. 'first prompt')."""
+    if enabled:
+        _marks.append((name, now()))
+
+
+def report(title="Startup profile", top=15):
+    """Prints stages recorded since the last report, marks, and the slowest imports so far."""
+    global _reported
+    if not enabled:
+        return
+    print(f"\n[PROFILE] --- {title} ---")
+    for name, start, duration in _stages[_reported:]:
+        print(f"[PROFILE] {name:<32} {duration * 1000:8.1f} ms  (at {start:6.2f}s)")
+    _reported = len(_stages)
+    for name, at in _marks:
+        print(f"[PROFILE] ⏱️ {name}: {at:.2f}s after launch")
+    _marks.clear()
+    if _imports:
+        total_self = sum(v[1] for v in _imports.values())
+        print(f"[PROFILE] {len(_imports)} modules imported, {total_self * 1000:.0f} ms total. Slowest (inclusive / self):")
+        for name, (incl, own) in sorted(_imports.items(), key=lambda kv: kv[1][0], reverse=True)[:top]:
+            print(f"[PROFILE]   {name:<40} {incl * 1000:8.1f} ms / {own * 1000:7.1f} ms")
+        _imports.clear()
+    print()
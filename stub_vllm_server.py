@@ -0,0 +1,252 @@
+import time
+import uuid
+import random
+import asyncio
+import argparse
+
+from async_http import serve, send_json, SSEWriter, HTTPError, watch_disconnect
+
+# ==========================================
+# STUB vLLM SERVER
+# ==========================================
+# A stand-in for the vLLM OpenAI server with no model and no GPU, so the RunPod manager,
+# vox clients and loadgen.py can be exercised deterministically on a laptop. Requests take
+# the time a real engine would: prompt tokens / --prefill-tps, then one token every
+# 1 / --decode-tps seconds (slowed by --batch-slowdown per extra running sequence). At most
+# --max-num-seqs run at once and the rest queue, as in vLLM. Failures are injected from a
+# seeded RNG: HTTP 500s, mid-stream stalls and dropped connections.
+#
+#   python stub_vllm_server.py --port 8001 --decode-tps 30 --error-rate 0.02 --stall-rate 0.01
+#
+# Port 8001 is where runpod_backend/manager.py forwards, so the manager can run in front of it.
+
+DEFAULT_HOST = "127.0.0.1"
+DEFAULT_PORT = 8001
+CHARS_PER_TOKEN = 4 # Prompt length estimate (no tokenizer)
+
+_WORDS = ("the", "engine", "streams", "tokens", "from", "a", "stub", "server", "at", "a",
+          "fixed", "rate", "so", "latency", "numbers", "are", "repeatable", "across", "runs", "and", "machines")
+
+
+class StubVLLM:
+    """Simulated engine; handle() is the async_http handler."""
+
+    def __init__(self, model="stub-model", prefill_tps=2000.0, decode_tps=40.0, output_tokens=128,
+                 max_num_seqs=16, batch_slowdown=0.0, load_s=0.0, error_rate=0.0, stall_rate=0.0,
+                 stall_s=30.0, drop_rate=0.0, seed=0, api_key=None):
+        self.model = model
+        self.prefill_tps = prefill_tps
+        self.decode_tps = decode_tps
+        self.output_tokens = output_tokens
+        self.max_num_seqs = max_num_seqs
+        self.batch_slowdown = batch_slowdown
+        self.load_s = load_s
+        self.error_rate = error_rate
+        self.stall_rate = stall_rate
+        self.stall_s = stall_s
+        self.drop_rate = drop_rate
+        self.api_key = api_key
+        self.rng = random.Random(seed)
+        self.started = time.time()
+        self.ready_at = 0.0
+        self.running = 0
+        self.waiting = 0
+        self.counts = {"requests": 0, "completed": 0, "errors": 0, "stalls": 0, "drops": 0, "cancelled": 0}
+        self._slots = None
+
+    # --- ROUTING ---
+    async def handle(self, request, reader, writer):
+        if self.api_key and request.path != "/health":
+            if request.headers.get("authorization", "") != f"Bearer {self.api_key}":
+                raise HTTPError(401, "Invalid API key")
+
+        route = (request.method, request.path)
+        if route == ("GET", "/health"):
+            await send_json(writer, 200, {"status": "ok" if self.ready else "loading", "model": self.model})
+        elif route in (("GET", "/v1/models"), ("GET", "/models")):
+            if not self.ready:
+                raise HTTPError(503, "Model is loading")
+            await send_json(writer, 200, {
+                "object": "list",
+                "data": [{"id": self.model, "object": "model", "created": int(self.started), "owned_by": "vllm"}],
+            })
+        elif route in (("POST", "/v1/chat/completions"), ("POST", "/chat/completions")):
+            await self.chat_completions(request, reader, writer)
+        elif route == ("POST", "/manager/load_model"):
+            await self.load_model(request, writer)
+        elif route == ("GET", "/stub/stats"):
+            await send_json(writer, 200, {"running": self.running, "waiting": self.waiting, **self.counts})
+        else:
+            raise HTTPError(404, f"No route for {request.path}")
+
+    @property
+    def ready(self):
+        return time.time() >= self.ready_at
+
+    async def load_model(self, request, writer):
+        """Mirrors the manager's hot swap: the new model answers after --load-s seconds."""
+        model_id = request.json().get("model_id")
+        if not model_id:
+            await send_json(writer, 200, {"error": "No model_id provided"})
+            return
+        if model_id == self.model:
+            await send_json(writer, 200, {"status": "Model already loaded", "model": self.model})
+            return
+        self.model = model_id
+        self.ready_at = time.time() + self.load_s
+        await send_json(writer, 200, {"status": "Switched", "model": model_id, "message": "Model is loading..."})
+
+    # --- SIMULATION ---
+    def _pick_fault(self):
+        roll = self.rng.random()
+        for fault, rate in (("error", self.error_rate), ("stall", self.stall_rate), ("drop", self.drop_rate)):
+            if roll < rate:
+                return fault
+            roll -= rate
+        return None
+
+    def _token_interval(self):
+        return (1 + self.batch_slowdown * max(0, self.running - 1)) / self.decode_tps
+
+    @staticmethod
+    def count_prompt_tokens(messages):
+        return max(1, sum(len(str(m.get("content", ""))) for m in messages) // CHARS_PER_TOKEN)
+
+    async def chat_completions(self, request, reader, writer):
+        body = request.json()
+        messages = body.get("messages")
+        if not isinstance(messages, list) or not messages:
+            raise HTTPError(400, "'messages' must be a non-empty list")
+        if not self.ready:
+            raise HTTPError(503, "Model is loading")
+
+        self.counts["requests"] += 1
+        fault = self._pick_fault()
+        if fault == "error":
+            self.counts["errors"] += 1
+            raise HTTPError(500, "Injected failure")
+
+        prompt_tokens = self.count_prompt_tokens(messages)
+        n_tokens = min(int(body.get("max_tokens") or self.output_tokens), self.output_tokens)
+        cancel = asyncio.Event()
+        watcher = asyncio.create_task(watch_disconnect(reader, cancel.set))
+
+        if self._slots is None:
+            self._slots = asyncio.Semaphore(self.max_num_seqs)
+        self.waiting += 1
+        admitted = False
+        try:
+            async with self._slots:
+                self.waiting -= 1
+                admitted = True
+                self.running += 1
+                try:
+                    await asyncio.sleep(prompt_tokens / self.prefill_tps)
+                    if body.get("stream"):
+                        include_usage = bool((body.get("stream_options") or {}).get("include_usage"))
+                        await self._stream(writer, n_tokens, prompt_tokens, fault, cancel, include_usage)
+                    else:
+                        await self._full(writer, n_tokens, prompt_tokens, fault, cancel)
+                finally:
+                    self.running -= 1
+        finally:
+            if not admitted: # Cancelled while queued
+                self.waiting -= 1
+            watcher.cancel()
+
+    async def _fault_midway(self, fault, writer):
+        """Stalls or drops the connection; returns True if the reply must end here."""
+        if fault == "stall":
+            self.counts["stalls"] += 1
+            await asyncio.sleep(self.stall_s)
+            return False
+        if fault == "drop":
+            self.counts["drops"] += 1
+            writer.transport.abort()
+            return True
+        return False
+
+    async def _stream(self, writer, n_tokens, prompt_tokens, fault, cancel, include_usage):
+        completion_id = f"chatcmpl-{uuid.uuid4().hex}"
+        created = int(time.time())
+
+        def chunk(delta, finish_reason=None):
+            return {"id": completion_id, "object": "chat.completion.chunk", "created": created, "model": self.model,
+                    "choices": [{"index": 0, "delta": delta, "finish_reason": finish_reason}]}
+
+        sse = SSEWriter(writer)
+        await sse.start()
+        await sse.send(chunk({"role": "assistant", "content": ""}))
+        for i in range(n_tokens):
+            if i == n_tokens // 2 and fault and await self._fault_midway(fault, writer):
+                return
+            await asyncio.sleep(self._token_interval())
+            if cancel.is_set():
+                self.counts["cancelled"] += 1
+                return
+            await sse.send(chunk({"content": _WORDS[i % len(_WORDS)] + " "}))
+        await sse.send(chunk({}, "length" if n_tokens == self.output_tokens else "stop"))
+        if include_usage:
+            await sse.send({"id": completion_id, "object": "chat.completion.chunk", "created": created,
+                            "model": self.model, "choices": [],
+                            "usage": {"prompt_tokens": prompt_tokens, "completion_tokens": n_tokens,
+                                      "total_tokens": prompt_tokens + n_tokens}})
+        await sse.finish()
+        self.counts["completed"] += 1
+
+    async def _full(self, writer, n_tokens, prompt_tokens, fault, cancel):
+        for i in range(n_tokens):
+            if i == n_tokens // 2 and fault and await self._fault_midway(fault, writer):
+                return
+            await asyncio.sleep(self._token_interval())
+            if cancel.is_set():
+                self.counts["cancelled"] += 1
+                return
+        text = "".join(_WORDS[i % len(_WORDS)] + " " for i in range(n_tokens))
+        await send_json(writer, 200, {
+            "id": f"chatcmpl-{uuid.uuid4().hex}",
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": self.model,
+            "choices": [{"index": 0, "message": {"role": "assistant", "content": text}, "finish_reason": "stop"}],
+            "usage": {"prompt_tokens": prompt_tokens, "completion_tokens": n_tokens,
+                      "total_tokens": prompt_tokens + n_tokens},
+        })
+        self.counts["completed"] += 1
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Stub vLLM OpenAI server with simulated timing and failure injection")
+    parser.add_argument("--host", default=DEFAULT_HOST)
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT)
+    parser.add_argument("--model", default="stub-model", help="Model ID reported by /v1/models")
+    parser.add_argument("--prefill-tps", type=float, default=2000.0, help="Prompt tokens per second")
+    parser.add_argument("--decode-tps", type=float, default=40.0, help="Generated tokens per second per sequence")
+    parser.add_argument("--output-tokens", type=int, default=128, help="Reply length (capped by max_tokens)")
+    parser.add_argument("--max-num-seqs", type=int, default=16, help="Sequences decoded at once; the rest queue")
+    parser.add_argument("--batch-slowdown", type=float, default=0.0,
+                        help="Per-token slowdown per extra running sequence (0.05 = 5%%)")
+    parser.add_argument("--load-s", type=float, default=0.0, help="Time /manager/load_model takes to come up")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Share of requests answered with HTTP 500")
+    parser.add_argument("--stall-rate", type=float, default=0.0, help="Share of replies that pause halfway")
+    parser.add_argument("--stall-s", type=float, default=30.0)
+    parser.add_argument("--drop-rate", type=float, default=0.0, help="Share of replies whose connection is cut halfway")
+    parser.add_argument("--seed", type=int, default=0, help="Seed for failure injection")
+    parser.add_argument("--api-key", default=None)
+    args = parser.parse_args(argv)
+
+    stub = StubVLLM(model=args.model, prefill_tps=args.prefill_tps, decode_tps=args.decode_tps,
+                    output_tokens=args.output_tokens, max_num_seqs=args.max_num_seqs,
+                    batch_slowdown=args.batch_slowdown, load_s=args.load_s, error_rate=args.error_rate,
+                    stall_rate=args.stall_rate, stall_s=args.stall_s, drop_rate=args.drop_rate,
+                    seed=args.seed, api_key=args.api_key)
+    print(f"[STUB] Serving '{args.model}' on http://{args.host}:{args.port}/v1 "
+          f"(prefill {args.prefill_tps:g} t/s, decode {args.decode_tps:g} t/s, {args.max_num_seqs} seqs)")
+    try:
+        serve(stub.handle, args.host, args.port)
+    except KeyboardInterrupt:
+        print("\n[STUB] Shutting down...")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,60 @@
+import os
+import json
+import time
+import threading
+from collections import deque
+
+# ==========================================
+# TELEMETRY SETTINGS
+# ==========================================
+# Events are kept in memory and appended to a JSONL file (set VOX_TELEMETRY_FILE="" to disable).
+DEFAULT_TELEMETRY_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "logs", "telemetry.jsonl")
+TELEMETRY_FILE = os.environ.get("VOX_TELEMETRY_FILE", DEFAULT_TELEMETRY_FILE)
+MAX_EVENTS = 1000
+
+_lock = threading.Lock()
+_events = deque(maxlen=MAX_EVENTS)
+_listeners = []
+
+
+def record_event(kind, **fields):
+    """
+    Records a telemetry event, e.g. record_event("failover", source="cloud", reason="stalled").
+    Never raises: telemetry must not break a chat turn.
+    """
+    event = {"ts": round(time.time(), 3), "kind": kind}
+    event.update(fields)
+
+    with _lock:
+        _events.append(event)
+        if TELEMETRY_FILE:
+            try:
+                os.makedirs(os.path.dirname(TELEMETRY_FILE), exist_ok=True)
+                with open(TELEMETRY_FILE, "a", encoding="utf-8") as f:
+                    f.write(json.dumps(event) + "\n")
+            except (OSError, TypeError, ValueError):
+                pass
+        listeners = list(_listeners)
+
+    for listener in listeners:
+        try: listener(event)
+        except Exception: pass
+    return event
+
+
+def recent_events(kind=None):
+    """Returns in-memory events, oldest first, optionally filtered by kind."""
+    with _lock:
+        return [e for e in _events if kind is None or e["kind"] == kind]
+
+
+def subscribe(listener):
+    """Calls listener(event) for every future event."""
+    with _lock:
+        _listeners.append(listener)
+
+
+def unsubscribe(listener):
+    with _lock:
+        if listener in _listeners:
+            _listeners.remove(listener)
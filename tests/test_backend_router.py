@@ -0,0 +1,139 @@
+import os
+import sys
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import telemetry
+from backend_router import BackendRouter, EWMA_ALPHA
+
+# Local: slow but free. Cloud: 4x faster decode at $3.60/h ($0.001 per busy second).
+PRIORS = {
+    "local": {"prefill_tps": 100.0, "decode_tps": 10.0, "overhead_s": 0.0, "cost_per_hour": 0.0, "slots": 1},
+    "cloud": {"prefill_tps": 1000.0, "decode_tps": 40.0, "overhead_s": 0.5, "cost_per_hour": 3.6, "slots": 4},
+}
+
+
+@pytest.fixture(autouse=True)
+def no_telemetry_file(monkeypatch):
+    monkeypatch.setattr(telemetry, "TELEMETRY_FILE", "")
+
+
+@pytest.fixture
+def router():
+    return BackendRouter(PRIORS)
+
+
+# --- CHOOSE ---
+def test_fastest_without_ceiling(router):
+    decision = router.choose(prompt_tokens=1000, max_tokens=200)
+    assert decision["backend"] == "cloud" # 1.5 + 5.0s vs 10 + 20s
+    assert decision["reason"].startswith("fastest")
+    times = {e["backend"]: e["time_s"] for e in decision["estimates"]}
+    assert times == {"local": 30.0, "cloud": 6.5}
+
+
+def test_ceiling_excludes_expensive_backend(router):
+    decision = router.choose(prompt_tokens=1000, max_tokens=200, max_cost=0.005)
+    assert decision["backend"] == "local" # Cloud would cost $0.0065
+    assert "under $0.005 ceiling" in decision["reason"]
+
+
+def test_cheapest_when_nothing_fits_the_ceiling(router):
+    router.set_cost("local", 1.0)
+    decision = router.choose(prompt_tokens=1000, max_tokens=200, max_cost=0.0001)
+    assert decision["backend"] == "cloud" # $0.0065 beats local's 30s at $1/h
+    assert decision["reason"].startswith("cheapest")
+
+
+def test_router_ceiling_and_availability():
+    router = BackendRouter(PRIORS, max_cost=0.005)
+    assert router.choose(1000, 200)["backend"] == "local"
+    assert router.choose(1000, 200, max_cost=1.0)["backend"] == "cloud"
+    assert router.choose(1000, 200, available=["local"], max_cost=1.0)["backend"] == "local"
+    with pytest.raises(ValueError):
+        router.choose(1000, 200, available=["gpu-farm"])
+
+
+def test_choice_is_recorded(router):
+    router.choose(1000, 200)
+    event = telemetry.recent_events("route")[-1]
+    assert event["backend"] == "cloud" and event["max_tokens"] == 200
+
+
+# --- OBSERVE ---
+def test_turn_updates_rates_by_ewma(router):
+    # 500 prompt tokens in 1.0s after 0.5s overhead, 101 tokens decoded in the next 4.0s
+    router.observe({"kind": "turn", "backend": "cloud", "prompt_tokens": 500, "ttft_s": 1.0,
+                    "tokens": 101, "duration_s": 5.0})
+    cloud = router.backends["cloud"]
+    assert cloud.prefill_tps == pytest.approx(1000.0) # Matches the prior, so unchanged
+    assert cloud.decode_tps == pytest.approx(40 + EWMA_ALPHA * (25 - 40))
+    assert cloud.latency_s == 5.0 # First sample is taken as is
+    assert cloud.samples == 1
+    assert router.reply_tokens == 101
+    assert router.expected_reply_tokens(512) == 101
+    assert router.expected_reply_tokens(50) == 50
+
+
+def test_failures_raise_failure_rate(router):
+    router.observe({"kind": "failover", "source": "cloud", "reason": "stalled"})
+    assert router.backends["cloud"].failure_rate == pytest.approx(EWMA_ALPHA)
+    router.observe({"kind": "stream_error", "source": "cloud"})
+    assert router.backends["cloud"].failure_rate == pytest.approx(EWMA_ALPHA + EWMA_ALPHA * (1 - EWMA_ALPHA))
+    router.observe({"kind": "turn", "backend": "cloud", "error": "boom"})
+    assert router.backends["cloud"].samples == 0
+
+    before = router.backends["cloud"].failure_rate
+    router.observe({"kind": "turn", "backend": "cloud", "prompt_tokens": 10, "ttft_s": 0.6,
+                    "tokens": 5, "duration_s": 1.0})
+    assert router.backends["cloud"].failure_rate == pytest.approx(before * (1 - EWMA_ALPHA))
+
+
+def test_failover_turn_and_unknown_events_are_ignored(router):
+    before = router.snapshot()
+    router.observe({"kind": "turn", "backend": "cloud+local", "tokens": 50, "duration_s": 3.0})
+    router.observe({"kind": "turn", "backend": "endpoint", "tokens": 50, "duration_s": 3.0})
+    router.observe({"kind": "route", "backend": "cloud"})
+    assert router.snapshot() == before
+    assert router.reply_tokens is None
+
+
+def test_failures_steer_traffic_away(router):
+    for _ in range(5):
+        router.observe({"kind": "failover", "source": "cloud"})
+    assert router.choose(1000, 200)["backend"] == "local"
+
+
+# --- TRACK ---
+def test_track_counts_inflight_and_queue(router):
+    local = router.backends["local"]
+    local.latency_s = 10.0
+    with router.track("local"):
+        assert local.inflight == 1
+        assert local.queue_s() == 10.0 # One slot, one request ahead
+        with router.track("local"):
+            assert local.inflight == 2
+            assert router.estimate("local", 0, 0)["queue_s"] == 20.0
+    assert local.inflight == 0
+    assert local.queue_s() == 0.0
+
+
+def test_track_releases_on_error_and_ignores_unknown(router):
+    with pytest.raises(RuntimeError):
+        with router.track("cloud"):
+            raise RuntimeError("stream died")
+    assert router.backends["cloud"].inflight == 0
+    with router.track("gpu-farm"):
+        pass
+
+
+def test_cloud_slots_absorb_concurrency(router):
+    cloud = router.backends["cloud"]
+    cloud.latency_s = 8.0
+    with router.track("cloud"), router.track("cloud"), router.track("cloud"):
+        assert cloud.queue_s() == 0.0 # 3 in flight, 4 slots
+        with router.track("cloud"):
+            assert cloud.queue_s() == pytest.approx(2.0) # 1 ahead / 4 slots * 8s
@@ -0,0 +1,106 @@
+import os
+import sys
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+np = pytest.importorskip("numpy")
+
+from batch_scheduler import BatchScheduler, apply_penalties, sample_token
+
+EOG = 0
+
+
+class ScriptedEngine:
+    """Fake engine: one character per token (token id = code point); logits pick the next script char."""
+    n_slots = 2
+    ctx_per_slot = 256
+    n_batch = 64
+    n_vocab = 128
+
+    def __init__(self, script, flat=False):
+        self.script = script
+        self.flat = flat # Uniform logits: sampling is left to the rng
+
+    def tokenize(self, text):
+        return [ord(c) for c in text]
+
+    def token_bytes(self, token):
+        return chr(token).encode("utf-8")
+
+    def is_eog(self, token):
+        return token == EOG
+
+    def free(self, seq_id):
+        pass
+
+    def decode(self, entries):
+        out = {}
+        for seq_id, tokens, start_pos, want_logits in entries:
+            if want_logits:
+                logits = np.zeros(self.n_vocab)
+                if not self.flat:
+                    generated = start_pos + len(tokens) - self.prompt_len
+                    nxt = self.script[generated] if generated < len(self.script) else None
+                    logits[ord(nxt) if nxt else EOG] = 50.0
+                out[seq_id] = logits
+        return out
+
+
+def run(engine, prompt="p", **kwargs):
+    engine.prompt_len = len(prompt)
+    scheduler = BatchScheduler(engine)
+    pieces = []
+    try:
+        req = scheduler.submit(engine.tokenize(prompt), temperature=kwargs.pop("temperature", 0),
+                               on_text=pieces.append, **kwargs)
+        req.wait(5)
+    finally:
+        scheduler.close()
+    return req, pieces
+
+
+def test_stop_string_ends_generation_and_is_never_streamed():
+    req, pieces = run(ScriptedEngine("Hello<END>world"), stop=["<END>"])
+    assert req.text == "Hello"
+    assert "".join(pieces) == "Hello"
+    assert req.finish_reason == "stop"
+
+
+def test_unmatched_stop_prefix_is_released_at_the_end():
+    req, pieces = run(ScriptedEngine("a<E"), stop="<END>")
+    assert req.text == "a<E"
+    assert "".join(pieces) == "a<E"
+
+
+def test_same_seed_same_output():
+    first, _ = run(ScriptedEngine("", flat=True), temperature=1.0, top_k=0, top_p=1.0, max_tokens=16, seed=7)
+    second, _ = run(ScriptedEngine("", flat=True), temperature=1.0, top_k=0, top_p=1.0, max_tokens=16, seed=7)
+    assert first.generated == second.generated
+    assert len(first.generated) == 16 or first.finish_reason == "stop"
+
+
+def test_penalties():
+    logits = np.array([2.0, -2.0, 1.0, 3.0])
+    out = apply_penalties(logits, [0, 1, 1], repeat_penalty=2.0)
+    assert out.tolist() == [1.0, -4.0, 1.0, 3.0]
+    out = apply_penalties(logits, [0, 1, 1], presence_penalty=0.5, frequency_penalty=1.0)
+    assert out.tolist() == [0.5, -4.5, 1.0, 3.0]
+    assert apply_penalties(logits, [0, 1]) is logits # Defaults are a no-op
+
+
+def test_repeat_penalty_changes_greedy_choice():
+    # Prompt "aa": 'a' (50) is penalized below 'b' (40) with repeat_penalty 2
+    logits = np.zeros(128)
+    logits[ord("a")], logits[ord("b")] = 50.0, 40.0
+    scores = apply_penalties(logits, [ord("a"), ord("a")], repeat_penalty=2.0)
+    assert sample_token(scores, temperature=0) == ord("b")
+
+
+def test_min_p_drops_unlikely_tokens():
+    logits = np.log(np.array([0.6, 0.35, 0.05]))
+    rng = np.random.default_rng(0)
+    picks = {sample_token(logits, temperature=1.0, top_k=0, top_p=1.0, rng=rng, min_p=0.1) for _ in range(200)}
+    assert picks == {0, 1}
@@ -0,0 +1,106 @@
+import os
+import sys
+import json
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import gpu_planner
+
+FIXTURES = os.path.join(ROOT, "tests", "fixtures", "gpu_planner")
+
+
+def fixture_path(name):
+    return os.path.join(FIXTURES, name)
+
+
+def profile(name):
+    return gpu_planner.model_profile(gpu_planner.load_model_config(fixture_path(name)))
+
+
+@pytest.fixture
+def catalog():
+    with open(fixture_path("gpus.json"), "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+# --- MODEL SIZE ---
+def test_awq_profile_matches_published_size():
+    p = profile("qwen2.5-72b-instruct-awq.json")
+    assert p["params_b"] == pytest.approx(72.7, abs=0.1)
+    assert p["quantization"] == "awq"
+    assert 36 < p["weights_gb"] < 41 # ~41 GB of safetensors on the hub, in GiB
+    assert p["kv_bytes_per_token"] == 2 * 80 * 8 * 128 * 2
+    assert p["max_position"] == 32768
+
+
+def test_moe_profile_counts_all_experts():
+    p = profile("mixtral-8x7b.json")
+    assert p["params_b"] == pytest.approx(46.7, abs=0.1)
+    assert p["active_params_b"] == pytest.approx(12.9, abs=0.1)
+
+
+# --- PLACEMENT ---
+def test_picks_cheapest_card_that_fits(catalog):
+    plan = gpu_planner.plan_placement(profile("qwen2.5-14b-instruct.json"), catalog)
+    assert plan["gpu"] == "NVIDIA A40"
+    assert plan["max_model_len"] == gpu_planner.DEFAULT_MAX_MODEL_LEN
+    assert plan["gpu_memory_utilization"] == gpu_planner.DEFAULT_UTILIZATION
+    prices = [g["price"] for g in plan["ranked"]]
+    assert prices == sorted(prices)
+
+
+def test_rejects_cards_without_the_vram(catalog):
+    p = profile("qwen2.5-72b-instruct-awq.json")
+    assert gpu_planner.plan_for_gpu(p, 48) is None
+    plan = gpu_planner.plan_placement(p, catalog)
+    assert plan["gpu"] == "NVIDIA A100 80GB PCIe"
+    assert all(g["vram"] >= 80 for g in plan["ranked"])
+
+
+def test_nothing_fits(catalog):
+    assert gpu_planner.plan_placement(profile("mixtral-8x7b.json"), catalog) is None
+
+
+def test_shrinks_context_before_giving_up(catalog):
+    plan = gpu_planner.plan_placement(profile("qwen2.5-72b-instruct-awq.json"), catalog,
+                                      max_model_len=32768, concurrency=8)
+    assert gpu_planner.MIN_MODEL_LEN <= plan["max_model_len"] < 32768
+    assert plan["max_model_len"] % gpu_planner.LEN_STEP == 0
+    assert plan["gpu_memory_utilization"] <= gpu_planner.MAX_UTILIZATION
+    assert plan["estimate"]["total_gb"] * (1 + gpu_planner.HEADROOM) <= plan["vram"] * plan["gpu_memory_utilization"]
+
+
+def test_context_capped_by_model_limit():
+    fit = gpu_planner.plan_for_gpu(profile("qwen2.5-14b-instruct.json"), 80, max_model_len=131072, concurrency=1)
+    assert fit["max_model_len"] == 32768
+
+
+# --- VLLM FLAGS ---
+def test_vllm_flags(catalog):
+    plan = gpu_planner.plan_placement(profile("qwen2.5-14b-instruct.json"), catalog)
+    assert gpu_planner.vllm_flags(plan) == "--gpu-memory-utilization 0.90 --max-model-len 8192"
+
+
+def test_driver_flags_follow_the_plan(catalog):
+    pytest.importorskip("requests") # runpod_interface needs it at import time
+    from runpod_interface import RunPodDriver
+
+    model = "Qwen/Qwen2.5-72B-Instruct-AWQ"
+    driver = RunPodDriver(None, None)
+    assert driver._vllm_flags(model, 80) == "--gpu-memory-utilization 0.95 --max-model-len 8192 --quantization awq "
+
+    p = profile("qwen2.5-72b-instruct-awq.json")
+    driver.gpu_plan = dict(gpu_planner.plan_placement(p, catalog), model=model, profile=p)
+    flags = driver._vllm_flags(model, 80)
+    assert flags.startswith("--gpu-memory-utilization 0.90 --max-model-len 8192")
+    assert "--quantization" not in flags # vLLM reads it from config.json
+    assert "0.95" in driver._vllm_flags(model, 48) # Card the plan cannot fit: old defaults
+
+
+def test_cli_with_fixture_catalog(capsys):
+    code = gpu_planner.main([fixture_path("qwen2.5-14b-instruct.json"), "--catalog", fixture_path("gpus.json")])
+    assert code == 0
+    assert "NVIDIA A40" in capsys.readouterr().out
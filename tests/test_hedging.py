@@ -0,0 +1,108 @@
+import os
+import sys
+import time
+import threading
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import hedging
+from hedging import HedgedStream
+
+
+class FakeBackend:
+    """Yields `tokens` after `delay` seconds, stopping as soon as it is cancelled."""
+
+    def __init__(self, name, tokens, delay=0.0, per_token=0.01, error=None, ignores_cancel=False):
+        self.name = name
+        self.tokens = tokens
+        self.delay = delay
+        self.per_token = per_token
+        self.error = error
+        self.ignores_cancel = ignores_cancel
+        self.cancelled = threading.Event()
+        self.emitted = 0
+        self.finished = threading.Event()
+
+    def cancel(self):
+        self.cancelled.set()
+
+    def stream_chat(self, messages, max_tokens=512):
+        try:
+            if self.cancelled.wait(self.delay) and not self.ignores_cancel:
+                return
+            if self.error:
+                raise self.error
+            for token in self.tokens:
+                if self.cancelled.is_set() and not self.ignores_cancel:
+                    return
+                self.emitted += 1
+                yield token
+                time.sleep(self.per_token)
+        finally:
+            self.finished.set()
+
+
+def test_fast_hedge_wins_and_slow_primary_is_cancelled():
+    cloud = FakeBackend("cloud", list("abc"), delay=1.0)
+    local = FakeBackend("local", list("123"))
+    stream = HedgedStream(cloud, local, hedge_delay=0.05)
+    assert "".join(stream.stream_chat([])) == "123"
+    assert stream.winner is local
+    assert cloud.cancelled.is_set() and cloud.emitted == 0
+
+
+def test_primary_within_delay_never_starts_hedge():
+    cloud = FakeBackend("cloud", list("abc"))
+    local = FakeBackend("local", list("123"))
+    stream = HedgedStream(cloud, local, hedge_delay=1.0)
+    assert "".join(stream.stream_chat([])) == "abc"
+    assert stream.winner is cloud
+    assert local.emitted == 0 and not local.finished.is_set()
+
+
+def test_loser_is_cancelled_mid_stream():
+    cloud = FakeBackend("cloud", list("abcdefgh"), delay=0.05, per_token=0.02)
+    local = FakeBackend("local", list("12345678"), per_token=0.02)
+    stream = HedgedStream(cloud, local, hedge_delay=0.0)
+    assert "".join(stream.stream_chat([])) == "12345678"
+    assert cloud.cancelled.is_set()
+    assert cloud.emitted < len(cloud.tokens)
+
+
+def test_failed_primary_launches_hedge_immediately():
+    cloud = FakeBackend("cloud", [], error=RuntimeError("proxy down"))
+    local = FakeBackend("local", list("12"))
+    start = time.time()
+    assert "".join(HedgedStream(cloud, local, hedge_delay=5.0).stream_chat([])) == "12"
+    assert time.time() - start < 1.0
+
+
+def test_both_failing_raises():
+    cloud = FakeBackend("cloud", [], error=RuntimeError("proxy down"))
+    local = FakeBackend("local", [], error=RuntimeError("decode failed"))
+    with pytest.raises(RuntimeError):
+        list(HedgedStream(cloud, local, hedge_delay=0.0).stream_chat([]))
+
+
+def test_closing_the_stream_cancels_and_joins_local():
+    local = FakeBackend("local", list("12345678"), per_token=0.05)
+    cloud = FakeBackend("cloud", list("abc"), delay=1.0)
+    gen = HedgedStream(local, cloud, hedge_delay=1.0).stream_chat([])
+    assert next(gen) == "1"
+    gen.close()
+    assert local.cancelled.is_set()
+    assert local.finished.is_set() # llama context is idle before the next turn
+    assert local.emitted < len(local.tokens)
+
+
+def test_stuck_remote_loser_does_not_block(monkeypatch):
+    monkeypatch.setattr(hedging, "REMOTE_JOIN_TIMEOUT", 0.05)
+    cloud = FakeBackend("cloud", list("abc"), delay=0.02, per_token=1.0, ignores_cancel=True)
+    local = FakeBackend("local", list("12"), per_token=0.0)
+    stream = HedgedStream(local, cloud, hedge_delay=0.0)
+    start = time.time()
+    assert "".join(stream.stream_chat([])) == "12"
+    assert time.time() - start < 0.5
@@ -0,0 +1,114 @@
+import os
+import sys
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from model_cache import ModelResidencyManager
+
+GB = 1024 ** 3
+CFG = {"n_gpu_layers": 0, "cache_type_k": "f16", "cache_type_v": "f16", "n_ctx": 4096}
+
+
+class FakeEngine:
+    def __init__(self, path, cfg, n_ctx):
+        self.path = path
+        self.cfg = cfg
+        self.n_ctx = n_ctx
+        self.closed = False
+
+    def close(self):
+        self.closed = True
+
+
+@pytest.fixture
+def models(tmp_path):
+    """Three model paths with RAM footprints of 4, 6 and 8 GB."""
+    sizes = {"small.gguf": 4 * GB, "medium.gguf": 6 * GB, "large.gguf": 8 * GB}
+    paths = {}
+    for name in sizes:
+        paths[name] = str(tmp_path / name)
+        open(paths[name], "wb").close()
+    footprint = lambda path, cfg: (sizes[os.path.basename(path)], 0)
+    return paths, footprint
+
+
+def make_cache(models, **kwargs):
+    paths, footprint = models
+    loads = []
+
+    def factory(path, cfg, n_ctx):
+        loads.append(os.path.basename(path))
+        return FakeEngine(path, cfg, n_ctx)
+
+    kwargs.setdefault("ram_budget", 100 * GB)
+    cache = ModelResidencyManager(engine_factory=factory, footprint_fn=footprint, verbose=False, **kwargs)
+    return cache, paths, loads
+
+
+def test_factory_called_once_per_resident_model(models):
+    cache, paths, loads = make_cache(models)
+    engine, cached = cache.acquire(paths["small.gguf"], CFG)
+    assert not cached and isinstance(engine, FakeEngine)
+    assert engine.n_ctx == 4096
+    again, cached = cache.acquire(paths["small.gguf"], CFG)
+    assert cached and again is engine
+    assert loads == ["small.gguf"]
+
+
+def test_different_config_is_a_different_engine(models):
+    cache, paths, loads = make_cache(models)
+    cache.acquire(paths["small.gguf"], CFG)
+    cache.acquire(paths["small.gguf"], CFG, n_ctx=8192)
+    assert loads == ["small.gguf", "small.gguf"]
+    assert len(cache) == 2
+
+
+def test_lru_order_decides_eviction(models):
+    cache, paths, loads = make_cache(models, max_models=2)
+    small, _ = cache.acquire(paths["small.gguf"], CFG)
+    medium, _ = cache.acquire(paths["medium.gguf"], CFG)
+    cache.acquire(paths["small.gguf"], CFG) # small is now the most recent
+    cache.acquire(paths["large.gguf"], CFG)
+    assert cache.resident_models() == ["small.gguf", "large.gguf"]
+    assert medium.closed and not small.closed
+
+
+def test_ram_budget_evicts_until_it_fits(models):
+    cache, paths, loads = make_cache(models, max_models=5, ram_budget=12 * GB)
+    cache.acquire(paths["small.gguf"], CFG)
+    cache.acquire(paths["medium.gguf"], CFG)
+    assert cache.used() == (10 * GB, 0)
+    cache.acquire(paths["large.gguf"], CFG) # 8 GB: both older engines must go
+    assert cache.resident_models() == ["large.gguf"]
+    assert cache.used() == (8 * GB, 0)
+
+
+def test_oversized_model_still_loads(models):
+    cache, paths, loads = make_cache(models, ram_budget=2 * GB)
+    engine, cached = cache.acquire(paths["large.gguf"], CFG)
+    assert engine is not None and not cached
+    assert cache.resident_models() == ["large.gguf"]
+
+
+def test_resident_config(models):
+    cache, paths, loads = make_cache(models)
+    assert cache.resident_config(paths["small.gguf"]) is None
+    cfg = dict(CFG, n_threads=6)
+    cache.acquire(paths["small.gguf"], cfg)
+    resident = cache.resident_config(paths["small.gguf"])
+    assert resident == cfg and resident is not cfg # A copy: later edits to cfg do not leak in
+    cache.evict(paths["small.gguf"])
+    assert cache.resident_config(paths["small.gguf"]) is None
+    assert paths["small.gguf"] not in cache
+
+
+def test_make_room_frees_one_slot(models):
+    cache, paths, loads = make_cache(models, max_models=2)
+    cache.acquire(paths["small.gguf"], CFG)
+    cache.acquire(paths["medium.gguf"], CFG)
+    assert cache.make_room() == 4 * GB
+    assert cache.resident_models() == ["medium.gguf"]
+    assert cache.make_room() == 0
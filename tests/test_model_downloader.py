@@ -0,0 +1,162 @@
+import os
+import sys
+import json
+import hashlib
+import threading
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import model_downloader
+from model_downloader import DownloadError, download, probe
+
+DATA = os.urandom(250_000)
+SHA = hashlib.sha256(DATA).hexdigest()
+CHUNK = 64_000 # 4 chunks, the last one short
+
+
+class FakeHub(BaseHTTPRequestHandler):
+    """
+    /repo/resolve/main/<name>: Hugging Face-style 302 to /cdn/<name> with X-Linked-ETag/Size.
+    /cdn/<name>: the bytes, with Range support and an unrelated CDN ETag.
+    /plain/<name>: no Range support.
+    The server's `fail` set holds range starts whose next request is cut short.
+    """
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, *args):
+        pass
+
+    def do_GET(self):
+        srv = self.server
+        if self.path.startswith("/repo/resolve/"):
+            name = self.path.rsplit("/", 1)[-1]
+            self.send_response(302)
+            self.send_header("Location", f"/cdn/{name}?expires=1")
+            self.send_header("X-Linked-ETag", f'"{srv.linked_sha}"')
+            self.send_header("X-Linked-Size", str(len(DATA)))
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return
+
+        rng = self.headers.get("Range")
+        if self.path.startswith("/cdn/") and rng:
+            start, end = (int(v) for v in rng.split("=")[1].split("-"))
+            body = DATA[start:end + 1]
+            with srv.lock:
+                srv.ranges.append(start)
+                cut = start in srv.fail and end > start
+                srv.fail.discard(start)
+            self.send_response(206)
+            self.send_header("Content-Range", f"bytes {start}-{start + len(body) - 1}/{len(DATA)}")
+        else:
+            body, cut = DATA, False
+            self.send_response(200)
+        self.send_header("ETag", '"cdn-object-etag"')
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        if cut:
+            self.wfile.write(body[:len(body) // 2])
+            self.close_connection = True
+            return
+        self.wfile.write(body)
+
+
+@pytest.fixture
+def hub():
+    srv = ThreadingHTTPServer(("127.0.0.1", 0), FakeHub)
+    srv.linked_sha, srv.ranges, srv.fail, srv.lock = SHA, [], set(), threading.Lock()
+    threading.Thread(target=srv.serve_forever, args=(0.05,), daemon=True).start()
+    srv.base = f"http://127.0.0.1:{srv.server_address[1]}"
+    yield srv
+    srv.shutdown()
+    srv.server_close()
+
+
+@pytest.fixture(autouse=True)
+def no_backoff(monkeypatch):
+    monkeypatch.setattr(model_downloader.time, "sleep", lambda s: None)
+
+
+def chunk_starts():
+    return list(range(0, len(DATA), CHUNK))
+
+
+def test_probe_follows_redirect_and_keeps_linked_etag(hub):
+    info = probe(hub.base + "/repo/resolve/main/m.gguf")
+    assert info["url"] == hub.base + "/cdn/m.gguf?expires=1"
+    assert info["size"] == len(DATA)
+    assert info["ranges"] is True
+    assert info["sha256"] == SHA # From the hub's X-Linked-ETag, not the CDN's ETag
+
+
+def test_download_verifies_against_linked_etag(hub, tmp_path):
+    dest = str(tmp_path / "m.gguf")
+    result = download(hub.base + "/repo/resolve/main/m.gguf", dest, chunk_bytes=CHUNK, connections=2)
+    assert result["verified"] and result["sha256"] == SHA
+    with open(dest, "rb") as f:
+        assert f.read() == DATA
+    assert not os.path.exists(dest + ".part") and not os.path.exists(dest + ".part.json")
+    assert sorted(hub.ranges) == [0] + chunk_starts() # Probe plus one request per chunk
+
+
+def test_failed_chunk_is_retried(hub, tmp_path):
+    hub.fail.add(CHUNK)
+    result = download(hub.base + "/repo/resolve/main/m.gguf", str(tmp_path / "m.gguf"),
+                      chunk_bytes=CHUNK, connections=1, retries=2)
+    assert result["sha256"] == SHA
+    assert hub.ranges.count(CHUNK) == 2
+
+
+def test_resume_from_manifest(hub, tmp_path):
+    dest = str(tmp_path / "m.gguf")
+    url = hub.base + "/repo/resolve/main/m.gguf"
+    hub.fail.add(2 * CHUNK)
+    with pytest.raises(DownloadError):
+        download(url, dest, chunk_bytes=CHUNK, connections=1, retries=0)
+    with open(dest + ".part.json", "r", encoding="utf-8") as f:
+        manifest = json.load(f)
+    assert manifest["done"] == [0, 1] and manifest["url"] == url
+
+    hub.ranges.clear()
+    result = download(url, dest, chunk_bytes=CHUNK, connections=1)
+    assert result["resumed_bytes"] == 2 * CHUNK
+    assert result["sha256"] == SHA
+    assert sorted(hub.ranges) == [0, 2 * CHUNK, 3 * CHUNK] # Probe plus the two missing chunks
+
+
+def test_changed_chunk_size_starts_over(hub, tmp_path):
+    dest = str(tmp_path / "m.gguf")
+    url = hub.base + "/repo/resolve/main/m.gguf"
+    hub.fail.add(CHUNK)
+    with pytest.raises(DownloadError):
+        download(url, dest, chunk_bytes=CHUNK, connections=1, retries=0)
+    result = download(url, dest, chunk_bytes=CHUNK * 2, connections=1)
+    assert result["resumed_bytes"] == 0 and result["sha256"] == SHA
+
+
+def test_sha_mismatch_is_rejected_and_cleaned_up(hub, tmp_path):
+    hub.linked_sha = "0" * 64
+    dest = str(tmp_path / "m.gguf")
+    with pytest.raises(DownloadError, match="SHA-256 mismatch"):
+        download(hub.base + "/repo/resolve/main/m.gguf", dest, chunk_bytes=CHUNK)
+    assert not os.path.exists(dest)
+    assert not os.path.exists(dest + ".part") and not os.path.exists(dest + ".part.json")
+
+
+def test_explicit_sha_overrides_server(hub, tmp_path):
+    hub.linked_sha = "0" * 64
+    result = download(hub.base + "/repo/resolve/main/m.gguf", str(tmp_path / "m.gguf"),
+                      sha256=SHA.upper(), chunk_bytes=CHUNK)
+    assert result["verified"]
+
+
+def test_server_without_ranges(hub, tmp_path):
+    dest = str(tmp_path / "m.gguf")
+    info = probe(hub.base + "/plain/m.gguf")
+    assert info["ranges"] is False and info["sha256"] is None
+    result = download(hub.base + "/plain/m.gguf", dest, sha256=SHA)
+    assert result["verified"] and result["size"] == len(DATA)
@@ -0,0 +1,56 @@
+import os
+import sys
+import types
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import vox_server
+from async_http import HTTPError
+from vox_server import VoxServer, parse_chat_request
+
+HELLO = [{"role": "user", "content": "hi"}]
+
+
+def test_valid_request():
+    messages, max_tokens, sampling = parse_chat_request(
+        {"messages": HELLO, "temperature": 0, "top_k": 20, "stop": ["\n"], "seed": None})
+    assert messages == HELLO
+    assert max_tokens == vox_server.DEFAULT_MAX_TOKENS
+    assert sampling == {"temperature": 0, "top_k": 20, "stop": ["\n"]}
+
+
+@pytest.mark.parametrize("body", [
+    {"messages": []},
+    {"messages": ["bad"]},
+    {"messages": [{"role": "user"}]},
+    {"messages": [{"role": "user", "content": 5}]},
+    {"messages": HELLO, "max_tokens": "abc"},
+    {"messages": HELLO, "max_tokens": 0},
+    {"messages": HELLO, "max_tokens": True},
+    {"messages": HELLO, "temperature": "hot"},
+    {"messages": HELLO, "temperature": -1},
+    {"messages": HELLO, "top_p": 1.5},
+    {"messages": HELLO, "top_k": 2.5},
+    {"messages": HELLO, "stop": [1]},
+])
+def test_invalid_request_is_400(body):
+    with pytest.raises(HTTPError) as err:
+        parse_chat_request(body)
+    assert err.value.status == 400
+
+
+def test_failed_swap_keeps_old_engine(monkeypatch, tmp_path):
+    class BrokenVoxAPI:
+        def __init__(self, model_path=None, verbose=False, pin_threads=False):
+            raise RuntimeError("out of memory")
+
+    monkeypatch.setitem(sys.modules, "vox_api", types.SimpleNamespace(VoxAPI=BrokenVoxAPI))
+    old = types.SimpleNamespace(verbose=False, pin_threads=False)
+    server = VoxServer(old, "old.gguf")
+    with pytest.raises(RuntimeError):
+        server._swap_engine(str(tmp_path / "new.gguf"))
+    assert server.engine is old
+    assert server.model_name == "old.gguf"
@@ -0,0 +1,32 @@
+import os
+import sys
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from vox_sessions import SessionManager
+
+
+def test_spilled_ids_never_collide(tmp_path):
+    manager = SessionManager(max_sessions=1, spill_dir=str(tmp_path))
+    manager.create("secret prompt", session_id="user.1")
+    manager.create(session_id="user1") # Spills user.1
+    assert manager.ids() == ["user1"]
+
+    assert manager.get("user.1").system_prompt == "secret prompt"
+    assert manager.get("user1").system_prompt != "secret prompt"
+    with pytest.raises(KeyError):
+        manager.get("user-1")
+
+
+def test_busy_sessions_are_not_evicted(tmp_path):
+    manager = SessionManager(max_sessions=1, spill_dir=str(tmp_path))
+    first = manager.create(session_id="a", acquire=True)
+    manager.create(session_id="b")
+    assert set(manager.ids()) == {"a", "b"} # Over the cap, but "a" is in use
+    manager.release(first)
+    manager.get("b")
+    assert manager.ids() == ["b"]
+    assert "a" in manager
@@ -0,0 +1,165 @@
+import os
+import sys
+import json
+import time
+import uuid
+import random
+import hashlib
+import threading
+
+# ==========================================
+# TRAFFIC RECORDER
+# ==========================================
+# Records the chat turns that really happen (vox_core_chat, standalone_chat, VoxAPI) as a
+# requests JSONL that batch_runner.py, vox_bench.py, loadgen.py and traffic_replay.py all read.
+# One line per turn:
+#   {"request_id", "messages", "max_tokens", <sampling>, "ts", "session", "source", "backend",
+#    "model", "ttft_s", "latency_s", "prompt_chars", "completion_tokens", "error", "redacted"}
+#
+# Off by default. Enable with --record, VOX_RECORD=1 (or VOX_RECORD=<path>) or enable().
+# With --record-redact / VOX_RECORD_REDACT=1 every message is replaced by filler text of the
+# same length. The filler is derived from a hash of the original, so a history repeated across
+# turns stays identical and prefix reuse in the replay matches the real traffic.
+
+DEFAULT_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "logs", "traffic", "requests.jsonl")
+SAMPLING_FIELDS = ("temperature", "top_k", "top_p", "min_p", "repeat_penalty", "seed", "stop")
+
+_FILLER = ("data", "model", "system", "value", "report", "number", "people", "water", "method", "area",
+           "level", "order", "change", "point", "result", "question", "reason", "line", "world", "idea")
+
+enabled = False
+redact = False
+path = DEFAULT_PATH
+session_id = None
+_lock = threading.Lock()
+_count = 0
+
+
+class _NullTurn:
+    __slots__ = ()
+
+    def token(self, n=1):
+        pass
+
+    def finish(self, **fields):
+        pass
+
+
+_NULL = _NullTurn()
+
+
+class _Turn:
+    """One recorded request. Call token() per streamed piece and finish() once."""
+
+    def __init__(self, source, messages, max_tokens, session, sampling):
+        self.source = source
+        self.messages = [{"role": m["role"], "content": m.get("content") or ""} for m in messages]
+        self.max_tokens = max_tokens
+        self.session = session
+        self.sampling = {k: v for k, v in sampling.items() if k in SAMPLING_FIELDS and v is not None}
+        self.ts = time.time()
+        self.start = time.perf_counter()
+        self.first = None
+        self.tokens = 0
+        self.done = False
+
+    def token(self, n=1):
+        if self.first is None:
+            self.first = time.perf_counter()
+        self.tokens += n
+
+    def finish(self, backend=None, model=None, error=None, completion_tokens=None, prompt_tokens=None):
+        if self.done:
+            return
+        self.done = True
+        end = time.perf_counter()
+        messages = [{"role": m["role"], "content": redact_text(m["content"])} for m in self.messages] \
+            if redact else self.messages
+        entry = {
+            "request_id": _next_id(),
+            "messages": messages,
+            "max_tokens": self.max_tokens,
+            **self.sampling,
+            "ts": round(self.ts, 3),
+            "session": self.session or session_id,
+            "source": self.source,
+            "backend": backend,
+            "model": model,
+            "ttft_s": round(self.first - self.start, 4) if self.first is not None else None,
+            "latency_s": round(end - self.start, 4),
+            "prompt_chars": sum(len(m["content"]) for m in self.messages),
+            "prompt_tokens": prompt_tokens,
+            "completion_tokens": completion_tokens if completion_tokens is not None else self.tokens,
+            "error": str(error) if error else None,
+            "redacted": redact,
+        }
+        _write(entry)
+
+
+def start(source, messages, max_tokens=None, session=None, **sampling):
+    """
+    Begins recording one turn; the history is copied now, so later appends do not leak in.
+    Returns a no-op object when recording is off.
+    """
+    if not enabled:
+        return _NULL
+    return _Turn(source, messages, max_tokens, session, sampling)
+
+
+def redact_text(text):
+    """Same-length filler words, deterministic per input text."""
+    if not text:
+        return text
+    rng = random.Random(hashlib.sha256(text.encode("utf-8")).digest())
+    words = []
+    length = 0
+    while length < len(text):
+        word = rng.choice(_FILLER)
+        words.append(word)
+        length += len(word) + 1
+    return " ".join(words)[:len(text)]
+
+
+def _next_id():
+    global _count
+    with _lock:
+        _count += 1
+        return f"{session_id}-{_count:04d}"
+
+
+def _write(entry):
+    """Never raises: recording must not break a chat turn."""
+    try:
+        line = json.dumps(entry, ensure_ascii=False)
+        with _lock:
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+            with open(path, "a", encoding="utf-8") as f:
+                f.write(line + "\n")
+    except (OSError, TypeError, ValueError) as e:
+        print(f"[RECORD] ⚠️ Could not record request: {e}")
+
+
+def enable(target=None, redact_content=None):
+    """Starts appending turns to target (default logs/traffic/requests.jsonl)."""
+    global enabled, path, redact, session_id
+    if target:
+        path = target
+    if redact_content is not None:
+        redact = redact_content
+    if not enabled:
+        session_id = time.strftime("%Y%m%d_%H%M%S") + "-" + uuid.uuid4().hex[:6]
+    enabled = True
+    return path
+
+
+def disable():
+    global enabled
+    enabled = False
+
+
+_env = os.environ.get("VOX_RECORD", "")
+_redact_env = os.environ.get("VOX_RECORD_REDACT", "").lower() in ("1", "true", "yes") or "--record-redact" in sys.argv
+if _env.lower() in ("1", "true", "yes") or "--record" in sys.argv or "--record-redact" in sys.argv:
+    enable(redact_content=_redact_env)
+elif _env and _env.lower() not in ("0", "false", "no"):
+    enable(_env, redact_content=_redact_env) # VOX_RECORD=<path>
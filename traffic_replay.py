@@ -0,0 +1,228 @@
+import os
+import sys
+import json
+import time
+import argparse
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import traffic_recorder
+from batch_runner import load_requests, make_backend_factory, run_one, percentile
+
+# ==========================================
+# TRAFFIC REPLAY
+# ==========================================
+# Re-issues traffic captured by traffic_recorder.py against the local engine or any
+# OpenAI-compatible endpoint (a RunPod pod, vox_server.py, stub_vllm_server.py). Arrivals follow
+# the recorded timestamps, optionally sped up (--speed) with long idle gaps (the user reading or
+# typing) capped by --max-gap. Each request is sent at its scheduled time whether or not earlier
+# ones finished, so latency counts from the arrival and includes any queueing. The report puts
+# the recorded and replayed TTFT, latency, decode tok/s and throughput side by side.
+#
+#   python vox_core_chat.py --record          (or VOX_RECORD=1, or VoxAPI(record_traffic=True))
+#   python traffic_replay.py logs/traffic/requests.jsonl --backend local --model Qwen2.5-14B-Q4_K_M.gguf
+#   python traffic_replay.py logs/traffic/requests.jsonl --backend endpoint --endpoint http://127.0.0.1:8001/v1 --speed 10
+
+REPLAY_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "logs", "replay")
+DEFAULT_MAX_GAP = 30.0    # Seconds; longer pauses between recorded turns are shortened to this
+DEFAULT_CONCURRENCY = 16  # Endpoint replay threads; arrivals beyond this wait for a free thread
+PERCENTILES = (50, 95)
+METRICS = ("ttft_s", "latency_s", "decode_tok_s")
+
+
+def load_traffic(path, limit=None, source=None):
+    """Recorded requests [(request_id, request)], oldest first. Lines without messages are skipped."""
+    records = [(rid, req) for rid, req in load_requests(path)
+               if (req.get("messages") or req.get("prompt")) and (source is None or req.get("source") == source)]
+    records.sort(key=lambda r: r[1].get("ts") or 0)
+    return records[:limit] if limit else records
+
+
+def schedule(records, speed=1.0, max_gap=DEFAULT_MAX_GAP):
+    """Offsets (s) from replay start: the recorded gaps, each capped at max_gap, divided by speed."""
+    offsets, t, prev = [], 0.0, None
+    for _, req in records:
+        ts = req.get("ts")
+        if prev is not None and ts is not None:
+            gap = max(0.0, ts - prev)
+            if max_gap is not None:
+                gap = min(gap, max_gap)
+            t += gap / speed
+        prev = ts if ts is not None else prev
+        offsets.append(t)
+    return offsets
+
+
+def replay(backend_factory, records, offsets, concurrency=DEFAULT_CONCURRENCY, max_tokens=None, verbose=True):
+    """Sends each record at t0 + its offset. Returns (results in record order, wall time)."""
+    results = [None] * len(records)
+    local = threading.local()
+    lock = threading.Lock()
+    done = [0]
+
+    def run(i, scheduled):
+        if not hasattr(local, "backend"):
+            local.backend = backend_factory()
+        request_id, req = records[i]
+        if max_tokens:
+            req = dict(req, max_tokens=max_tokens)
+        started = time.perf_counter()
+        result = run_one(local.backend, request_id, req)
+        result.pop("response", None)
+        result["queue_s"] = round(started - scheduled, 3)
+        result["offset_s"] = round(scheduled - t0, 3)
+        if result["ttft_s"] is not None:
+            result["ttft_s"] = round(result["ttft_s"] + result["queue_s"], 3)
+        result["latency_s"] = round(result["latency_s"] + result["queue_s"], 3)
+        results[i] = result
+        if verbose:
+            with lock:
+                done[0] += 1
+                mark = "✅" if result["status"] == "ok" else f"❌ {result.get('error')}"
+                print(f"[REPLAY] {done[0]}/{len(records)} {request_id}: {result['latency_s']:.2f}s "
+                      f"({result['completion_tokens']} tok) {mark}")
+
+    t0 = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=max(1, concurrency), thread_name_prefix="vox-replay") as pool:
+        for i, offset in enumerate(offsets):
+            scheduled = t0 + offset
+            delay = scheduled - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+            pool.submit(run, i, scheduled)
+    return results, time.perf_counter() - t0
+
+
+def _recorded_tok_s(req):
+    tokens, ttft, latency = req.get("completion_tokens"), req.get("ttft_s"), req.get("latency_s")
+    if tokens and tokens > 1 and ttft is not None and latency and latency > ttft:
+        return (tokens - 1) / (latency - ttft)
+    return None
+
+
+def _stats(values):
+    values = [v for v in values if v is not None]
+    if not values:
+        return None
+    return {f"p{p}": round(percentile(values, p), 4) for p in PERCENTILES}
+
+
+def compare(records, results, wall_s, speed=1.0, max_gap=DEFAULT_MAX_GAP):
+    """Recorded vs replayed metrics (successful requests only) and throughput over each run's span."""
+    recorded_ok = [req for _, req in records if not req.get("error")]
+    replay_ok = [r for r in results if r and r["status"] == "ok"]
+    recorded = {
+        "ttft_s": [req.get("ttft_s") for req in recorded_ok],
+        "latency_s": [req.get("latency_s") for req in recorded_ok],
+        "decode_tok_s": [_recorded_tok_s(req) for req in recorded_ok],
+    }
+    replayed = {m: [r.get(m) for r in replay_ok] for m in METRICS}
+
+    # Recorded span on the replay's clock (same gap capping and speed-up), so throughputs compare
+    offsets = schedule(records, speed, max_gap)
+    recorded_span = max((o + (req.get("latency_s") or 0) / speed for o, (_, req) in zip(offsets, records)), default=0)
+    recorded_tokens = sum(req.get("completion_tokens") or 0 for req in recorded_ok)
+    replay_tokens = sum(r.get("completion_tokens") or 0 for r in replay_ok)
+
+    rows = {}
+    for m in METRICS:
+        rows[m] = {"recorded": _stats(recorded[m]), "replay": _stats(replayed[m])}
+    return {
+        "requests": len(records),
+        "recorded_errors": len(records) - len(recorded_ok),
+        "replay_errors": sum(1 for r in results if r and r["status"] != "ok"),
+        "metrics": rows,
+        "throughput": {
+            "recorded_rps": round(len(recorded_ok) / recorded_span, 3) if recorded_span else None,
+            "replay_rps": round(len(replay_ok) / wall_s, 3) if wall_s else None,
+            "recorded_tok_s": round(recorded_tokens / recorded_span, 2) if recorded_span else None,
+            "replay_tok_s": round(replay_tokens / wall_s, 2) if wall_s else None,
+        },
+    }
+
+
+def _change(before, after):
+    if before is None or after is None or not before:
+        return "-"
+    return f"{(after - before) / before * 100:+.1f}%"
+
+
+def _fmt(value, digits=3):
+    return f"{value:.{digits}f}" if value is not None else "-"
+
+
+def print_comparison(report):
+    print(f"\n[REPLAY] {report['requests']} requests | errors: recorded {report['recorded_errors']}, "
+          f"replay {report['replay_errors']}")
+    header = f"{'metric':<18} {'recorded':>10} {'replay':>10} {'change':>9}"
+    print(header)
+    print("-" * len(header))
+    for metric, row in report["metrics"].items():
+        for p in PERCENTILES:
+            key = f"p{p}"
+            before = row["recorded"][key] if row["recorded"] else None
+            after = row["replay"][key] if row["replay"] else None
+            print(f"{metric + ' ' + key:<18} {_fmt(before):>10} {_fmt(after):>10} {_change(before, after):>9}")
+    t = report["throughput"]
+    for label, before, after in (("req/s", t["recorded_rps"], t["replay_rps"]),
+                                 ("output tok/s", t["recorded_tok_s"], t["replay_tok_s"])):
+        print(f"{label:<18} {_fmt(before, 2):>10} {_fmt(after, 2):>10} {_change(before, after):>9}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Replay recorded VoxAI traffic and compare latency and throughput")
+    parser.add_argument("input", nargs="?", default=traffic_recorder.DEFAULT_PATH)
+    parser.add_argument("--backend", choices=("local", "endpoint"), default="local")
+    parser.add_argument("--model", help="Local: GGUF path/name. Endpoint: model id sent in requests")
+    parser.add_argument("--endpoint", default=None, help="OpenAI-compatible base URL (default: RUNPOD_BASE_URL)")
+    parser.add_argument("--api-key", default=None)
+    parser.add_argument("--speed", type=float, default=1.0, help="Arrival rate multiplier (2 = twice as fast)")
+    parser.add_argument("--max-gap", type=float, default=DEFAULT_MAX_GAP,
+                        help="Cap on the pause between recorded requests, in recorded seconds (0 = no cap)")
+    parser.add_argument("--limit", type=int, default=None, help="Replay only the first N requests")
+    parser.add_argument("--source", default=None, help="Only requests recorded by this layer (vox_core_chat, vox_api...)")
+    parser.add_argument("--max-tokens", type=int, default=None, help="Override the recorded max_tokens")
+    parser.add_argument("-c", "--concurrency", type=int, default=None,
+                        help=f"Replay threads (default 1 local, {DEFAULT_CONCURRENCY} endpoint); local runs >1 use continuous batching")
+    parser.add_argument("--ctx-per-slot", type=int, default=2048)
+    parser.add_argument("-o", "--output", default=None, help="Report JSON (default logs/replay/...)")
+    parser.add_argument("--quiet", action="store_true")
+    args = parser.parse_args(argv)
+
+    traffic_recorder.disable() # Never record the replay into the traffic it reads
+    if not os.path.exists(args.input):
+        sys.exit(f"[REPLAY] ❌ Recording not found: {args.input}")
+    if args.speed <= 0:
+        sys.exit("[REPLAY] ❌ --speed must be positive.")
+    records = load_traffic(args.input, args.limit, args.source)
+    if not records:
+        sys.exit("[REPLAY] ❌ No replayable requests in the recording.")
+    max_gap = args.max_gap or None
+    concurrency = max(1, args.concurrency or (1 if args.backend == "local" else DEFAULT_CONCURRENCY))
+    offsets = schedule(records, args.speed, max_gap)
+
+    try:
+        factory, label, scheduler = make_backend_factory(args.backend, args.model, args.endpoint, args.api_key,
+                                                         concurrency, args.ctx_per_slot)
+    except ValueError as e:
+        sys.exit(f"[REPLAY] ❌ {e}")
+
+    print(f"[REPLAY] ▶️ {len(records)} requests over {offsets[-1]:.1f}s ({args.speed:g}x) -> {label}")
+    try:
+        results, wall_s = replay(factory, records, offsets, concurrency, args.max_tokens, verbose=not args.quiet)
+    finally:
+        if scheduler:
+            scheduler.close()
+
+    report = compare(records, results, wall_s, args.speed, max_gap)
+    print_comparison(report)
+    output = args.output or os.path.join(REPLAY_DIR, f"replay_{time.strftime('%Y%m%d_%H%M%S')}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, "w", encoding="utf-8") as f:
+        json.dump({"input": args.input, "target": label, "speed": args.speed, "max_gap": max_gap,
+                   "wall_s": round(wall_s, 3), **report, "results": results}, f, indent=2)
+    print(f"\n[REPLAY] ✅ Report written to {output}")
+
+
+if __name__ == "__main__":
+    main()
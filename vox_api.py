@@ -1,8 +1,22 @@
 import os
 import time
-from typing import Generator, Dict, List, Optional, Union
+import uuid
+import asyncio
+import threading
+import queue as queue_mod
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeout
+from typing import AsyncGenerator, Generator, Dict, List, Optional, Union
 from llama_cpp import Llama
 import machine_engine_handshake
+from memory_planner import check_plan
+import model_index
+import vox_trace
+import traffic_recorder
+from gguf_prefetch import start_prefetch
+from vox_sessions import SessionManager, VoxSession
+from speculative import make_draft_model, check_draft_compatible, draft_stats
+
+DEFAULT_SESSION_ID = "default"
 
 class VoxAPI:
     """
@@ -10,53 +24,81 @@ class VoxAPI:
     Designed for easy integration into chat software.
     """
     
-    def __init__(self, model_path: str = None, verbose: bool = False):
+    def __init__(self, model_path: str = None, verbose: bool = False,
+                 max_sessions: int = 64, session_spill_dir: Optional[str] = None,
+                 draft_model: Optional[str] = None, prefetch: bool = True,
+                 record_traffic: Union[bool, str] = False, pin_threads: bool = False):
         """
         Initialize the VOX Engine with automatic hardware optimization.
         
         Args:
             model_path: Path to the .gguf model file. If None, auto-detects from ./models
             verbose: Enable detailed logging
+            max_sessions: Sessions kept in memory before idle ones are evicted
+            session_spill_dir: If set, evicted sessions are saved here and reloaded on demand
+            draft_model: Speculative decoding draft: "lookup" (n-gram) or a small GGUF path/name
+            prefetch: Read the model into the page cache in the background while the engine starts
+            record_traffic: Append every chat turn to a requests JSONL (True = logs/traffic/requests.jsonl)
+            pin_threads: Apply the handshake's CPU affinity. It pins every thread in the process,
+                including the host application's, so only standalone entry points turn it on.
         """
+        self._t_init = time.perf_counter()
+        self.startup_ttft_s = None # Construction -> first generated token
         self.verbose = verbose
-        self.history: List[Dict[str, str]] = []
-        
-        # 1. Hardware Handshake
-        self.mode, self.phys_cores, self.config = machine_engine_handshake.get_hardware_config()
-        if self.verbose:
-            print(f"[VOX API] Mode: {self.mode}")
-            print(f"[VOX API] Config: {self.config}")
-            
-        # 2. Apply Environment Optimizations
-        self._apply_env_optimizations()
+        self.pin_threads = pin_threads
+        self.sessions = SessionManager(max_sessions=max_sessions, spill_dir=session_spill_dir)
+        self.sessions.create(session_id=DEFAULT_SESSION_ID)
+        self._engine_lock = threading.Lock() # One decode at a time on the shared llama context
+        self._executor = None                # Decode thread for streams, created on first use
+        if record_traffic:
+            traffic_recorder.enable(record_traffic if isinstance(record_traffic, str) else None)
         
-        # 3. Model Loading
+        # 1. Model Resolution (the handshake looks up tuned settings per model)
         if model_path is None:
             model_path = self._auto_find_model()
             
         if not os.path.exists(model_path):
             raise FileNotFoundError(f"Model not found at: {model_path}")
+        self.prefetcher = start_prefetch(model_path) if prefetch else None
+        
+        # 2. Hardware Handshake
+        with vox_trace.span("handshake", "startup"):
+            self.mode, self.phys_cores, self.config = machine_engine_handshake.get_hardware_config(model_path)
+        if self.verbose:
+            print(f"[VOX API] Mode: {self.mode}")
+            print(f"[VOX API] Config: {self.config}")
+        check_plan(self.config, model_path) # Refuse a load that would page
+            
+        # 3. Apply Environment Optimizations
+        self._apply_env_optimizations()
             
         self.model_name = os.path.basename(model_path)
         
         # 4. Initialize Llama
-        self.llm = Llama(
-            model_path=model_path,
-            n_ctx=2048, # Standard context window
+        n_ctx = self.config.get('n_ctx', 2048) # Sized by the memory planner
+        draft = make_draft_model(draft_model, self.config, n_ctx=n_ctx, verbose=self.verbose)
+        with vox_trace.span("llama.construct", "startup", model=self.model_name, n_ctx=n_ctx,
+                            n_gpu_layers=self.config['n_gpu_layers']):
+            self.llm = Llama(
+                model_path=model_path,
+                n_ctx=n_ctx,
+                draft_model=draft,
             
-            # Hardware Config
-            n_gpu_layers=self.config['n_gpu_layers'],
-            n_threads=self.config['n_threads'],
-            n_threads_batch=self.config['n_threads_batch'],
-            n_batch=self.config['n_batch'],
-            flash_attn=self.config['flash_attn'],
-            use_mlock=self.config['use_mlock'],
-            cache_type_k=self.config['cache_type_k'],
-            cache_type_v=self.config['cache_type_v'],
+                # Hardware Config
+                n_gpu_layers=self.config['n_gpu_layers'],
+                n_threads=self.config['n_threads'],
+                n_threads_batch=self.config['n_threads_batch'],
+                n_batch=self.config['n_batch'],
+                flash_attn=self.config['flash_attn'],
+                use_mlock=self.config['use_mlock'],
+                cache_type_k=self.config['cache_type_k'],
+                cache_type_v=self.config['cache_type_v'],
             
-            use_mmap=True,
-            verbose=self.verbose
-        )
+                use_mmap=self.config.get('use_mmap', True),
+                verbose=self.verbose
+            )
+        if draft is not None:
+            check_draft_compatible(self.llm)
         
         # 5. Warmup
         self.warmup()
@@ -76,29 +118,81 @@ class VoxAPI:
         
         os.environ["GGML_NUMA"] = "0"
         os.environ["GGML_BACKEND_SEARCH_PATH"] = root_path
+        
+        # Thread placement (ggml's worker threads inherit it)
+        if self.pin_threads and self.config.get("affinity"):
+            machine_engine_handshake.apply_affinity(self.config["affinity"])
         os.environ["LLAMA_CPP_LIB"] = os.path.join(root_path, "llama.dll")
 
     def _auto_find_model(self) -> str:
-        """Find the first .gguf file in ./models"""
+        """Pick a .gguf in ./models from the header index (largest chat model that fits in RAM)"""
         models_dir = os.path.abspath("./models")
         if not os.path.exists(models_dir):
             raise FileNotFoundError("Models directory './models' not found")
             
-        files = [f for f in os.listdir(models_dir) if f.endswith(".gguf")]
-        if not files:
-            raise FileNotFoundError("No .gguf models found in ./models")
+        name = model_index.pick_default(model_index.scan(models_dir))
+        if not name:
+            raise FileNotFoundError("No readable .gguf models found in ./models")
             
-        return os.path.join(models_dir, files[0])
+        return os.path.join(models_dir, name)
 
     def warmup(self):
         """Run a silent inference to load weights into RAM/VRAM"""
         if self.verbose: print("[VOX API] Warming up...")
-        self.llm.create_chat_completion(
-            messages=[{"role": "user", "content": "."}], 
-            max_tokens=1
-        )
+        with self._engine_lock, vox_trace.span("warmup", "startup"):
+            self.llm.create_chat_completion(
+                messages=[{"role": "user", "content": "."}], 
+                max_tokens=1
+            )
+        self._mark_first_token()
+
+    def _mark_first_token(self):
+        if self.startup_ttft_s is None:
+            self.startup_ttft_s = round(time.perf_counter() - self._t_init, 3)
+            if self.verbose:
+                print(f"[VOX API] Startup to first token: {self.startup_ttft_s}s")
 
-    def chat(self, user_message: str, stream: bool = True, system_prompt: str = None) -> Union[str, Generator[str, None, None]]:
+    # --- SESSIONS ---
+    def create_session(self, system_prompt: str = None, session_id: str = None, **sampling) -> str:
+        """
+        Start an independent conversation and return its ID.
+        
+        Args:
+            system_prompt: System prompt for this session
+            session_id: Optional explicit ID (random if omitted)
+            **sampling: max_tokens, temperature, top_k, repeat_penalty overrides
+        """
+        return self.sessions.create(system_prompt, session_id, **sampling).id
+
+    def get_session(self, session_id: str = None, acquire: bool = False) -> VoxSession:
+        """
+        Look up a session (KeyError if unknown). None means the default session.
+        acquire=True marks it busy (safe from eviction) until self.sessions.release(session).
+        """
+        session_id = session_id or DEFAULT_SESSION_ID
+        if session_id == DEFAULT_SESSION_ID and session_id not in self.sessions:
+            try:
+                return self.sessions.create(session_id=DEFAULT_SESSION_ID, acquire=acquire)
+            except ValueError:
+                pass # Created by another thread meanwhile
+        return self.sessions.get(session_id, acquire=acquire)
+
+    def close_session(self, session_id: str):
+        """Forget a session and its history"""
+        self.sessions.close(session_id)
+
+    @property
+    def history(self) -> List[Dict[str, str]]:
+        """History of the default session (single-user API)"""
+        return self.get_session().history
+
+    @history.setter
+    def history(self, value: List[Dict[str, str]]):
+        self.get_session().history = value
+
+    # --- CHAT ---
+    def chat(self, user_message: str, stream: bool = True, system_prompt: str = None,
+             session_id: str = None) -> Union[str, Generator[str, None, None]]:
         """
         Send a message to the AI and get a response.
         
@@ -106,61 +200,220 @@ class VoxAPI:
             user_message: The text input from the user
             stream: If True, returns a generator yielding tokens. If False, returns full string.
             system_prompt: Optional override for system prompt (default is "You are a helpful assistant.")
+            session_id: Conversation to continue. None uses the default session.
         """
-        
-        # Initialize history if empty
-        if not self.history:
-            sys_msg = system_prompt or "You are a helpful assistant."
-            self.history.append({"role": "system", "content": sys_msg})
-            
-        # Add user message
-        self.history.append({"role": "user", "content": user_message})
-        
         if stream:
-            return self._stream_response()
-        else:
-            return self._full_response()
+            self.get_session(session_id) # Unknown IDs fail here, not on the first next()
+            return self._stream_response(user_message, system_prompt, session_id)
 
-    def _stream_response(self) -> Generator[str, None, None]:
-        """Internal generator for streaming responses"""
-        full_response = ""
-        
-        stream = self.llm.create_chat_completion(
-            messages=self.history,
-            max_tokens=2048,
-            temperature=0.7,
-            top_k=40,
-            repeat_penalty=1.1,
-            stream=True
-        )
-        
-        for chunk in stream:
-            if "content" in chunk["choices"][0]["delta"]:
-                token = chunk["choices"][0]["delta"]["content"]
-                full_response += token
+        # Busy from here on, so the user turn cannot be evicted before the reply is recorded
+        session = self.get_session(session_id, acquire=True)
+        session.ensure_system_prompt(system_prompt)
+        session.history.append({"role": "user", "content": user_message})
+        return self._full_response(session)
+
+    def _sampling_kwargs(self, session: VoxSession) -> Dict:
+        keys = ("max_tokens", "temperature", "top_k", "repeat_penalty", "top_p", "min_p", "seed", "stop")
+        return {k: session.sampling[k] for k in keys if k in session.sampling}
+
+    def _record_turn(self, session: VoxSession, messages: List[Dict[str, str]]):
+        """Starts a traffic_recorder turn (a no-op unless recording is on)"""
+        return traffic_recorder.start("vox_api", messages, session=session.id, **self._sampling_kwargs(session))
+
+    def _stream_response(self, user_message: str, system_prompt: Optional[str],
+                         session_id: Optional[str]) -> Generator[str, None, None]:
+        """
+        Internal generator for streaming responses.
+
+        Nothing happens until the first next(), so a stream that is never started holds no session.
+        """
+        session = self.get_session(session_id, acquire=True)
+        session.ensure_system_prompt(system_prompt)
+        session.history.append({"role": "user", "content": user_message})
+        reply = []
+        try:
+            yield from self._decode_stream(session, list(session.history), reply)
+        finally:
+            # Runs on completion, errors and abandonment alike
+            self._finish_turn(session, "".join(reply))
+            self.sessions.release(session)
+
+    def stream_messages(self, messages: List[Dict[str, str]], **sampling) -> Generator[str, None, None]:
+        """
+        Streams a reply to an explicit message list, sent as given: no session history is
+        kept and no default system prompt is added. **sampling as for create_session().
+        """
+        session = VoxSession(f"oneshot-{uuid.uuid4().hex}", sampling=sampling)
+        yield from self._decode_stream(session, [dict(m) for m in messages], [])
+
+    def _decode_stream(self, session: VoxSession, messages: List[Dict[str, str]],
+                       reply: List[str]) -> Generator[str, None, None]:
+        """
+        Decodes on the decode thread and yields tokens, appending each to `reply`.
+        Decode runs ahead of a slow consumer instead of holding the engine while the caller
+        is paused between tokens; closing the generator stops it within one token.
+        """
+        tokens = queue_mod.Queue()
+        cancel = threading.Event()
+
+        def put(token) -> bool:
+            tokens.put(token)
+            return not cancel.is_set()
+
+        turn = self._record_turn(session, messages)
+        job = self._decode_executor().submit(self._decode_worker, session, messages, cancel, put, turn)
+        error = None
+        try:
+            while True:
+                try:
+                    token = tokens.get(timeout=0.05)
+                except queue_mod.Empty:
+                    if job.done() and tokens.empty():
+                        break
+                    continue
+                reply.append(token)
                 yield token
-                
-        # Update history with the complete response
-        self.history.append({"role": "assistant", "content": full_response})
+            job.result() # Re-raise decode errors
+        except Exception as e:
+            error = e
+            raise
+        finally:
+            cancel.set()
+            try:
+                job.result()
+            except Exception:
+                pass # Already raised above, or irrelevant once the caller has gone
+            finally:
+                turn.finish(backend="local", model=self.model_name, error=error)
+
+    def _decode_executor(self) -> ThreadPoolExecutor:
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="vox-decode")
+        return self._executor
+
+    def _finish_turn(self, session: VoxSession, text: str):
+        """Record the assistant reply; a turn that produced nothing is rolled back"""
+        if text:
+            session.history.append({"role": "assistant", "content": text})
+        elif session.history and session.history[-1]["role"] == "user":
+            session.history.pop()
 
-    def _full_response(self) -> str:
+    def _full_response(self, session: VoxSession) -> str:
         """Internal method for non-streaming response"""
-        response = self.llm.create_chat_completion(
-            messages=self.history,
-            max_tokens=2048,
-            temperature=0.7,
-            top_k=40,
-            repeat_penalty=1.1,
-            stream=False
-        )
+        turn = self._record_turn(session, session.history)
+        try:
+            try:
+                with self._engine_lock, vox_trace.span("local.generate", "generate"):
+                    response = self.llm.create_chat_completion(
+                        messages=list(session.history),
+                        stream=False,
+                        **self._sampling_kwargs(session)
+                    )
+            except Exception as e:
+                turn.finish(backend="local", model=self.model_name, error=e)
+                raise
+            usage = response.get("usage") or {}
+            turn.finish(backend="local", model=self.model_name, completion_tokens=usage.get("completion_tokens"),
+                        prompt_tokens=usage.get("prompt_tokens"))
+
+            self._mark_first_token()
+            text = response["choices"][0]["message"]["content"]
+            session.history.append({"role": "assistant", "content": text})
+            return text
+        finally:
+            self.sessions.release(session)
+
+    # --- ASYNC CHAT ---
+    async def achat(self, user_message: str, system_prompt: str = None, session_id: str = None,
+                    cancel: threading.Event = None, queue_size: int = 32) -> AsyncGenerator[str, None]:
+        """
+        Async version of chat(stream=True) for asyncio apps.
         
-        text = response["choices"][0]["message"]["content"]
-        self.history.append({"role": "assistant", "content": text})
-        return text
+        Decode runs on a dedicated worker thread and tokens are handed over through a
+        bounded queue, so a slow consumer pauses decode instead of buffering the reply.
+        Setting `cancel`, cancelling the task or closing the generator stops decode within
+        one token. A partial reply is kept in the history; an empty one drops the user turn.
+        """
+        loop = asyncio.get_running_loop()
+        session = self.get_session(session_id, acquire=True)
+        session.ensure_system_prompt(system_prompt)
+        session.history.append({"role": "user", "content": user_message})
+
+        queue = asyncio.Queue(maxsize=queue_size)
+        cancel = cancel or threading.Event()
+        messages = list(session.history)
+
+        def put(item) -> bool:
+            """Blocking hand-off from the worker; gives up once cancelled"""
+            future = asyncio.run_coroutine_threadsafe(queue.put(item), loop)
+            while True:
+                try:
+                    future.result(timeout=0.05)
+                    return True
+                except FutureTimeout:
+                    if cancel.is_set():
+                        future.cancel()
+                        return False
+
+        turn = self._record_turn(session, messages)
+        job = loop.run_in_executor(self._decode_executor(), self._decode_worker, session, messages, cancel, put, turn)
+        full_response = ""
+        error = None
+        try:
+            while not (job.done() and queue.empty()):
+                getter = asyncio.ensure_future(queue.get())
+                await asyncio.wait({getter, job}, return_when=asyncio.FIRST_COMPLETED)
+                if not getter.done():
+                    getter.cancel() # Worker finished (or failed) with nothing queued
+                    continue
+                token = getter.result()
+                full_response += token
+                yield token
+            job.result() # Re-raise decode errors
+        except Exception as e:
+            error = e
+            raise
+        finally:
+            cancel.set()
+            try:
+                await asyncio.shield(job)
+            finally:
+                turn.finish(backend="local", model=self.model_name, error=error)
+                self._finish_turn(session, full_response)
+                self.sessions.release(session)
+
+    def _decode_worker(self, session: VoxSession, messages: List[Dict[str, str]], cancel: threading.Event, put,
+                       turn=None):
+        """Runs on the decode thread for chat(stream=True) and achat(). Errors surface through the job future."""
+        with self._engine_lock:
+            if cancel.is_set():
+                return
+            start, first, n_tokens = time.perf_counter(), None, 0
+            stream = self.llm.create_chat_completion(
+                messages=messages,
+                stream=True,
+                **self._sampling_kwargs(session)
+            )
+            try:
+                for chunk in stream:
+                    if cancel.is_set():
+                        break
+                    token = chunk["choices"][0]["delta"].get("content")
+                    if token:
+                        self._mark_first_token()
+                        first = first or time.perf_counter()
+                        n_tokens += 1
+                        if turn is not None:
+                            turn.token()
+                    if token and not put(token):
+                        break
+            finally:
+                stream.close()
+                vox_trace.record_generation("local", start, first, n_tokens)
 
-    def clear_history(self):
-        """Reset conversation context"""
-        self.history = []
+    def clear_history(self, session_id: str = None):
+        """Reset conversation context (default session unless an ID is given)"""
+        self.get_session(session_id).history = []
 
     def get_stats(self):
         """Get info about the loaded model and hardware"""
@@ -168,7 +421,11 @@ class VoxAPI:
             "model": self.model_name,
             "mode": self.mode,
             "cores": self.phys_cores,
-            "gpu_layers": self.config['n_gpu_layers']
+            "gpu_layers": self.config['n_gpu_layers'],
+            "sessions": len(self.sessions.ids()),
+            "speculative": draft_stats(self.llm),
+            "startup_ttft_s": self.startup_ttft_s,
+            "prefetch": self.prefetcher.report() if self.prefetcher else None
         }
 
 # Usage Example
@@ -0,0 +1,541 @@
+import os
+import gc
+import sys
+import json
+import time
+import hashlib
+import argparse
+import platform
+import itertools
+import statistics
+import threading
+
+import psutil
+
+from batch_runner import percentile, load_requests, build_messages
+
+# ==========================================
+# VOX BENCH
+# ==========================================
+# Non-interactive benchmark of the local engine over a config matrix and prompt sets.
+# Per config: load time and peak RSS, then warmup passes and N timed trials of every prompt.
+# Each trial measures TTFT, prefill and decode tok/s and inter-token latency (p50/p95/p99)
+# from the engine's own tokens (generate() yields exactly one token per step, unlike stream
+# chunks). Results are written as JSON with machine, model and config fingerprints, per-trial
+# samples and per-metric summaries with outlier flags. With more than one config, every config
+# is also reported as a median speedup over the first one (or --baseline).
+#
+#   python vox_bench.py --model qwen.gguf --set n_gpu_layers=0,12 --prompts short,long --trials 5
+#   python vox_bench.py --model qwen.gguf --matrix configs.json --prompts my_prompts.jsonl
+#   python vox_bench.py --model qwen.gguf --set affinity=none,auto         (unpinned vs pinned)
+#   python vox_bench.py --model qwen.gguf --set draft_model=none,lookup    (speculative decoding)
+
+BENCH_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "logs", "bench")
+RESULT_VERSION = 1
+DEFAULT_TRIALS = 5
+DEFAULT_WARMUP = 1
+DEFAULT_MAX_TOKENS = 128
+RSS_INTERVAL = 0.02   # Seconds between RSS samples
+OUTLIER_IQR = 1.5     # Tukey fences
+OUTLIER_MIN_DEV = 0.02 # ...and at least 2% from the median, so near-identical trials are not flagged
+
+METRICS = ("ttft_s", "prefill_tps", "decode_tps", "itl_p50_ms", "itl_p95_ms", "itl_p99_ms")
+
+_DOCUMENT = (
+    "Memory bandwidth, not arithmetic, limits how fast a language model generates text on a "
+    "desktop machine. Every new token needs the full set of weights streamed from memory once, "
+    "so a model that occupies eight gigabytes on a system that moves forty gigabytes per second "
+    "cannot produce more than about five tokens per second, whatever the core count. Reading the "
+    "prompt is different: all of its tokens go through each weight matrix together, so prefill "
+    "is bound by compute and scales with threads, SIMD width and GPU offload. "
+)
+
+# Built-in prompt sets (batch_runner request format)
+PROMPT_SETS = {
+    "short": [
+        {"request_id": "processor", "prompt": "Explain how a computer processor works in 100 words."},
+        {"request_id": "relativity", "prompt": "Explain the theory of relativity in simple terms."},
+    ],
+    "long": [
+        {"request_id": "summarize", "system": "You are a precise technical editor.",
+         "prompt": "Summarize the following notes in three bullet points.\n\n" + _DOCUMENT * 12},
+    ],
+    "chat": [
+        {"request_id": "multi_turn", "messages": [
+            {"role": "system", "content": "You are a helpful assistant."},
+            {"role": "user", "content": "What is a GGUF file?"},
+            {"role": "assistant", "content": "GGUF is the single-file model format used by llama.cpp. "
+                                             "It stores the weights together with the tokenizer and metadata."},
+            {"role": "user", "content": "Why does quantization make it faster to run?"},
+        ]},
+    ],
+}
+
+
+# --- FINGERPRINTS ---
+def _digest(obj):
+    return hashlib.sha256(json.dumps(obj, sort_keys=True, default=str).encode()).hexdigest()[:16]
+
+
+def machine_info(root_path="."):
+    import hardware_probe
+    probe = hardware_probe.get_probe(root_path)
+    try:
+        import llama_cpp
+        llama_version = getattr(llama_cpp, "__version__", None)
+    except ImportError:
+        llama_version = None
+    return {
+        "fingerprint": probe["fingerprint"],
+        "cpu": probe["cpu"],
+        "isa": probe["isa"],
+        "cpu_variant": probe["cpu_variant"],
+        "gpu_backends": probe["gpu_backends"],
+        "physical_cores": probe["topology"]["physical_cores"],
+        "ram_total": probe["ram_total"],
+        "os": platform.platform(),
+        "python": platform.python_version(),
+        "llama_cpp": llama_version,
+    }
+
+
+def model_info(model_path):
+    import model_index
+    from engine_autotune import model_fingerprint
+    if os.path.dirname(os.path.abspath(model_path)) == os.path.abspath(model_index.MODELS_DIR):
+        entry = model_index.scan().get(os.path.basename(model_path)) or {}
+    else:
+        entry = model_index.read_entry(model_path)
+    return {
+        "file": os.path.basename(model_path),
+        "fingerprint": model_fingerprint(model_path),
+        "size": os.path.getsize(model_path),
+        **{k: entry.get(k) for k in ("architecture", "params", "quant", "context_length")},
+    }
+
+
+def config_fingerprint(cfg):
+    return _digest({k: v for k, v in cfg.items() if k != "memory_plan"})
+
+
+# --- CONFIG MATRIX ---
+def parse_value(text):
+    low = text.lower()
+    if low in ("true", "false"):
+        return low == "true"
+    if low in ("none", "null"):
+        return None
+    for cast in (int, float):
+        try:
+            return cast(text)
+        except ValueError:
+            pass
+    return text
+
+
+def parse_set(text):
+    """'n_gpu_layers=0,12' -> ("n_gpu_layers", [0, 12])"""
+    key, sep, values = text.partition("=")
+    if not sep or not key:
+        raise argparse.ArgumentTypeError(f"expected KEY=V1,V2,...: {text}")
+    return key.strip(), [parse_value(v.strip()) for v in values.split(",")]
+
+
+def build_matrix(base, sets=(), matrix_file=None):
+    """
+    [(name, cfg)]: the matrix file's entries (or just the base config), each crossed with
+    every combination of the --set values. Entries override the handshake config.
+    """
+    variants = [("base", {})]
+    if matrix_file:
+        with open(matrix_file, "r", encoding="utf-8") as f:
+            entries = json.load(f)
+        variants = []
+        for i, entry in enumerate(entries):
+            entry = dict(entry)
+            variants.append((entry.pop("name", f"config-{i + 1}"), entry))
+    if sets:
+        keys = [k for k, _ in sets]
+        crossed = []
+        for name, overrides in variants:
+            for combo in itertools.product(*(values for _, values in sets)):
+                extra = dict(zip(keys, combo))
+                label = " ".join(f"{k}={v}" for k, v in extra.items())
+                crossed.append((label if name == "base" else f"{name} {label}", {**overrides, **extra}))
+        variants = crossed
+    return [(name, {**base, **overrides}) for name, overrides in variants]
+
+
+def resolve_affinity(matrix, topology):
+    """
+    affinity="auto" in a config becomes the handshake's pinning plan for its thread count
+    (threads capped at the pinned CPUs); None/"none" runs unpinned.
+    """
+    import machine_engine_handshake
+    resolved = []
+    for name, cfg in matrix:
+        if cfg.get("affinity") == "auto":
+            plan = machine_engine_handshake.plan_affinity(topology, cfg["n_threads"])
+            cfg = dict(cfg, affinity=plan["cpus"] if plan else None)
+            if plan:
+                cfg["n_threads"] = min(cfg["n_threads"], len(plan["cpus"]))
+                cfg["n_threads_batch"] = min(cfg["n_threads_batch"], len(plan["cpus"]))
+            else:
+                print(f"[BENCH] ⚠️ {name}: nothing to pin on this machine, running unpinned.")
+        elif cfg.get("affinity") == "none":
+            cfg = dict(cfg, affinity=None)
+        resolved.append((name, cfg))
+    return resolved
+
+
+def load_prompts(specs):
+    """Built-in set names and/or batch_runner JSONL paths -> [(prompt_id, request)]."""
+    prompts = []
+    for spec in specs:
+        if spec in PROMPT_SETS:
+            prompts += [(f"{spec}/{r['request_id']}", r) for r in PROMPT_SETS[spec]]
+        elif os.path.isfile(spec):
+            name = os.path.splitext(os.path.basename(spec))[0]
+            prompts += [(f"{name}/{request_id}", r) for request_id, r in load_requests(spec)]
+        else:
+            raise ValueError(f"unknown prompt set '{spec}' (built-in: {', '.join(PROMPT_SETS)})")
+    return prompts
+
+
+# --- MEASUREMENT ---
+class PeakRSS:
+    """Samples this process's RSS on a background thread; peak is the highest value seen."""
+
+    def __init__(self, interval=RSS_INTERVAL):
+        self.interval = interval
+        self.process = psutil.Process()
+        self.peak = self.process.memory_info().rss
+        self._stop = threading.Event()
+        self._thread = None
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            self.peak = max(self.peak, self.process.memory_info().rss)
+
+    def __enter__(self):
+        self._thread = threading.Thread(target=self._run, name="vox-bench-rss", daemon=True)
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        self._thread.join()
+        self.peak = max(self.peak, self.process.memory_info().rss)
+        return False
+
+
+def run_trial(llm, tokens, max_tokens, stop_at_eos=False):
+    """
+    One greedy generation from an empty KV cache. Returns (metrics, inter_token_ms).
+    Prefill is the timed eval() of the prompt; generate() then samples from the cached
+    logits, so every later step is one decode.
+    """
+    llm.reset()
+    t0 = time.perf_counter()
+    llm.eval(tokens)
+    t_prefill = time.perf_counter()
+
+    eos = llm.token_eos()
+    stamps = []
+    gen = llm.generate(tokens, top_k=1, temp=0.0, repeat_penalty=1.0)
+    try:
+        for token in gen:
+            stamps.append(time.perf_counter())
+            if len(stamps) >= max_tokens or (stop_at_eos and token == eos):
+                break
+    finally:
+        gen.close()
+
+    itl = [(b - a) * 1000 for a, b in zip(stamps, stamps[1:])]
+    decode_s = stamps[-1] - stamps[0] if len(stamps) > 1 else 0.0
+    metrics = {
+        "prompt_tokens": len(tokens),
+        "gen_tokens": len(stamps),
+        "ttft_s": round(stamps[0] - t0, 4) if stamps else None,
+        "prefill_tps": round(len(tokens) / (t_prefill - t0), 2),
+        "decode_tps": round((len(stamps) - 1) / decode_s, 2) if decode_s > 0 else None,
+    }
+    for pct in (50, 95, 99):
+        value = percentile(itl, pct)
+        metrics[f"itl_p{pct}_ms"] = round(value, 2) if value is not None else None
+    return metrics, itl
+
+
+def describe_samples(samples):
+    """
+    Summary of one metric over trials: samples is [(trial, value)].
+    Outliers are the trials outside the Tukey fences (1.5 IQR beyond the quartiles) that
+    also differ from the median by more than OUTLIER_MIN_DEV.
+    """
+    samples = [(t, v) for t, v in samples if v is not None]
+    if not samples:
+        return None
+    values = [v for _, v in samples]
+    q1, q3 = percentile(values, 25), percentile(values, 75)
+    lo, hi = q1 - OUTLIER_IQR * (q3 - q1), q3 + OUTLIER_IQR * (q3 - q1)
+    median = statistics.median(values)
+    mean = statistics.mean(values)
+    stdev = statistics.stdev(values) if len(values) > 1 else 0.0
+    return {
+        "n": len(values),
+        "median": round(median, 4),
+        "mean": round(mean, 4),
+        "stdev": round(stdev, 4),
+        "min": min(values),
+        "max": max(values),
+        "cv": round(stdev / mean, 4) if mean else None,
+        "outliers": [t for t, v in samples if (v < lo or v > hi) and abs(v - median) > OUTLIER_MIN_DEV * abs(median)],
+    }
+
+
+def bench_config(model_path, name, cfg, prompts, trials=DEFAULT_TRIALS, warmup=DEFAULT_WARMUP,
+                 max_tokens=DEFAULT_MAX_TOKENS, stop_at_eos=False, verbose=True):
+    """Loads the model with cfg, runs warmup + trials over prompts and returns the config's result dict."""
+    import machine_engine_handshake
+    from model_cache import load_llama
+    from chat_backends import tokenize_chat
+
+    result = {
+        "name": name,
+        "fingerprint": config_fingerprint(cfg),
+        "config": {k: v for k, v in cfg.items() if k != "memory_plan"},
+        "memory_plan": cfg.get("memory_plan"),
+    }
+    os.environ["GGML_VK_FORCE_BUSY_WAIT"] = str(cfg.get("busy_wait", "0"))
+    unpinned = machine_engine_handshake.current_affinity()
+    if cfg.get("affinity"):
+        machine_engine_handshake.apply_affinity(cfg["affinity"])
+
+    llm = None
+    try:
+        with PeakRSS() as rss:
+            t0 = time.perf_counter()
+            llm = load_llama(model_path, cfg, verbose=False)
+            result["load_s"] = round(time.perf_counter() - t0, 3)
+        result["load_peak_rss_mb"] = round(rss.peak / 1024**2, 1)
+        if verbose:
+            print(f"[BENCH]   Loaded in {result['load_s']:.2f}s (peak RSS {result['load_peak_rss_mb']:.0f} MB)")
+
+        draft = getattr(llm, "draft_model", None)
+        encoded = []
+        for prompt_id, req in prompts:
+            tokens, _ = tokenize_chat(llm, build_messages(req))
+            limit = int(req.get("max_tokens") or max_tokens)
+            if len(tokens) + limit > llm.n_ctx():
+                print(f"[BENCH]   ⚠️ Skipping {prompt_id}: {len(tokens)}+{limit} tokens exceed n_ctx {llm.n_ctx()}")
+                continue
+            encoded.append((prompt_id, tokens, limit))
+
+        for _ in range(warmup):
+            for _, tokens, limit in encoded:
+                run_trial(llm, tokens, min(limit, 16), stop_at_eos)
+
+        records, itl_by_prompt = [], {}
+        with PeakRSS() as rss:
+            for trial in range(trials):
+                for prompt_id, tokens, limit in encoded:
+                    if hasattr(draft, "reset_stats"):
+                        draft.reset_stats()
+                    metrics, itl = run_trial(llm, tokens, limit, stop_at_eos)
+                    record = {"trial": trial, "prompt": prompt_id, **metrics}
+                    if hasattr(draft, "stats") and draft.steps:
+                        record["draft"] = draft.stats()
+                    records.append(record)
+                    itl_by_prompt.setdefault(prompt_id, []).extend(itl)
+        result["peak_rss_mb"] = round(rss.peak / 1024**2, 1)
+
+        result["prompts"] = {}
+        for prompt_id, tokens, _ in encoded:
+            rows = [r for r in records if r["prompt"] == prompt_id]
+            pooled = itl_by_prompt.get(prompt_id, [])
+            result["prompts"][prompt_id] = {
+                "prompt_tokens": len(tokens),
+                "summary": {m: describe_samples([(r["trial"], r[m]) for r in rows]) for m in METRICS},
+                "itl_pooled_ms": {f"p{p}": round(percentile(pooled, p), 2) if pooled else None for p in (50, 95, 99)},
+            }
+        result["trials"] = records
+    except Exception as e:
+        result["error"] = str(e)
+        print(f"[BENCH]   ❌ {name}: {e}")
+    finally:
+        del llm
+        gc.collect()
+        if cfg.get("affinity") and unpinned:
+            machine_engine_handshake.apply_affinity(unpinned)
+    return result
+
+
+def run_suite(model_path, matrix, prompts, trials=DEFAULT_TRIALS, warmup=DEFAULT_WARMUP,
+              max_tokens=DEFAULT_MAX_TOKENS, stop_at_eos=False, root_path=".", verbose=True):
+    report = {
+        "version": RESULT_VERSION,
+        "created": time.strftime("%Y-%m-%d %H:%M:%S"),
+        "machine": machine_info(root_path),
+        "model": model_info(model_path),
+        "settings": {"trials": trials, "warmup": warmup, "max_tokens": max_tokens,
+                     "stop_at_eos": stop_at_eos, "prompts": [p for p, _ in prompts]},
+        "results": [],
+    }
+    for i, (name, cfg) in enumerate(matrix, 1):
+        if verbose:
+            print(f"\n[BENCH] ({i}/{len(matrix)}) {name}")
+        result = bench_config(model_path, name, cfg, prompts, trials=trials, warmup=warmup,
+                              max_tokens=max_tokens, stop_at_eos=stop_at_eos, verbose=verbose)
+        if verbose:
+            print_result(result)
+        report["results"].append(result)
+    return report
+
+
+def _median(result, prompt_id, metric):
+    summary = result["prompts"].get(prompt_id, {}).get("summary", {}).get(metric)
+    return summary["median"] if summary else None
+
+
+def _geomean(values):
+    values = [v for v in values if v]
+    return round(statistics.geometric_mean(values), 3) if values else None
+
+
+def speedups(report, baseline=None):
+    """
+    Median decode/prefill tok/s of every config relative to the baseline config (the first
+    one that ran, or the one named `baseline`), per prompt and as a geometric mean over
+    prompts. Draft acceptance is averaged over the trials that used a draft.
+    """
+    ok = [r for r in report["results"] if not r.get("error")]
+    base = next((r for r in ok if r["name"] == baseline), None) if baseline else (ok[0] if ok else None)
+    if base is None:
+        return None
+    rows = []
+    for result in ok:
+        if result is base:
+            continue
+        prompts = {}
+        for prompt_id in result["prompts"]:
+            ratios = {}
+            for metric in ("decode_tps", "prefill_tps"):
+                before, after = _median(base, prompt_id, metric), _median(result, prompt_id, metric)
+                ratios[metric] = round(after / before, 3) if before and after else None
+            prompts[prompt_id] = ratios
+        drafts = [t["draft"] for t in result.get("trials", []) if t.get("draft")]
+        rows.append({
+            "name": result["name"],
+            "decode": _geomean(p["decode_tps"] for p in prompts.values()),
+            "prefill": _geomean(p["prefill_tps"] for p in prompts.values()),
+            "tokens_per_step": round(statistics.mean(d["tokens_per_step"] for d in drafts if d["tokens_per_step"]), 2)
+            if any(d["tokens_per_step"] for d in drafts) else None,
+            "prompts": prompts,
+        })
+    return {"baseline": base["name"], "configs": rows}
+
+
+def print_speedups(speedup):
+    if not speedup or not speedup["configs"]:
+        return
+    print(f"\n[BENCH] Speedup vs {speedup['baseline']} (median tok/s, geometric mean over prompts)")
+    width = max(len(row["name"]) for row in speedup["configs"])
+    for row in speedup["configs"]:
+        decode = f"{row['decode']:.2f}x" if row["decode"] else "-"
+        prefill = f"{row['prefill']:.2f}x" if row["prefill"] else "-"
+        draft = f" | {row['tokens_per_step']} tok/step drafted" if row["tokens_per_step"] else ""
+        print(f"[BENCH]   {row['name']:<{width}}  NET SPEEDUP {decode} decode | {prefill} prefill{draft}")
+
+
+def _fmt(summary, digits=1, scale=1.0, spread=True):
+    if not summary:
+        return "-"
+    text = f"{summary['median'] * scale:.{digits}f}"
+    if spread and summary["cv"]:
+        text += f" ±{summary['cv'] * 100:.0f}%"
+    return text
+
+
+def print_result(result):
+    if result.get("error"):
+        return
+    for prompt_id, p in result["prompts"].items():
+        s = p["summary"]
+        print(f"[BENCH]   {prompt_id:<22} TTFT {_fmt(s['ttft_s'], 0, 1000)} ms | prefill {_fmt(s['prefill_tps'])} t/s | "
+              f"decode {_fmt(s['decode_tps'])} t/s | ITL p50/p95/p99 "
+              f"{_fmt(s['itl_p50_ms'], spread=False)}/{_fmt(s['itl_p95_ms'], spread=False)}/"
+              f"{_fmt(s['itl_p99_ms'], spread=False)} ms")
+        flagged = {m: v["outliers"] for m, v in s.items() if v and v["outliers"]}
+        if flagged:
+            print(f"[BENCH]   {'':<22} ⚠️ Outlier trials: " + ", ".join(f"{m} {t}" for m, t in flagged.items()))
+    print(f"[BENCH]   Peak RSS {result['peak_rss_mb']:.0f} MB")
+
+
+def default_output(model_path):
+    stem = os.path.splitext(os.path.basename(model_path))[0]
+    return os.path.join(BENCH_DIR, f"bench_{stem}_{time.strftime('%Y%m%d_%H%M%S')}.json")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the local engine over a config matrix and prompt sets")
+    parser.add_argument("--model", help="GGUF path, file in models/ or MODEL_MAP key (default: the index's pick)")
+    parser.add_argument("--set", dest="sets", action="append", type=parse_set, default=[], metavar="KEY=V1,V2",
+                        help="Config values to sweep (repeatable; combinations are crossed)")
+    parser.add_argument("--matrix", help="JSON list of config overrides, each with an optional 'name'")
+    parser.add_argument("--baseline", help="Config name the speedups are relative to (default: the first)")
+    parser.add_argument("--no-tuned", action="store_true", help="Start from the golden handshake config, not a tuned profile")
+    parser.add_argument("--prompts", default="short",
+                        help=f"Comma-separated built-in sets ({', '.join(PROMPT_SETS)}) and/or JSONL files")
+    parser.add_argument("--trials", type=int, default=DEFAULT_TRIALS)
+    parser.add_argument("--warmup", type=int, default=DEFAULT_WARMUP, help="Untimed passes over the prompts per config")
+    parser.add_argument("--max-tokens", type=int, default=DEFAULT_MAX_TOKENS)
+    parser.add_argument("--stop-at-eos", action="store_true", help="End at EOS instead of decoding a fixed length")
+    parser.add_argument("-o", "--output", help="Result JSON (default: logs/bench/bench_<model>_<time>.json)")
+    args = parser.parse_args(argv)
+
+    root_path = os.path.dirname(os.path.abspath(__file__))
+    models_dir = os.path.join(root_path, "models")
+    if args.model:
+        from vox_server import resolve_model_path
+        model_path = resolve_model_path(args.model, models_dir)
+    else:
+        import model_index
+        name = model_index.pick_default(model_index.scan(models_dir))
+        model_path = os.path.join(models_dir, name) if name else None
+    if not model_path:
+        sys.exit(f"[BENCH] ❌ Model not found: {args.model or 'no readable GGUF in models/'}")
+
+    try:
+        prompts = load_prompts([s.strip() for s in args.prompts.split(",") if s.strip()])
+    except ValueError as e:
+        sys.exit(f"[BENCH] ❌ {e}")
+    if not prompts:
+        sys.exit("[BENCH] ❌ No prompts to run.")
+
+    import hardware_probe
+    import machine_engine_handshake
+    os.environ["GGML_BACKEND_SEARCH_PATH"] = root_path
+    backends = hardware_probe.load_backends(root_path)
+    if backends.get("error"):
+        print(f"[BENCH] ⚠️ Backend load warning: {backends['error']}")
+    _, _, base = machine_engine_handshake.get_hardware_config(model_path, tuned=not args.no_tuned)
+    matrix = resolve_affinity(build_matrix(base, args.sets, args.matrix), hardware_probe.get_probe(root_path)["topology"])
+
+    print(f"[BENCH] {os.path.basename(model_path)} | {len(matrix)} config(s) x {len(prompts)} prompt(s) x "
+          f"{args.trials} trial(s), {args.warmup} warmup")
+    report = run_suite(model_path, matrix, prompts, trials=args.trials, warmup=args.warmup,
+                       max_tokens=args.max_tokens, stop_at_eos=args.stop_at_eos, root_path=root_path)
+    report["speedup"] = speedups(report, args.baseline)
+    if args.baseline and report["speedup"] is None:
+        print(f"[BENCH] ⚠️ No successful config named '{args.baseline}'; no speedups computed.")
+    print_speedups(report["speedup"])
+
+    output = args.output or default_output(model_path)
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2)
+    print(f"\n[BENCH] ✅ Results written to {output}")
+
+
+if __name__ == "__main__":
+    main()
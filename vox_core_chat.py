@@ -1,9 +1,46 @@
 import sys
 import os
 import time
-import requests
 import json
+import threading
+import contextlib
 from config import API_KEY, POD_ID, MODEL_MAP
+from chat_backends import LocalBackend, CloudBackend
+from hedging import HedgedStream
+from backend_router import BackendRouter, estimate_tokens
+from telemetry import record_event
+import model_index
+import startup_profile
+import vox_trace
+import traffic_recorder
+try:
+    from config import LOCAL_CACHE_SIZE
+except ImportError:
+    LOCAL_CACHE_SIZE = 2
+try:
+    from config import HYBRID_LOCAL_MODEL
+except ImportError:
+    HYBRID_LOCAL_MODEL = None # None = smallest GGUF found in models/
+try:
+    from config import HEDGE_ENABLED, HEDGE_DELAY
+except ImportError:
+    HEDGE_ENABLED, HEDGE_DELAY = False, 0.5
+try:
+    from config import CLOUD_CONNECT_TIMEOUT, CLOUD_FIRST_TOKEN_TIMEOUT, CLOUD_STALL_TIMEOUT
+except ImportError:
+    CLOUD_CONNECT_TIMEOUT, CLOUD_FIRST_TOKEN_TIMEOUT, CLOUD_STALL_TIMEOUT = 10, 60, 15
+try:
+    from config import SPECULATIVE_DRAFT
+except ImportError:
+    SPECULATIVE_DRAFT = None # "lookup" or a small GGUF in models/ (same tokenizer family)
+try:
+    from config import PREFETCH_MODEL
+except ImportError:
+    PREFETCH_MODEL = True # Read the GGUF into the page cache while the engine starts
+try:
+    from config import ROUTER_MAX_COST
+except ImportError:
+    ROUTER_MAX_COST = None # AUTO mode: max expected USD per request (None = fastest wins)
 
 # ANSI Colors
 CYAN = "\033[96m"
@@ -27,16 +64,28 @@ def launch_chat():
     """)
     print(f"     VOX-AI UNIVERSAL ENGINE | {YELLOW}BOOT{CYAN}")
     print(f"============================================{RESET}")
-    print(" [1] LOCAL (GPU/CPU) | [2] CLOUD (RunPod)")
+    print(" [1] LOCAL (GPU/CPU) | [2] CLOUD (RunPod) | [3] HYBRID (Local now, Cloud when ready)")
+    print(" [4] AUTO (Local + Cloud, routed per request by speed and cost)")
     
+    startup_profile.mark("first prompt")
+    startup_profile.report("Boot to first prompt")
     choice = input("Select Environment: ").strip()
     use_cloud = choice == "2"
+    use_auto = choice == "4"
+    use_hybrid = choice == "3" or use_auto # AUTO boots the cloud like HYBRID but keeps both
 
     # [SECTION] Model Selection
+    # Menu details come from the GGUF headers (cached in model_index.json, re-read only when a file changes)
+    base_dir = os.path.dirname(os.path.abspath(__file__))
+    models_dir = os.path.join(base_dir, "models")
+    index = model_index.scan(models_dir)
+    model_index.print_reconcile(model_index.reconcile(MODEL_MAP, index))
+    model_map = model_index.menu_map(MODEL_MAP, index)
+
     print("\n--- Available Brains ---")
-    keys = list(MODEL_MAP.keys())
+    keys = list(model_map.keys())
     for i, key in enumerate(keys):
-        print(f" [{i+1}] {key}")
+        print(f" [{i+1}] {model_index.menu_label(key, model_map[key], index)}")
     
     try:
         m_choice = int(input("\nSelect Model: ")) - 1
@@ -44,19 +93,67 @@ def launch_chat():
     except:
         print(f"{RED}[ERROR] Invalid selection.{RESET}")
         sys.exit(1)
+    t_selected = time.time() # Model selection -> first token is the startup metric
+    startup_load_s = None    # Selection -> engine online (the wait at the first prompt is not counted)
 
     # [SECTION] Engine Logic
     llm = None
+    model_cache = None
+    prefetcher = None
     cloud_driver = None
+    cloud_boot = None # Background boot (HYBRID mode only)
+    cloud_rented = False # A pod may be billing: every exit path must terminate it
     target_cloud_id = None # Variable to store resolved ID
+    router = None
+    auto_cloud = False # AUTO: cloud pod joined the routing pool
     
-    if use_cloud:
+    local_file = model_map[selected_model]
+
+    if use_hybrid:
+        hybrid_model_key = selected_model
+        try:
+            from runpod_interface import RunPodDriver
+            cloud_driver = RunPodDriver(API_KEY, POD_ID)
+            target_cloud_id = get_cloud_model_id(local_file)
+            if not target_cloud_id:
+                print(f"{RED}[ABORT] No valid Cloud ID provided.{RESET}")
+                sys.exit(1)
+
+            # Rent and boot in the background; answer locally until the pod reports ready
+            cloud_boot = BackgroundCloudBoot(cloud_driver, target_cloud_id)
+            cloud_rented = True
+            print(f"\n[HYBRID] ☁️  {CYAN}Cloud pod booting in the background...{RESET}")
+        except Exception as e:
+            print(f"[ERROR] Cloud init failed: {e}")
+            cloud_boot = None
+
+        hybrid_file = None if use_auto else pick_hybrid_local_file(models_dir, index)
+        if use_auto:
+            # The selected model runs on both sides; each request goes where it finishes first
+            router = BackendRouter(max_cost=ROUTER_MAX_COST).attach()
+            print(f"[AUTO] 🔀 Routing between local {local_file} and the cloud once it is up.")
+        elif hybrid_file:
+            local_file = hybrid_file
+            selected_model = f"{local_file} (local, cloud booting)"
+            print(f"[HYBRID] 🛡️ Serving from local {local_file} while the cloud boots.")
+        elif cloud_boot:
+            # Nothing to serve locally: behave like CLOUD mode and block on the boot
+            print(f"[HYBRID] ⚠️ {YELLOW}No local GGUF available. Waiting for cloud...{RESET}")
+            cloud_boot.thread.join()
+            if not cloud_boot.ok:
+                print(f"{RED}[ERROR] Cloud boot failed and no local model is available.{RESET}")
+                release_cloud(cloud_boot, cloud_driver)
+                sys.exit(1)
+            use_cloud = True
+            cloud_boot = None
+
+    if use_cloud and not use_hybrid:
         try:
             from runpod_interface import RunPodDriver
             cloud_driver = RunPodDriver(API_KEY, POD_ID)
             
             # Resolve the specific Cloud ID using the "Phone Book"
-            local_filename_for_mapping = MODEL_MAP[selected_model]
+            local_filename_for_mapping = model_map[selected_model]
             target_cloud_id = get_cloud_model_id(local_filename_for_mapping)
             
             if not target_cloud_id:
@@ -64,6 +161,7 @@ def launch_chat():
                 sys.exit(1)
             
             # Try to switch/boot the cloud pod with resolved ID
+            cloud_rented = True
             if cloud_driver.switch_model(target_cloud_id):
                 print(f"\n[SYSTEM] ☁️  {GREEN}Cloud Link Established.{RESET}")
             else:
@@ -75,14 +173,7 @@ def launch_chat():
 
     # [SECTION] Local Fallback
     if not use_cloud:
-        # Define the local filename from the map
-        local_file = MODEL_MAP[selected_model]
-        
-        # 1. Construct Absolute Path to avoid relative path errors
-        base_dir = os.path.dirname(os.path.abspath(__file__))
-        models_dir = os.path.join(base_dir, "models")
-        
-        # 2. Normalize Slashes for Windows compatibility
+        # Normalize Slashes for Windows compatibility (absolute path avoids relative path errors)
         model_path = os.path.join(models_dir, local_file).replace("\\", "/")
         
         print(f"\n[LOCAL] 🛡️ {CYAN}Loading GGUF: {model_path}...{RESET}")
@@ -90,67 +181,82 @@ def launch_chat():
         if not os.path.exists(model_path):
             print(f"{RED}[ERROR] ❌ File not found: {model_path}{RESET}")
             print("[HINT] Check if the file is in the 'models' folder and named correctly.")
+            if cloud_rented: release_cloud(cloud_boot, cloud_driver)
             sys.exit(1)
 
+        # Pull the weights into the page cache while the handshake and backend load run
+        if PREFETCH_MODEL:
+            from gguf_prefetch import start_prefetch
+            prefetcher = start_prefetch(model_path)
+
         try:
             # [HANDSHAKE] Import and Run Hardware Check
             import machine_engine_handshake
-            import ctypes # Required for manual backend loading
-            mode, phys_cores, cfg = machine_engine_handshake.get_hardware_config()
+            import hardware_probe
+            with startup_profile.stage("handshake"):
+                mode, phys_cores, cfg = machine_engine_handshake.get_hardware_config(model_path)
+            import memory_planner
+            memory_planner.check_plan(cfg, model_path) # Refuse rather than page
             
             # Apply Environment Overrides from Handshake
             root_path = os.path.abspath(".")
             os.environ["GGML_VK_FORCE_BUSY_WAIT"] = cfg["busy_wait"]
             os.environ["GGML_BACKEND_SEARCH_PATH"] = root_path
+            if cfg.get("affinity") and machine_engine_handshake.apply_affinity(cfg["affinity"]):
+                print(f"[LOCAL] 📌 Inference threads pinned to CPUs {cfg['affinity']}.")
             
             # [CRITICAL] Manually Load GGML Backend (Fixes 'no backends loaded' error)
+            # The probe picks the CPU kernel build for this ISA instead of ggml_backend_load_all
             try:
-                # Try loading ggml.dll to register backends (Vulkan/CPU)
-                ggml = ctypes.CDLL(os.path.join(root_path, "ggml.dll"))
-                if hasattr(ggml, 'ggml_backend_load_all'): 
-                    ggml.ggml_backend_load_all()
-                print(f"[LOCAL] 🟢 Backend drivers loaded manually.")
+                with startup_profile.stage("backend DLL load"):
+                    backends = hardware_probe.load_backends(root_path)
+                if backends.get("error"):
+                    raise RuntimeError(backends["error"])
+                cpu_kernel = backends["cpu_variant"] or "auto-selected"
+                gpu = ", ".join(backends["gpu"]) or "none"
+                print(f"[LOCAL] 🟢 Backend drivers loaded manually (CPU: {cpu_kernel} | GPU: {gpu}).")
             except Exception as e:
                 print(f"[LOCAL] ⚠️ Backend load warning: {e}")
             
+            # Speculative decoding (not for the HYBRID stand-in: it is already the small model)
+            if SPECULATIVE_DRAFT and (use_auto or not use_hybrid) and os.path.basename(SPECULATIVE_DRAFT) != os.path.basename(model_path):
+                cfg["draft_model"] = SPECULATIVE_DRAFT
+                print(f"[LOCAL] 🎯 Speculative decoding: draft = {SPECULATIVE_DRAFT}")
+
             # Standard Llama Initialization with Handshake Config
             print(f"[LOCAL] 🛠️ Initializing Llama Engine ({mode})...")
-            from llama_cpp import Llama
-            llm = Llama(
-                model_path=model_path,
-                n_ctx=4096,
-                verbose=True,
-                
-                # INJECTING CONFIG FROM HANDSHAKE
-                n_gpu_layers=cfg['n_gpu_layers'],
-                n_threads=cfg['n_threads'],
-                n_threads_batch=cfg['n_threads_batch'],
-                n_batch=cfg['n_batch'],
-                flash_attn=cfg['flash_attn'],
-                use_mlock=cfg['use_mlock'],
-                cache_type_k=cfg['cache_type_k'],
-                cache_type_v=cfg['cache_type_v']
-            )
+            from model_cache import ModelResidencyManager
+            model_cache = ModelResidencyManager(max_models=LOCAL_CACHE_SIZE)
+            with startup_profile.stage("Llama init"):
+                llm, _ = model_cache.acquire(model_path, cfg) # n_ctx from the memory plan
             print(f"[LOCAL] {GREEN}✅ Engine Online.{RESET}")
+            startup_load_s = time.time() - t_selected
+            report_prefetch(prefetcher)
+            startup_profile.report("Local engine startup")
         except Exception as e:
             print(f"{RED}[ERROR] Failed to load local model: {e}{RESET}")
+            if cloud_rented: release_cloud(cloud_boot, cloud_driver)
             sys.exit(1)
 
     # [SECTION] The Chat Loop
     print("\n" + "="*40)
     print(f"VoxAI Online. Model: {selected_model}")
-    print("Commands: 'exit', 'swap' (Cloud Only)")
+    print("Commands: 'exit', 'swap', 'hedge' (race Cloud vs Local)")
+    if traffic_recorder.enabled:
+        redacted = " (content redacted)" if traffic_recorder.redact else ""
+        print(f"[RECORD] 📼 Recording turns to {traffic_recorder.path}{redacted}")
     print("="*40 + "\n")
 
     messages = []
+    hedging = HEDGE_ENABLED
+    startup_ttft = None
 
     while True:
         try:
             user_input = input(f"{CYAN}You:{RESET} ").strip()
             if user_input.lower() == "exit":
-                if use_cloud and cloud_driver:
-                    print(f"{YELLOW}[SYSTEM] Shutting down Cloud Resources...{RESET}")
-                    cloud_driver.terminate_pod()
+                if cloud_rented and cloud_driver:
+                    release_cloud(cloud_boot, cloud_driver)
                 else:
                     print(f"{YELLOW}[LOCAL] Shutting down Engine...{RESET}")
                 break
@@ -162,9 +268,11 @@ def launch_chat():
                 
                 # 1. Show Menu
                 print("\n--- Available Brains ---")
-                keys = list(MODEL_MAP.keys())
+                index = model_index.scan(models_dir)
+                model_map = model_index.menu_map(MODEL_MAP, index)
+                keys = list(model_map.keys())
                 for i, key in enumerate(keys):
-                    print(f" [{i+1}] {key}")
+                    print(f" [{i+1}] {model_index.menu_label(key, model_map[key], index)}")
                 
                 try:
                     selection = input("\nSelect Model (0 to cancel): ").strip()
@@ -176,7 +284,10 @@ def launch_chat():
                         
                         # --- CLOUD SWAP LOGIC ---
                         if use_cloud and cloud_driver:
-                            local_filename = MODEL_MAP[new_model_key]
+                            if cloud_boot and not cloud_boot.done:
+                                print(f"{YELLOW}[HYBRID] Cloud is still booting. Swap the local model instead.{RESET}")
+                                continue
+                            local_filename = model_map[new_model_key]
                             new_cloud_id = get_cloud_model_id(local_filename)
                             
                             if new_cloud_id:
@@ -190,41 +301,55 @@ def launch_chat():
                         
                         # --- LOCAL SWAP LOGIC ---
                         else:
-                            model_filename = MODEL_MAP[new_model_key]
+                            model_filename = model_map[new_model_key]
                             new_path = os.path.join(models_dir, model_filename)
                             
                             if not os.path.exists(new_path):
                                 print(f"{RED}[ERROR] File not found: {new_path}{RESET}")
                                 continue
 
-                            print(f"\n[LOCAL] 🔄 Unloading current model...")
-                            if 'llm' in locals():
-                                del llm
-                                import gc
-                                gc.collect()
-                            
-                            print(f"[LOCAL] 🛡️ Loading New GGUF: {new_model_key}...")
-                            
-                            # Re-run handshake to be safe (or reuse cfg)
-                            import machine_engine_handshake
-                            _, _, cfg = machine_engine_handshake.get_hardware_config()
-
-                            print(f"[LOCAL] 🛠️ Initializing Llama Engine...")
-                            from llama_cpp import Llama
-                            llm = Llama(
-                                model_path=new_path,
-                                n_ctx=4096,
-                                verbose=True,
-                                n_gpu_layers=cfg['n_gpu_layers'],
-                                n_threads=cfg['n_threads'],
-                                n_threads_batch=cfg['n_threads_batch'],
-                                n_batch=cfg['n_batch'],
-                                flash_attn=cfg['flash_attn'],
-                                use_mlock=cfg['use_mlock'],
-                                cache_type_k=cfg['cache_type_k'],
-                                cache_type_v=cfg['cache_type_v']
-                            )
+                            t_selected = time.time()
+                            # Release our reference so an evicted engine can actually be freed
+                            llm = None
+                            if model_cache is None:
+                                from model_cache import ModelResidencyManager
+                                model_cache = ModelResidencyManager(max_models=LOCAL_CACHE_SIZE)
+
+                            # Reuse the boot handshake config (plus the new model's tuned profile, if any,
+                            # and a memory plan for its size); a resident engine comes back instantly
+                            swap_cfg = model_cache.resident_config(new_path)
+                            if swap_cfg is None:
+                                print(f"[LOCAL] 🛡️ Loading New GGUF: {new_model_key}...")
+                                if prefetcher:
+                                    prefetcher.cancel()
+                                if PREFETCH_MODEL:
+                                    from gguf_prefetch import start_prefetch
+                                    prefetcher = start_prefetch(new_path)
+                                swap_cfg = dict(cfg)
+                                from engine_autotune import get_tuned_profile
+                                profile = get_tuned_profile(new_path)
+                                if profile:
+                                    swap_cfg.update(profile["config"])
+                                    print(f"[LOCAL] 🎛️ Using tuned profile for {model_filename}.")
+                                import memory_planner
+                                # Free the cache slot first, then plan against what is really free;
+                                # engines the cache keeps stay resident and their RAM stays taken
+                                model_cache.make_room()
+                                mem_plan = memory_planner.plan_memory(new_path, swap_cfg, unified_memory=mode.startswith("APU"))
+                                if mem_plan:
+                                    memory_planner.apply_plan(swap_cfg, mem_plan)
+                                    print(f"[LOCAL] 🧮 Memory: {memory_planner.describe(mem_plan)}")
+                                    memory_planner.check_plan(swap_cfg, new_path)
+                            with vox_trace.span("local.swap", "startup", model=model_filename) as s:
+                                llm, cached = model_cache.acquire(new_path, swap_cfg)
+                                s.set(cached=cached)
+                            if cached:
+                                print(f"[LOCAL] ⚡ Restored {new_model_key} from memory cache.")
+                            else:
+                                report_prefetch(prefetcher)
+                            startup_load_s = time.time() - t_selected
                             selected_model = new_model_key
+                            local_file = model_filename
                             print(f"[LOCAL] {GREEN}✅ Swap Complete. Engine Online.{RESET}")
                             print("="*40 + "\n")
 
@@ -236,105 +361,221 @@ def launch_chat():
                 
                 continue
 
+            if user_input.lower() == "hedge":
+                hedging = not hedging
+                state = "ON" if hedging else "OFF"
+                print(f"{YELLOW}[SYSTEM] Hedged generation {state} (delay {HEDGE_DELAY}s).{RESET}")
+                if hedging and not (llm and cloud_driver):
+                    print(f"{YELLOW}[SYSTEM] Hedging needs both a local engine and a cloud pod (HYBRID mode).{RESET}")
+                continue
+
+            # [HYBRID] Cut over to the cloud on the first turn after the pod reports ready
+            if cloud_boot and cloud_boot.done:
+                if cloud_boot.ok and use_auto:
+                    auto_cloud = True
+                    print(f"[AUTO] ☁️  {GREEN}Cloud Link Established. {target_cloud_id} joins the routing pool.{RESET}")
+                elif cloud_boot.ok:
+                    use_cloud = True
+                    selected_model = hybrid_model_key
+                    print(f"[HYBRID] ☁️  {GREEN}Cloud Link Established. Switching to {target_cloud_id}.{RESET}")
+                else:
+                    print(f"[HYBRID] ⚠️ {YELLOW}Cloud boot failed. Staying on local hardware.{RESET}")
+                    release_cloud(cloud_boot, cloud_driver) # A pod rented before the failure still bills
+                    cloud_rented = False
+                cloud_boot = None
+
             messages.append({"role": "user", "content": user_input})
 
+            # [AUTO] Pick the backend expected to finish first within the cost ceiling
+            route = None
+            prompt_tokens = estimate_tokens(messages)
+            if router and llm:
+                available = ["local"]
+                if auto_cloud and cloud_driver.new_pod_id:
+                    available.append("cloud")
+                    router.set_cost("cloud", cloud_driver.pod_cost)
+                route = router.choose(prompt_tokens, 512, available=available)
+                if len(available) > 1:
+                    est = {e["backend"]: e for e in route["estimates"]}[route["backend"]]
+                    print(f"{YELLOW}[AUTO] -> {route['backend']}: {route['reason']} "
+                          f"(~{est['time_s']:.1f}s, ${est['cost_usd']:.4f}){RESET}")
+
             print(f"{GREEN}VoxAI:{RESET} ", end="", flush=True)
 
-            if use_cloud and cloud_driver and cloud_driver.new_pod_id:
+            cloud_routed = route["backend"] == "cloud" if route else use_cloud
+            if cloud_routed and cloud_driver and cloud_driver.new_pod_id:
                 # CLOUD GENERATION
-                url = f"https://{cloud_driver.new_pod_id}-8000.proxy.runpod.net/v1/chat/completions"
-                payload = {
-                    "model": target_cloud_id, 
-                    "messages": messages,
-                    "max_tokens": 512,
-                    "stream": True # CRITICAL: Enable streaming response
-                }
-                headers = {"Authorization": f"Bearer {API_KEY}"}
-                
-                try:
-                    response = requests.post(url, json=payload, headers=headers, stream=True)
-                    full_response = ""
-                    
-                    # Timing
-                    t0 = time.time()
-                    token_count = 0
-                    
-                    for chunk in response.iter_lines():
-                        if chunk:
-                            try:
-                                decoded = chunk.decode('utf-8')
-                                if decoded.startswith("data: "):
-                                    decoded = decoded[6:] # Robust stripping
-                                
-                                if decoded.strip() == "[DONE]":
-                                    continue
-                                
-                                j = json.loads(decoded)
-                                if 'choices' in j and len(j['choices']) > 0:
-                                    delta = j['choices'][0].get('delta', {})
-                                    token = delta.get('content', '')
-                                    if token:
-                                        print(token, end="", flush=True)
-                                        full_response += token
-                                        token_count += 1
-                            except: pass # Silent fail on bad chunks is fine for stream
-                    
-                    dt = time.time() - t0
-                    if token_count > 0 and dt > 0:
-                        speed = token_count / dt
-                        balance = cloud_driver.get_balance() or 0.0
-                        cost = cloud_driver.pod_cost or 0.0
-                        print(f"\n{YELLOW}({speed:.2f} t/s) | Balance: ${float(balance):.2f} | Cost: ${float(cost):.3f}/hr{RESET}")
-                    else:
-                         print() # Newline
-
-                    messages.append({"role": "assistant", "content": full_response})
-                except Exception as e:
-                    print(f"\n{RED}[Cloud Error] {e}{RESET}")
-
+                backend = CloudBackend(cloud_driver, target_cloud_id, API_KEY,
+                                       connect_timeout=CLOUD_CONNECT_TIMEOUT,
+                                       first_token_timeout=CLOUD_FIRST_TOKEN_TIMEOUT,
+                                       stall_timeout=CLOUD_STALL_TIMEOUT)
+                if hedging and llm:
+                    # Race the local engine; whichever speaks first wins the turn
+                    backend = HedgedStream(backend, LocalBackend(llm), hedge_delay=HEDGE_DELAY)
             elif llm:
                 # LOCAL GENERATION
-                try:
-                    stream = llm.create_chat_completion(
-                        messages=messages,
-                        max_tokens=512,
-                        stream=True
-                    )
-                    full_response = ""
-                    
-                    # Timing
-                    t0 = time.time()
-                    token_count = 0
-                    
-                    for chunk in stream:
-                        if 'content' in chunk['choices'][0]['delta']:
-                            token = chunk['choices'][0]['delta']['content']
+                backend = LocalBackend(llm)
+            else:
+                print(f"\n{RED}[ERROR] No engine available.{RESET}")
+                messages.pop()
+                continue
+
+            full_response = ""
+            served_by = backend.name
+
+            draft = getattr(llm, "draft_model", None) if llm is not None else None
+            if hasattr(draft, "reset_stats"):
+                draft.reset_stats() # Per-turn acceptance figures
+
+            # Timing
+            t0 = time.time()
+            ttft = None
+            token_count = 0
+            turn = traffic_recorder.start("vox_core_chat", messages, max_tokens=512)
+            turn_error = None
+
+            try:
+                with router.track(backend.name) if router else contextlib.nullcontext():
+                    for token in backend.stream_chat(messages, max_tokens=512):
+                        if ttft is None:
+                            ttft = time.time() - t0
+                            if startup_load_s is not None and backend.name == "local":
+                                startup_ttft = startup_load_s + ttft
+                                startup_load_s = None
+                        print(token, end="", flush=True)
+                        full_response += token
+                        token_count += 1
+                        turn.token()
+                served_by = backend.name
+            except Exception as e:
+                served_by = backend.name
+                if served_by == "cloud" and llm:
+                    # [FAILOVER] Keep what the cloud wrote and let the local engine finish the sentence
+                    print(f"\n{YELLOW}[FAILOVER] ⚠️ Cloud stream failed ({e}). Continuing on local engine...{RESET}")
+                    record_event("failover", source="cloud", target="local", reason=str(e),
+                                 model=target_cloud_id, partial_tokens=token_count,
+                                 elapsed_s=round(time.time() - t0, 3))
+                    vox_trace.instant("failover", "generate", reason=str(e), partial_tokens=token_count)
+                    try:
+                        local = LocalBackend(llm)
+                        for token in local.continue_chat(messages, full_response, max_tokens=max(1, 512 - token_count)):
+                            if ttft is None: ttft = time.time() - t0
                             print(token, end="", flush=True)
                             full_response += token
                             token_count += 1
-                    
-                    dt = time.time() - t0
-                    if token_count > 0 and dt > 0:
-                         print(f"\n{YELLOW}({token_count / dt:.2f} t/s){RESET}")
+                            turn.token()
+                        served_by = "cloud+local"
+                    except Exception as le:
+                        print(f"\n{RED}[Local Error] {le}{RESET}")
+                        turn_error = le
+                else:
+                    turn_error = e
+                    label = "Cloud Error" if served_by == "cloud" else "Local Error"
+                    print(f"\n{RED}[{label}] {e}{RESET}")
+                    if served_by == "cloud":
+                        record_event("stream_error", source="cloud", reason=str(e),
+                                     model=target_cloud_id, partial_tokens=token_count)
+
+            dt = time.time() - t0
+            if startup_ttft is not None:
+                print(f"\n{CYAN}[LOCAL] ⏱️ Model selection -> first token: {startup_ttft:.2f}s{RESET}", end="")
+                record_event("startup", model=selected_model, selection_to_first_token_s=round(startup_ttft, 3),
+                             prefetch=prefetcher.report(residency=False) if prefetcher else None)
+                startup_ttft = None
+            if token_count > 0 and dt > 0:
+                speed = token_count / dt
+                if isinstance(backend, HedgedStream) and backend.winner:
+                    print(f"\n{YELLOW}({speed:.2f} t/s) | Hedge winner: {backend.name} after {backend.first_token_s:.2f}s{RESET}")
+                elif served_by == "cloud":
+                    balance = cloud_driver.get_balance() or 0.0
+                    cost = cloud_driver.pod_cost or 0.0
+                    print(f"\n{YELLOW}({speed:.2f} t/s) | Balance: ${float(balance):.2f} | Cost: ${float(cost):.3f}/hr{RESET}")
+                else:
+                    spec = draft.stats() if hasattr(draft, "stats") else None
+                    if spec and spec["steps"]:
+                        print(f"\n{YELLOW}({speed:.2f} t/s) | Draft acceptance: {spec['acceptance_rate']:.0%} | "
+                              f"{spec['tokens_per_step']} tok/step (K={spec['k']}){RESET}")
                     else:
-                         print() # Newline
+                        print(f"\n{YELLOW}({speed:.2f} t/s){RESET}")
+            else:
+                print() # Newline
 
-                    messages.append({"role": "assistant", "content": full_response})
-                except Exception as e:
-                    print(f"\n{RED}[Local Error] {e}{RESET}")
+            record_event("turn", backend=served_by, ttft_s=round(ttft, 3) if ttft is not None else None,
+                         tokens=token_count, duration_s=round(dt, 3), prompt_tokens=prompt_tokens,
+                         error=str(turn_error) if turn_error else None)
+            turn.finish(backend=served_by, model=target_cloud_id if served_by.startswith("cloud") else local_file,
+                        error=turn_error)
+
+            # Partial replies are kept so the history matches what the user saw
+            if full_response:
+                messages.append({"role": "assistant", "content": full_response})
 
         except KeyboardInterrupt:
             print("\n[SYSTEM] Interrupted. Exiting...")
-            if use_cloud and cloud_driver:
-                print(f"{YELLOW}[SYSTEM] Shutting down Cloud Resources...{RESET}")
-                # Use a small try-except to ensure we don't hang if network is down
-                try:
-                    cloud_driver.terminate_pod()
-                except Exception as e:
-                    print(f"{RED}[ERROR] Failed to terminate pod on exit: {e}{RESET}")
+            if cloud_rented and cloud_driver:
+                release_cloud(cloud_boot, cloud_driver)
             break
 
 # [SECTION] Helper Functions
+class BackgroundCloudBoot:
+    """Rents and boots the cloud pod on a worker thread while the local engine answers."""
+
+    def __init__(self, driver, model_id):
+        self.driver = driver
+        self.model_id = model_id
+        self.ok = None
+        self.thread = threading.Thread(target=self._run, name="vox-cloud-boot", daemon=True)
+        self.thread.start()
+
+    def _run(self):
+        try:
+            self.ok = self.driver.switch_model(self.model_id, interactive=False)
+        except Exception as e:
+            print(f"\n[HYBRID] ⚠️ Cloud boot crashed: {e}")
+            self.ok = False
+
+    @property
+    def done(self):
+        return not self.thread.is_alive()
+
+    def cancel(self, timeout=30):
+        """Stops a pending boot so the caller can safely terminate the pod."""
+        if not self.done:
+            print(f"{YELLOW}[HYBRID] Cancelling pending cloud boot...{RESET}")
+            self.driver.cancel_boot()
+            self.thread.join(timeout)
+
+def release_cloud(cloud_boot, cloud_driver):
+    """Cancels a pending boot, then terminates whatever pod it may already have rented."""
+    if cloud_boot:
+        cloud_boot.cancel()
+    if cloud_driver:
+        print(f"{YELLOW}[SYSTEM] Shutting down Cloud Resources...{RESET}")
+        # Use a small try-except to ensure we don't hang if network is down
+        try:
+            cloud_driver.terminate_pod()
+        except Exception as e:
+            print(f"{RED}[ERROR] Failed to terminate pod on exit: {e}{RESET}")
+
+def report_prefetch(prefetcher):
+    if prefetcher is None:
+        return
+    from gguf_prefetch import describe
+    print(f"[LOCAL] 📥 Prefetch: {describe(prefetcher.report())}")
+
+def pick_hybrid_local_file(models_dir, index=None):
+    """
+    Chooses the local GGUF that answers while the cloud boots:
+    HYBRID_LOCAL_MODEL from config if set, otherwise the smallest readable GGUF on disk.
+    """
+    if HYBRID_LOCAL_MODEL:
+        name = MODEL_MAP.get(HYBRID_LOCAL_MODEL, HYBRID_LOCAL_MODEL)
+        if os.path.exists(os.path.join(models_dir, name)):
+            return name
+        print(f"{YELLOW}[HYBRID] Configured local model not found: {name}{RESET}")
+
+    return model_index.smallest(index if index is not None else model_index.scan(models_dir))
+
 def get_cloud_model_id(local_filename):
     """
     Resolves the Hugging Face ID from the local filename using known_models.json.
@@ -374,4 +615,6 @@ def get_cloud_model_id(local_filename):
     return new_id
 
 if __name__ == "__main__":
+    if "--profile-startup" in sys.argv:
+        startup_profile.enable()
     launch_chat()
\ No newline at end of file
@@ -0,0 +1,338 @@
+import os
+import sys
+import time
+import uuid
+import asyncio
+import argparse
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from async_http import serve, send_json, send_error, SSEWriter, HTTPError, watch_disconnect
+
+# ==========================================
+# VOX LOCAL SERVER
+# ==========================================
+# OpenAI-compatible endpoints over one loaded llama.cpp engine, so every tool on the box
+# shares a single model load. Point RUNPOD_BASE_URL at http://127.0.0.1:8000/v1 and
+# standalone_chat.py / remote_client.py talk to it exactly as they talk to the cloud pod.
+
+DEFAULT_HOST = "127.0.0.1"
+DEFAULT_PORT = 8000
+DEFAULT_MAX_TOKENS = 512
+
+# Sampling fields forwarded to llama.cpp as-is
+SAMPLING_FIELDS = ("temperature", "top_p", "top_k", "min_p", "stop", "seed",
+                   "presence_penalty", "frequency_penalty", "repeat_penalty")
+
+# field: (accepted types, lowest, highest); None = unbounded
+_NUMBER = (int, float)
+FIELD_LIMITS = {
+    "max_tokens": ((int,), 1, None),
+    "temperature": (_NUMBER, 0.0, 2.0),
+    "top_p": (_NUMBER, 0.0, 1.0),
+    "top_k": ((int,), 0, None),
+    "min_p": (_NUMBER, 0.0, 1.0),
+    "seed": ((int,), None, None),
+    "presence_penalty": (_NUMBER, -2.0, 2.0),
+    "frequency_penalty": (_NUMBER, -2.0, 2.0),
+    "repeat_penalty": (_NUMBER, 0.0, None),
+}
+
+
+class VoxServer:
+    """
+    Routes HTTP requests to a single engine. Decode runs on one dedicated worker thread,
+    so requests queue FIFO instead of fighting over the llama context.
+    """
+
+    def __init__(self, engine, model_name, api_key=None, models_dir="./models", scheduler=None):
+        self.engine = engine      # VoxAPI instance (owns the Llama)
+        self.scheduler = scheduler # Optional BatchScheduler: concurrent requests share decode steps
+        self.model_name = model_name
+        self.api_key = api_key
+        self.models_dir = models_dir
+        self.started = time.time()
+        self.active = 0
+        self.executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="vox-decode")
+
+    # --- ROUTING ---
+    async def handle(self, request, reader, writer):
+        if self.api_key and request.path != "/health":
+            if request.headers.get("authorization", "") != f"Bearer {self.api_key}":
+                raise HTTPError(401, "Invalid API key")
+
+        route = (request.method, request.path)
+        if route == ("GET", "/health"):
+            await send_json(writer, 200, {
+                "status": "ok",
+                "model": self.model_name,
+                "active_requests": self.active,
+                "uptime_s": round(time.time() - self.started, 1),
+            })
+        elif route in (("GET", "/v1/models"), ("GET", "/models")):
+            await send_json(writer, 200, {
+                "object": "list",
+                "data": [{"id": self.model_name, "object": "model", "created": int(self.started), "owned_by": "vox-local"}],
+            })
+        elif route in (("POST", "/v1/chat/completions"), ("POST", "/chat/completions")):
+            await self.chat_completions(request, reader, writer)
+        elif route == ("POST", "/manager/load_model"):
+            await self.load_model(request, writer)
+        elif request.path in ("/health", "/v1/models", "/v1/chat/completions", "/manager/load_model"):
+            raise HTTPError(405, f"{request.method} not allowed on {request.path}")
+        else:
+            raise HTTPError(404, f"No route for {request.path}")
+
+    # --- GENERATION (worker thread) ---
+    def _generate(self, messages, max_tokens, sampling, cancel, emit):
+        """Runs on the decode thread. Emits OpenAI chunk dicts, then None."""
+        try:
+            if cancel.is_set():
+                return
+            stream = self.engine.llm.create_chat_completion(
+                messages=messages, max_tokens=max_tokens, stream=True, **sampling
+            )
+            try:
+                for chunk in stream:
+                    if cancel.is_set():
+                        break # Client went away: stop decode within one token
+                    emit(chunk)
+            finally:
+                stream.close()
+        except Exception as e:
+            emit(e)
+        finally:
+            emit(None)
+
+    def _generate_batched(self, messages, max_tokens, sampling, cancel, emit):
+        """Runs on a helper thread; the BatchScheduler thread does the decoding."""
+        completion_id = f"chatcmpl-{uuid.uuid4().hex}"
+        created = int(time.time())
+
+        def chunk(delta, finish_reason=None):
+            return {"id": completion_id, "object": "chat.completion.chunk", "created": created,
+                    "choices": [{"index": 0, "delta": delta, "finish_reason": finish_reason}]}
+
+        try:
+            emit(chunk({"role": "assistant"}))
+            req = self.scheduler.submit_chat(
+                self.engine.llm, messages, max_tokens=max_tokens,
+                on_text=lambda piece: emit(chunk({"content": piece})), **sampling
+            )
+            while not req.done.wait(0.05):
+                if cancel.is_set():
+                    req.cancel()
+            if req.error:
+                raise req.error
+            emit(chunk({}, req.finish_reason))
+        except Exception as e:
+            emit(e)
+        finally:
+            emit(None)
+
+    async def chat_completions(self, request, reader, writer):
+        body = request.json()
+        messages, max_tokens, sampling = parse_chat_request(body)
+        stream = bool(body.get("stream", False))
+
+        loop = asyncio.get_running_loop()
+        queue = asyncio.Queue()
+        cancel = threading.Event()
+        emit = lambda item: loop.call_soon_threadsafe(queue.put_nowait, item)
+
+        watcher = asyncio.create_task(watch_disconnect(reader, cancel.set))
+        self.active += 1
+        if self.scheduler:
+            job = loop.run_in_executor(None, self._generate_batched, messages, max_tokens, sampling, cancel, emit)
+        else:
+            job = loop.run_in_executor(self.executor, self._generate, messages, max_tokens, sampling, cancel, emit)
+        try:
+            if stream:
+                await self._stream_reply(writer, queue, cancel)
+            else:
+                await self._full_reply(writer, queue, messages)
+        finally:
+            cancel.set()
+            watcher.cancel()
+            await job
+            self.active -= 1
+
+    async def _stream_reply(self, writer, queue, cancel):
+        sse = SSEWriter(writer)
+        await sse.start()
+        try:
+            while True:
+                item = await queue.get()
+                if item is None:
+                    break
+                if isinstance(item, Exception):
+                    await sse.send({"error": {"message": str(item), "type": "server_error"}})
+                    break
+                item["model"] = self.model_name
+                await sse.send(item)
+            if not cancel.is_set():
+                await sse.finish()
+        except ConnectionError:
+            pass # Disconnect mid-stream; the finally in chat_completions stops decode
+
+    async def _full_reply(self, writer, queue, messages):
+        text, finish_reason, completion_id, created, n_tokens = "", None, None, int(time.time()), 0
+        while True:
+            item = await queue.get()
+            if item is None:
+                break
+            if isinstance(item, Exception):
+                await send_error(writer, 500, str(item))
+                return
+            completion_id = completion_id or item.get("id")
+            choice = item["choices"][0]
+            content = choice["delta"].get("content")
+            if content:
+                text += content
+                n_tokens += 1
+            finish_reason = choice.get("finish_reason") or finish_reason
+
+        prompt_tokens = self._count_prompt_tokens(messages)
+        await send_json(writer, 200, {
+            "id": completion_id or f"chatcmpl-{uuid.uuid4().hex}",
+            "object": "chat.completion",
+            "created": created,
+            "model": self.model_name,
+            "choices": [{"index": 0, "message": {"role": "assistant", "content": text}, "finish_reason": finish_reason or "stop"}],
+            "usage": {
+                "prompt_tokens": prompt_tokens,
+                "completion_tokens": n_tokens,
+                "total_tokens": prompt_tokens + n_tokens,
+            },
+        })
+
+    def _count_prompt_tokens(self, messages):
+        text = "".join(str(m.get("content", "")) for m in messages)
+        try:
+            return len(self.engine.llm.tokenize(text.encode("utf-8"), add_bos=False))
+        except Exception:
+            return 0
+
+    # --- MODEL SWAP (remote_client.sync_remote_model compatibility) ---
+    async def load_model(self, request, writer):
+        model_id = request.json().get("model_id")
+        if not model_id:
+            await send_json(writer, 200, {"error": "No model_id provided"})
+            return
+        path = resolve_model_path(model_id, self.models_dir)
+        if os.path.basename(path or "") == self.model_name:
+            await send_json(writer, 200, {"status": "Model already loaded", "model": self.model_name})
+            return
+        if not path:
+            raise HTTPError(404, f"No local GGUF matches '{model_id}'")
+        if self.scheduler:
+            raise HTTPError(400, "Model swap is not supported while continuous batching is enabled")
+
+        # Swap on the decode thread so in-flight requests finish first
+        loop = asyncio.get_running_loop()
+        await loop.run_in_executor(self.executor, self._swap_engine, path)
+        await send_json(writer, 200, {"status": "Switched", "model": self.model_name, "message": "Model loaded."})
+
+    def _swap_engine(self, path):
+        """Runs on the decode thread, so queued requests see the new engine."""
+        from vox_api import VoxAPI
+        print(f"[SERVER] 🔄 Swapping to {os.path.basename(path)}...")
+        # Load before dropping the old engine: a failed load keeps serving the current model
+        try:
+            engine = VoxAPI(model_path=path, verbose=self.engine.verbose, pin_threads=self.engine.pin_threads)
+        except Exception as e:
+            print(f"[SERVER] ❌ Swap failed, still serving {self.model_name}: {e}")
+            raise
+        self.engine = engine
+        self.model_name = os.path.basename(path)
+
+
+def parse_chat_request(body):
+    """Validates a chat completion body. Returns (messages, max_tokens, sampling); raises HTTPError(400)."""
+    messages = body.get("messages")
+    if not isinstance(messages, list) or not messages:
+        raise HTTPError(400, "'messages' must be a non-empty list")
+    for i, message in enumerate(messages):
+        if not isinstance(message, dict):
+            raise HTTPError(400, f"messages[{i}] must be an object")
+        if not isinstance(message.get("role"), str) or not isinstance(message.get("content"), str):
+            raise HTTPError(400, f"messages[{i}] needs string 'role' and 'content'")
+
+    for field, (types, low, high) in FIELD_LIMITS.items():
+        value = body.get(field)
+        if value is None:
+            continue
+        if isinstance(value, bool) or not isinstance(value, types):
+            raise HTTPError(400, f"'{field}' must be {'an integer' if types == (int,) else 'a number'}")
+        if (low is not None and value < low) or (high is not None and value > high):
+            raise HTTPError(400, f"'{field}' must be between {low} and {high}" if high is not None
+                            else f"'{field}' must be at least {low}")
+
+    stop = body.get("stop")
+    if stop is not None and not isinstance(stop, str) and not (
+            isinstance(stop, list) and all(isinstance(s, str) for s in stop)):
+        raise HTTPError(400, "'stop' must be a string or a list of strings")
+
+    max_tokens = body.get("max_tokens") or DEFAULT_MAX_TOKENS
+    sampling = {k: body[k] for k in SAMPLING_FIELDS if body.get(k) is not None}
+    return messages, max_tokens, sampling
+
+
+def resolve_model_path(name, models_dir):
+    """Accepts a path, a file in models/, or a MODEL_MAP key. Returns None if nothing matches."""
+    if name and os.path.isfile(name):
+        return name
+    candidate = os.path.join(models_dir, name)
+    if os.path.isfile(candidate):
+        return candidate
+    try:
+        from config import MODEL_MAP
+    except ImportError:
+        MODEL_MAP = {}
+    if name in MODEL_MAP:
+        candidate = os.path.join(models_dir, MODEL_MAP[name])
+        if os.path.isfile(candidate):
+            return candidate
+    return None
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="VoxAI OpenAI-compatible local server")
+    parser.add_argument("--model", help="GGUF path, file name in models/, or MODEL_MAP key (default: largest chat model that fits in RAM)")
+    parser.add_argument("--host", default=DEFAULT_HOST)
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT)
+    parser.add_argument("--api-key", default=None, help="Require 'Authorization: Bearer <key>'")
+    parser.add_argument("--parallel", type=int, default=1,
+                        help="Concurrent sequences decoded together (continuous batching). 1 = FIFO")
+    parser.add_argument("--ctx-per-slot", type=int, default=2048, help="Context window per parallel sequence")
+    parser.add_argument("--verbose", action="store_true")
+    args = parser.parse_args(argv)
+
+    model_path = None
+    if args.model:
+        model_path = resolve_model_path(args.model, "./models")
+        if not model_path:
+            sys.exit(f"[SERVER] ❌ Model not found: {args.model}")
+
+    from vox_api import VoxAPI
+    print("[SERVER] 🛡️ Loading engine...")
+    engine = VoxAPI(model_path=model_path, verbose=args.verbose, pin_threads=True)
+    scheduler = None
+    if args.parallel > 1:
+        from batch_scheduler import BatchScheduler, LlamaBatchContext
+        batch_ctx = LlamaBatchContext(engine.llm, n_slots=args.parallel, ctx_per_slot=args.ctx_per_slot,
+                                      n_batch=engine.config.get("n_batch", 512))
+        scheduler = BatchScheduler(batch_ctx)
+        print(f"[SERVER] 🔀 Continuous batching: {args.parallel} slots x {args.ctx_per_slot} tokens")
+    server = VoxServer(engine, engine.model_name, api_key=args.api_key, scheduler=scheduler)
+
+    print(f"[SERVER] ✅ Serving {engine.model_name} on http://{args.host}:{args.port}/v1")
+    print("[SERVER] Endpoints: /v1/chat/completions (stream), /v1/models, /health")
+    try:
+        serve(server.handle, args.host, args.port)
+    except KeyboardInterrupt:
+        print("\n[SERVER] Shutting down...")
+
+
+if __name__ == "__main__":
+    main()
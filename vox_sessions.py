@@ -0,0 +1,163 @@
+import os
+import json
+import time
+import uuid
+import hashlib
+import threading
+from collections import OrderedDict
+from typing import Dict, List, Optional
+
+DEFAULT_SYSTEM_PROMPT = "You are a helpful assistant."
+DEFAULT_SAMPLING = {
+    "max_tokens": 2048,
+    "temperature": 0.7,
+    "top_k": 40,
+    "repeat_penalty": 1.1,
+}
+
+
+class VoxSession:
+    """One conversation: its own history, system prompt and sampling settings."""
+
+    def __init__(self, session_id: str, system_prompt: Optional[str] = None, sampling: Optional[Dict] = None):
+        self.id = session_id
+        self.system_prompt = system_prompt or DEFAULT_SYSTEM_PROMPT
+        self.sampling = dict(DEFAULT_SAMPLING)
+        self.sampling.update(sampling or {})
+        self.history: List[Dict[str, str]] = []
+        self.created = time.time()
+        self.last_used = self.created
+        self.busy = 0 # Generations in flight; busy sessions are never evicted
+
+    def ensure_system_prompt(self, override: Optional[str] = None):
+        """Seeds an empty history with the system prompt."""
+        if not self.history:
+            self.history.append({"role": "system", "content": override or self.system_prompt})
+
+    def nbytes(self) -> int:
+        """Approximate memory held by the history."""
+        return sum(len(m.get("content", "")) + 32 for m in self.history)
+
+    def to_dict(self) -> Dict:
+        return {"id": self.id, "system_prompt": self.system_prompt, "sampling": self.sampling,
+                "history": self.history, "created": self.created, "last_used": self.last_used}
+
+    @classmethod
+    def from_dict(cls, data: Dict) -> "VoxSession":
+        session = cls(data["id"], data.get("system_prompt"), data.get("sampling"))
+        session.history = data.get("history", [])
+        session.created = data.get("created", session.created)
+        session.last_used = data.get("last_used", session.last_used)
+        return session
+
+
+class SessionManager:
+    """
+    Thread-safe registry of chat sessions.
+
+    When more than `max_sessions` are resident, or their histories exceed `max_history_bytes`,
+    the least recently used idle sessions are evicted. With `spill_dir` set, evicted histories
+    are written to disk and transparently reloaded by get(); otherwise they are dropped.
+    """
+
+    def __init__(self, max_sessions: int = 64, max_history_bytes: int = 16 * 1024 * 1024,
+                 spill_dir: Optional[str] = None):
+        self.max_sessions = max_sessions
+        self.max_history_bytes = max_history_bytes
+        self.spill_dir = spill_dir
+        self._sessions: "OrderedDict[str, VoxSession]" = OrderedDict()
+        self._lock = threading.RLock()
+        if spill_dir:
+            os.makedirs(spill_dir, exist_ok=True)
+
+    def _spill_path(self, session_id: str) -> str:
+        # Hashed, not sanitized: distinct IDs must never share a file
+        digest = hashlib.sha256(session_id.encode("utf-8")).hexdigest()
+        return os.path.join(self.spill_dir, f"{digest}.json")
+
+    def _load_spilled(self, session_id: str) -> Optional[VoxSession]:
+        """The spilled copy of session_id, removed from disk, or None."""
+        path = self._spill_path(session_id)
+        if not os.path.exists(path):
+            return None
+        with open(path, "r", encoding="utf-8") as f:
+            data = json.load(f)
+        if data.get("id") != session_id:
+            return None # Not this session's file; never hand out another session's history
+        os.remove(path)
+        return VoxSession.from_dict(data)
+
+    def create(self, system_prompt: Optional[str] = None, session_id: Optional[str] = None,
+               acquire: bool = False, **sampling) -> VoxSession:
+        """New session. With acquire=True it is returned busy; pair with release()."""
+        with self._lock:
+            session_id = session_id or uuid.uuid4().hex
+            if session_id in self._sessions:
+                raise ValueError(f"Session already exists: {session_id}")
+            session = VoxSession(session_id, system_prompt, sampling)
+            self._sessions[session_id] = session
+            if acquire:
+                session.busy += 1
+            self._enforce_limits(keep=session)
+            return session
+
+    def get(self, session_id: str, acquire: bool = False) -> VoxSession:
+        """
+        Returns a session (reloading it from disk if it was spilled). Raises KeyError.
+        With acquire=True it is marked busy before the lock is released, so it cannot be
+        evicted between the lookup and its use; pair with release().
+        """
+        with self._lock:
+            session = self._sessions.get(session_id)
+            if session is None and self.spill_dir:
+                session = self._load_spilled(session_id)
+                if session is not None:
+                    self._sessions[session_id] = session
+            if session is None:
+                raise KeyError(f"Unknown session: {session_id}")
+            session.last_used = time.time()
+            self._sessions.move_to_end(session_id)
+            if acquire:
+                session.busy += 1
+            self._enforce_limits(keep=session)
+            return session
+
+    def release(self, session: VoxSession):
+        """Ends a use started by get(acquire=True) or create(acquire=True)."""
+        with self._lock:
+            session.busy = max(0, session.busy - 1)
+
+    def close(self, session_id: str):
+        """Forgets a session, including any spilled copy."""
+        with self._lock:
+            self._sessions.pop(session_id, None)
+            if self.spill_dir and os.path.exists(self._spill_path(session_id)):
+                os.remove(self._spill_path(session_id))
+
+    def __contains__(self, session_id: str) -> bool:
+        with self._lock:
+            if session_id in self._sessions:
+                return True
+            return bool(self.spill_dir) and os.path.exists(self._spill_path(session_id))
+
+    def ids(self) -> List[str]:
+        with self._lock:
+            return list(self._sessions.keys())
+
+    def history_bytes(self) -> int:
+        with self._lock:
+            return sum(s.nbytes() for s in self._sessions.values())
+
+    def _enforce_limits(self, keep: Optional[VoxSession] = None):
+        """Evicts idle sessions other than `keep` (the one being handed out), oldest first, until both caps are met."""
+        while len(self._sessions) > self.max_sessions or self.history_bytes() > self.max_history_bytes:
+            victim = next((k for k, s in self._sessions.items() if not s.busy and s is not keep), None)
+            if victim is None:
+                return # Everything left is in use
+            self._evict(victim)
+
+    def _evict(self, session_id: str):
+        session = self._sessions.pop(session_id)
+        if self.spill_dir:
+            with open(self._spill_path(session_id), "w", encoding="utf-8") as f:
+                json.dump(session.to_dict(), f)
@@ -0,0 +1,228 @@
+import os
+import sys
+import json
+import time
+import atexit
+import threading
+
+# ==========================================
+# SPAN TRACING
+# ==========================================
+# Timed spans around the load and generation stages (handshake, backend load, Llama init,
+# prefill, decode, pod rent/boot/health, cloud stream), exported as Chrome trace JSON
+# (open in chrome://tracing or ui.perfetto.dev) plus a per-session text summary.
+#
+# Off by default. Enable with --trace, VOX_TRACE=1 or enable(). When disabled, span()
+# returns a shared no-op object, so instrumented code pays one global lookup per span.
+
+TRACE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "logs", "traces")
+
+enabled = False
+_lock = threading.Lock()
+_events = []
+_thread_names = {}
+_t0 = time.perf_counter()
+_session_start = None
+
+
+class _NullSpan:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def set(self, **args):
+        pass
+
+
+_NULL = _NullSpan()
+
+
+class _Span:
+    __slots__ = ("name", "cat", "args", "start")
+
+    def __init__(self, name, cat, args):
+        self.name = name
+        self.cat = cat
+        self.args = args
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is not None:
+            self.args["error"] = exc_type.__name__
+        record(self.name, self.start, time.perf_counter() - self.start, self.cat, **self.args)
+        return False
+
+    def set(self, **args):
+        """Attaches values discovered inside the span (token counts, pod IDs...)."""
+        self.args.update(args)
+
+
+def span(name, cat="vox", **args):
+    """with span("llama.init", n_ctx=4096) as s: ... s.set(ok=True)"""
+    if not enabled:
+        return _NULL
+    return _Span(name, cat, args)
+
+
+def traced(name=None, cat="vox"):
+    """Decorator form of span(); the name defaults to the function's qualified name."""
+    def wrap(fn):
+        label = name or fn.__qualname__
+
+        def inner(*a, **kw):
+            if not enabled:
+                return fn(*a, **kw)
+            with _Span(label, cat, {}):
+                return fn(*a, **kw)
+        inner.__name__ = fn.__name__
+        inner.__doc__ = fn.__doc__
+        inner.__wrapped__ = fn
+        return inner
+    return wrap
+
+
+def record(name, start, duration, cat="vox", **args):
+    """Adds a finished span from perf_counter() timestamps (for spans split across code, like prefill/decode)."""
+    if not enabled:
+        return
+    thread = threading.current_thread()
+    event = {
+        "name": name, "cat": cat, "ph": "X", "pid": os.getpid(), "tid": thread.ident,
+        "ts": round((start - _t0) * 1e6, 1), "dur": round(duration * 1e6, 1),
+    }
+    if args:
+        event["args"] = args
+    with _lock:
+        _events.append(event)
+        _thread_names.setdefault(thread.ident, thread.name)
+
+
+def record_generation(prefix, start, first, tokens):
+    """
+    Splits one streamed reply into <prefix>.prefill (request -> first token) and
+    <prefix>.decode (first -> last token), from perf_counter() times; first is None if nothing came.
+    """
+    if not enabled:
+        return
+    end = time.perf_counter()
+    if first is None:
+        record(f"{prefix}.prefill", start, end - start, "generate", tokens=0)
+        return
+    record(f"{prefix}.prefill", start, first - start, "generate")
+    record(f"{prefix}.decode", first, end - first, "generate", tokens=tokens,
+           tok_s=round(tokens / (end - first), 2) if end > first else None)
+
+
+def instant(name, cat="vox", **args):
+    """A point-in-time marker (e.g. failover)."""
+    if not enabled:
+        return
+    thread = threading.current_thread()
+    event = {"name": name, "cat": cat, "ph": "i", "s": "t", "pid": os.getpid(), "tid": thread.ident,
+             "ts": round((time.perf_counter() - _t0) * 1e6, 1)}
+    if args:
+        event["args"] = args
+    with _lock:
+        _events.append(event)
+        _thread_names.setdefault(thread.ident, thread.name)
+
+
+def enable(save_on_exit=True):
+    """Starts recording; with save_on_exit the trace and summary are written when the process ends."""
+    global enabled, _session_start
+    if enabled:
+        return
+    enabled = True
+    _session_start = time.strftime("%Y%m%d_%H%M%S")
+    if save_on_exit:
+        atexit.register(_save_at_exit)
+
+
+def disable():
+    global enabled
+    enabled = False
+
+
+def reset():
+    with _lock:
+        _events.clear()
+
+
+def events():
+    with _lock:
+        return list(_events)
+
+
+def chrome_trace():
+    """The trace in Chrome Trace Event format."""
+    with _lock:
+        evts = list(_events)
+        names = dict(_thread_names)
+    pid = os.getpid()
+    meta = [{"name": "process_name", "ph": "M", "pid": pid, "args": {"name": "VoxAI"}}]
+    meta += [{"name": "thread_name", "ph": "M", "pid": pid, "tid": tid, "args": {"name": tname}}
+             for tid, tname in names.items()]
+    return {"traceEvents": meta + evts, "displayTimeUnit": "ms"}
+
+
+def export_chrome(path):
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(chrome_trace(), f)
+    return path
+
+
+def summary():
+    """Per-span-name count, total, mean and max (ms), slowest total first."""
+    stats = {}
+    for e in events():
+        if e["ph"] != "X":
+            continue
+        s = stats.setdefault(e["name"], {"count": 0, "total_ms": 0.0, "max_ms": 0.0})
+        ms = e["dur"] / 1000
+        s["count"] += 1
+        s["total_ms"] += ms
+        s["max_ms"] = max(s["max_ms"], ms)
+    for s in stats.values():
+        s["mean_ms"] = s["total_ms"] / s["count"]
+    return dict(sorted(stats.items(), key=lambda kv: kv[1]["total_ms"], reverse=True))
+
+
+def format_summary(stats=None):
+    stats = summary() if stats is None else stats
+    if not stats:
+        return "[TRACE] No spans recorded."
+    lines = [f"[TRACE] {'span':<28} {'count':>6} {'total ms':>11} {'mean ms':>10} {'max ms':>10}"]
+    for name, s in stats.items():
+        lines.append(f"[TRACE] {name:<28} {s['count']:>6} {s['total_ms']:>11.1f} {s['mean_ms']:>10.1f} {s['max_ms']:>10.1f}")
+    return "\n".join(lines)
+
+
+def save_session(directory=TRACE_DIR):
+    """Writes <directory>/vox_trace_<start time>.json and returns the path (None if nothing was traced)."""
+    if not events():
+        return None
+    path = os.path.join(directory, f"vox_trace_{_session_start or time.strftime('%Y%m%d_%H%M%S')}.json")
+    return export_chrome(path)
+
+
+def _save_at_exit():
+    try:
+        path = save_session()
+    except OSError as e:
+        print(f"[TRACE] Could not write trace: {e}")
+        return
+    if path:
+        print("\n" + format_summary())
+        print(f"[TRACE] Chrome trace: {path} (open in ui.perfetto.dev or chrome://tracing)")
+
+
+if os.environ.get("VOX_TRACE", "").lower() in ("1", "true", "yes") or "--trace" in sys.argv:
+    enable()